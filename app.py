@@ -5,11 +5,11 @@ Copyright (c) 2013 James Dunlop
 Code for a maya playblast creator app that runs in maya
 This is not a shotgun supported app_store application.
 """
-import os, sys, shutil
+import os, sys, shutil, threading
 import logging
 logger = logging.getLogger(__name__)
 from functools import partial
-import time
+from contextlib import contextmanager
 ###################################
 ## Maya Imports                  ##
 import maya.cmds as cmds
@@ -18,16 +18,6 @@ import maya.cmds as cmds
 from tank.platform.qt import QtCore, QtGui
 from tank.platform import Application
 import tank.templatekey
-try:
-    from shotgun_api3 import Shotgun
-except ImportError:
-    logger.warning('You are missing the api3 dependency! Please install it now or make sure it is on the sys.path or python path!')
-###################################
-### tk-jbd-baseconfig imports    ##
-try:
-    import configCONST as configCONST
-except ImportError:
-    logger.warning('No configCONST avail... using python/lib CONST instead, please make sure your application CONST is set correctly for the config name.')
 
 ## TODO Set all previous versions to viewed, or na so latest status is valid.
 
@@ -43,14 +33,44 @@ class PlayBlastGenerator(Application):
         getDisplayName = self.get_setting('display_name')
         self.engine.register_command(getDisplayName, self.run_app)
         self.lib = self.import_module("lib")
+        ## Pick up any uploads a previous session (or a crash) left behind in the spool.
+        self.lib.startSpoolDrainer(self.getSpoolDir(), concurrency = self.get_setting('spool_max_concurrent_uploads'))
+        ## Every shotgun call gets a deadline and reads are retried, a run of failed calls takes the app offline for a while.
+        self.lib.setShotgunPolicy(self.lib.ShotgunCallPolicy(
+                                                            readTimeout     = self.get_setting('shotgun_read_timeout'),
+                                                            writeTimeout    = self.get_setting('shotgun_write_timeout'),
+                                                            connectTimeout  = self.get_setting('shotgun_connect_timeout'),
+                                                            readRetries     = self.get_setting('shotgun_read_retries'),
+                                                            backoff         = self.get_setting('shotgun_retry_backoff'),
+                                                            ))
+        self.lib.getShotgunBreaker().configure(failures = self.get_setting('shotgun_breaker_failures'), resetAfter = self.get_setting('shotgun_breaker_reset'))
+        ## Repeat reads (frame ranges, the current user, status values) are cached for the whole maya session.
+        self.lib.getShotgunCache().ttl = self.get_setting('shotgun_cache_ttl')
+        ## Uploads from every maya on the box share the uplink through the upload scheduler daemon.
+        address = self.get_setting('upload_scheduler')
+        if address:
+            if self.get_setting('upload_scheduler_autostart'):
+                self.lib.startUploadSchedulerDaemon(address, self.get_setting('upload_scheduler_max_concurrent'), self.get_setting('upload_scheduler_bandwidth_mb'), python = self.lib.defaultMayapy())
+            self.lib.setUploadScheduler(address)
+        ## Movies rendered to local scratch are copied out to the filer by a shared pool with one bandwidth limit.
+        self.lib.getTransferQueue().setLimits(concurrency = self.get_setting('transfer_max_concurrent'), bytesPerSec = int(self.get_setting('transfer_bandwidth_mb') * 1024 * 1024))
+        ## Per run telemetry, pipeline code can swap in its own sink with lib.setTraceSink before this if it wants.
+        if self.get_setting('trace_enabled') and self.lib.getTraceSink() is None:
+            self.lib.setTraceSink(self.lib.JsonLinesSink(os.path.expanduser(self.get_setting('trace_dir') or self.lib.TRACE_DIR)))
         logger.info('%s Loaded...' % getDisplayName)
 
+    def getSpoolDir(self):
+        return os.path.expanduser(self.get_setting('upload_spool_dir') or self.lib.UPLOAD_SPOOL_DIR)
+
     def run_app(self):
         getDisplayName = self.get_setting('display_name')
         self.engine.show_dialog(getDisplayName, self, MainUI, self)
 
 
 class MainUI(QtGui.QWidget):
+    ## The Version status values, read off the GUI thread and handed back through this so the combobox is filled on it
+    statusValuesRead = QtCore.Signal(object)
+
     def __init__(self, app):
         """
         main UI for the playblast options
@@ -83,11 +103,15 @@ class MainUI(QtGui.QWidget):
             self.currentEditor = self._getEditor()
             logger.info('currentEditor: %s' % self.currentEditor)
 
-            ## These two are used for the os module when doing a os.rename for windows
-            self.osPathToWorkFile       = ''
-            logger.info('osPathToWorkFile: %s' % self.osPathToWorkFile)
-            self.osPathToPublishFile    = ''
-            logger.info('osPathToPublishFile: %s' % self.osPathToPublishFile)
+            ## The modelEditor state last sent to the editor, so the radio buttons only send what changed.
+            self._editorState           = {}
+            self._editorUpdatePending   = False
+            self._applyingEditorState   = False
+            ## Option panels are built the first time they're shown, the scene is prepared on the first Playblast press.
+            self._optionsBuilt          = False
+            self._scenePrepared         = False
+            ## Timing spans for the playblast currently being made, see lib/runTrace.py
+            self._trace                 = self.lib.NULL_TRACE
             ## Now build the main UI
             self._buildUI()
             logger.info('_buildUI: %s' % self._buildUI)
@@ -121,6 +145,182 @@ class MainUI(QtGui.QWidget):
         self.hLayout.addWidget(self.codecLabel)
         self.hLayout.addWidget(self.formatLabel)
 
+        ## The camera, viewport and renderer option panels are only built the first time they're shown, see _buildOptionPanels
+        self.optionsButton      = QtGui.QPushButton('Show Options')
+        self.optionsButton.setCheckable(True)
+        self.optionsButton.setToolTip('Show the camera, viewport and renderer options for the playblast.')
+        self.optionsButton.toggled.connect(self._toggleOptionPanels)
+        self.hLayout.addStretch(1)
+        self.hLayout.addWidget(self.optionsButton)
+
+        ############################################################################################
+        ## BUILD ASSET TURN TABLE UI IF THIS IS AN ASSET
+        ############################################################################################
+        if self.app.get_setting('isAsset') and self.app.get_setting('allowAssetTurnTableBuild'):
+            logger.info('Showing Asset UI')
+            self._buildAssetTurntableUI()
+
+        ############################################################################################
+        ## COMMENT GROUP BOX
+        ############################################################################################
+        logger.info('Building Comment Layout')
+        ## Now the comment layout
+        self.commentGroupBox        = QtGui.QGroupBox(self)
+        self.commentGroupBox.setFlat(True)
+        self.commentGroupBox.setTitle('Comment -- required!')
+
+        self.hLayout                = QtGui.QHBoxLayout(self.commentGroupBox)
+        self.commentLabel           = QtGui.QLabel('Set Comment:')
+        self.comment                = QtGui.QLineEdit(self)
+        self.comment.setToolTip('You MUST set a comment if you are publishing to shotgun. Please set a sensible version note here.')
+        self.hLayout.addWidget(self.commentLabel)
+        self.hLayout.addWidget(self.comment)
+
+        ##################################################################1##########################
+        ## SUBMISSION GROUP BOX
+        ############################################################################################
+        ## Now the submission area
+        logger.info('Building Submission Layout')
+        self.submissionGroupBox     = QtGui.QGroupBox(self)
+        self.submissionGroupBox.setFlat(True)
+        self.submissionGroupBox.setTitle('Submission to Shotgun')
+        self.submissionlayout       = QtGui.QHBoxLayout(self.submissionGroupBox)
+        ##################
+        ## Quality Spinbox
+        self.qualityPercentage      = 75
+        self.qualityLabel           = QtGui.QLabel('Quality:')
+        self.qualityPercent         = QtGui.QSpinBox(self)
+        self.qualityPercent.setRange(0, 100)
+        self.qualityPercent.setValue(75)
+        #####################
+        ## Percentage Spinbox
+        self.sizePercentage         = 75
+        self.sizeLabel              = QtGui.QLabel('Scale:')
+        self.sizePercent            = QtGui.QSpinBox(self)
+        self.sizePercent.setRange(0, 100)
+        self.sizePercent.setValue(75)
+        #####################
+        ## Build the statusList Combobox
+        self.statusLabel            = QtGui.QLabel('Status')
+        self.statusList             = QtGui.QComboBox(self)
+        ## Just the default to start with, the rest of the valid values come from the Version schema once the dialog is up.
+        self.statusList.addItem(self.app.get_setting('new_version_status'))
+        self.statusValuesRead.connect(self._fillStatusList)
+        reader = threading.Thread(target = self._readStatusValues, name = 'StatusValues')
+        reader.daemon = True
+        reader.start()
+        #####################
+        ## Frames to render fresh even when the frame cache has them, eg after a change the keys don't show
+        if self.app.get_setting('frame_cache'):
+            self.rerenderLabel      = QtGui.QLabel('Re-render:')
+            self.rerenderFrames     = QtGui.QLineEdit(self)
+            self.rerenderFrames.setToolTip('Unchanged frames are reused from the frame cache. List frames to render again anyway, eg 40-60, 75')
+            self.rerenderFrames.setMaximumWidth(100)
+        #####################
+        ## Build the upload button
+        self.upload                 = QtGui.QRadioButton('Submit to shotgun?')
+        self.upload.setStyleSheet('QRadioButton:indicator{background-color: #088A08}')
+        self.upload.setAutoExclusive(False)
+        self.upload.setChecked(False)
+        self.upload.toggled.connect(self._uploadToggle)
+        #####################
+        ## Build the main go button
+        self.goButton               = QtGui.QPushButton('Playblast...')
+        self.goButton.setStyleSheet("QPushButton { background-color: #088A08}")
+        self.goButton.setMinimumWidth(350)
+        self.goButton.released.connect(self.doPlayblast)
+        #####################
+        ## Add to layout
+        self.submissionlayout.addWidget(self.qualityLabel)
+        self.submissionlayout.addWidget(self.qualityPercent)
+        self.submissionlayout.addWidget(self.sizeLabel)
+        self.submissionlayout.addWidget(self.sizePercent)
+
+        self.submissionlayout.addWidget(self.statusLabel)
+        self.submissionlayout.addWidget(self.statusList)
+        if self.app.get_setting('frame_cache'):
+            self.submissionlayout.addWidget(self.rerenderLabel)
+            self.submissionlayout.addWidget(self.rerenderFrames)
+
+        ## Check to see if the attr in the _step.yml is looking to upload to shotgun or not.
+        ## If it is show the upload options and set the button to true
+        if self.upload_to_shotgun:
+            self.submissionlayout.addWidget(self.upload)
+            self.upload.setChecked(True)
+        else:
+            self.upload.hide()
+            self.commentGroupBox.hide()
+            self.submissionGroupBox.setTitle('Local Playblast')
+        ## Check if we are an asset or a shot, and show the option to delete the turnTable group after playblasting
+        if self.app.get_setting('isAsset') and self.app.get_setting('allowAssetTurnTableBuild'):
+            self.deleteHrcGrp = QtGui.QRadioButton('Delete Turntable Grp?')
+            self.deleteHrcGrp.setAutoExclusive(False)
+            self.submissionlayout.addWidget(self.deleteHrcGrp)
+
+        #########################################################
+        ## Now add the go button regardless of shot or asset step
+        self.submissionlayout.addWidget(self.goButton)
+        self.submissionlayout.addStretch(1)
+
+        ############################################
+        ## Now add the groupboxes to the main layout.
+        logger.info('Building final Layout')
+        self.mainLayout.addWidget(self.infoGroupBox)
+        logger.info('Building final Layout step 2')
+        if self.app.get_setting('isAsset') and self.app.get_setting('allowAssetTurnTableBuild'):
+            self.mainLayout.addWidget(self.turnTableGroupBox)
+        logger.info('Building final Layout step 3')
+        self.mainLayout.addWidget(self.submissionGroupBox)
+        self.mainLayout.addWidget(self.commentGroupBox)
+        self.mainLayout.addStretch(1)
+        logger.info('Building final Layout complete..')
+
+        ###############################################################################
+        ## Now show or hide the options if the showOptions is turned on else hide these
+        if not self.app.get_setting('showOptions'):
+            self.infoGroupBox.hide()
+
+        ## The shot camera, the modelEditor options and the render globals are set on the first Playblast press, see _prepareScene
+        logger.info('UI Built Successfully...')
+
+    def _readStatusValues(self):
+        """
+        Reads the status values from the Version schema (once per session, see ShotgunReadCache) off the GUI thread,
+        a slow or offline shotgun only leaves the combobox on the default for a while.
+        """
+        values = self.lib.getShotgunCache().statusValues(self.lib.guardShotgun(self.app.shotgun))
+        try:
+            self.statusValuesRead.emit(values)
+        except RuntimeError:
+            ## The dialog was closed before shotgun answered
+            pass
+
+    def _fillStatusList(self, values):
+        """
+        Fills in the status values on the GUI thread.
+        """
+        status = self.app.get_setting('new_version_status')
+        for each in values:
+            if each != status:
+                self.statusList.addItem(each)
+
+    def _toggleOptionPanels(self, show):
+        if show and not self._optionsBuilt:
+            self._buildOptionPanels()
+        for each in self._optionPanels():
+            each.setVisible(show)
+        self.optionsButton.setText('Hide Options' if show else 'Show Options')
+
+    def _optionPanels(self):
+        if not self._optionsBuilt:
+            return []
+        return [self.cameraSettingsGroupBox, self.viewportSettingsGroupBox, self.rendererSettingsGroupBox]
+
+    def _buildOptionPanels(self):
+        """
+        Builds the camera, viewport and renderer option panels under the info box, the buttons start out on the CONST defaults.
+        """
+        labels, checked = self._optionState()
         ############################################################################################
         ## CAMERA SETTINGS GROUPBOX
         ############################################################################################
@@ -132,7 +332,6 @@ class MainUI(QtGui.QWidget):
         self.maxColumns                 = 4
         ## Process all the stupid maya options for the camera settings for the playblast.
         self.optionsList                = self.lib.CAM_SETTINGS_OPTIONS
-        self.defaultOn                  = self.lib.CAM_SETTINGS_DEFAULT_ON
         self.camRadioButtons            = []
         self.row                        = 0
         self.col                        = 0
@@ -147,7 +346,7 @@ class MainUI(QtGui.QWidget):
             self.camGridLayout.addWidget(self.myButton, self.row, self.col)
 
             ## Set the button to checked if it is in the CONST default on list
-            if eachRButton in self.defaultOn:
+            if eachRButton in checked:
                 self.myButton.setChecked(True)
 
             ## Now increase column by 1
@@ -171,7 +370,6 @@ class MainUI(QtGui.QWidget):
         self.viewportGridLayout         = QtGui.QGridLayout(self.viewportSettingsGroupBox)
         ## Process all the viewport settings for the playblast.
         self.viewportOptions            = self.lib.VIEWPORT_SETTINGS_OPTIONS
-        self.defaultOn                  = self.lib.VIEWPORT_SETTINGS_DEFAULT_ON
         self.viewportRadioButtons       = []
         self.row                        = 0
         self.col                        = 0
@@ -189,7 +387,7 @@ class MainUI(QtGui.QWidget):
             self.viewportGridLayout.addWidget(self.myButton, self.row, self.col)
 
             ## Set the button to checked if it is in the CONST default on list
-            if eachRButton in self.defaultOn:
+            if eachRButton in checked:
                 self.myButton.setChecked(True)
 
             ## Now increase column by 1
@@ -213,7 +411,6 @@ class MainUI(QtGui.QWidget):
         self.rendererGridLayout         = QtGui.QGridLayout(self.rendererSettingsGroupBox)
         ## Process all the renderer settings for the playblast.
         self.rendererOptions            = self.lib.RENDERER_SETTINGS_OPTIONS
-        self.defaultOn                  = self.lib.RENDERER_SETTINGS_DEFAULT_ON
         self.rendererRadioButtons       = []
         self.row                        = 0
         self.col                        = 0
@@ -228,7 +425,7 @@ class MainUI(QtGui.QWidget):
             self.rendererGridLayout.addWidget(self.myButton, self.row, self.col)
 
             ## Set the button to on if it is in the CONST default on list
-            if eachRButton in self.defaultOn:
+            if eachRButton in checked:
                 self.myButton.setChecked(True)
 
             ## Now increase column by 1
@@ -244,143 +441,48 @@ class MainUI(QtGui.QWidget):
 
         self.rendererGridLayout.setColumnStretch(self.maxColumns + 1,1)
 
-        ############################################################################################
-        ## BUILD ASSET TURN TABLE UI IF THIS IS AN ASSET
-        ############################################################################################
-        if self.app.get_setting('isAsset') and self.app.get_setting('allowAssetTurnTableBuild'):
-            logger.info('Showing Asset UI')
-            self._buildAssetTurntableUI()
-
-        ############################################################################################
-        ## COMMENT GROUP BOX
-        ############################################################################################
-        logger.info('Building Comment Layout')
-        ## Now the comment layout
-        self.commentGroupBox        = QtGui.QGroupBox(self)
-        self.commentGroupBox.setFlat(True)
-        self.commentGroupBox.setTitle('Comment -- required!')
-
-        self.hLayout                = QtGui.QHBoxLayout(self.commentGroupBox)
-        self.commentLabel           = QtGui.QLabel('Set Comment:')
-        self.comment                = QtGui.QLineEdit(self)
-        self.comment.setToolTip('You MUST set a comment if you are publishing to shotgun. Please set a sensible version note here.')
-        self.hLayout.addWidget(self.commentLabel)
-        self.hLayout.addWidget(self.comment)
-
-        ##################################################################1##########################
-        ## SUBMISSION GROUP BOX
-        ############################################################################################
-        ## Now the submission area
-        logger.info('Building Submission Layout')
-        self.submissionGroupBox     = QtGui.QGroupBox(self)
-        self.submissionGroupBox.setFlat(True)
-        self.submissionGroupBox.setTitle('Submission to Shotgun')
-        self.submissionlayout       = QtGui.QHBoxLayout(self.submissionGroupBox)
-        ##################
-        ## Quality Spinbox
-        self.qualityPercentage      = 75
-        self.qualityLabel           = QtGui.QLabel('Quality:')
-        self.qualityPercent         = QtGui.QSpinBox(self)
-        self.qualityPercent.setRange(0, 100)
-        self.qualityPercent.setValue(75)
-        #####################
-        ## Percentage Spinbox
-        self.sizePercentage         = 75
-        self.sizeLabel              = QtGui.QLabel('Scale:')
-        self.sizePercent            = QtGui.QSpinBox(self)
-        self.sizePercent.setRange(0, 100)
-        self.sizePercent.setValue(75)
-        #####################
-        ## Build the statusList Combobox
-        self.statusLabel            = QtGui.QLabel('Status')
-        self.statusList             = QtGui.QComboBox(self)
-        for each in self.lib.STATUS_LIST:
-            self.statusList.addItem(each)
-        status                      = self.app.get_setting('new_version_status')
-        index                       = self.statusList.findText(status)
-        self.statusList.setCurrentIndex(index)
-        #####################
-        ## Build the upload button
-        self.upload                 = QtGui.QRadioButton('Submit to shotgun?')
-        self.upload.setStyleSheet('QRadioButton:indicator{background-color: #088A08}')
-        self.upload.setAutoExclusive(False)
-        self.upload.setChecked(False)
-        self.upload.toggled.connect(self._uploadToggle)
-        #####################
-        ## Build the main go button
-        self.goButton               = QtGui.QPushButton('Playblast...')
-        self.goButton.setStyleSheet("QPushButton { background-color: #088A08}")
-        self.goButton.setMinimumWidth(350)
-        self.goButton.released.connect(self.doPlayblast)
-        #####################
-        ## Add to layout
-        self.submissionlayout.addWidget(self.qualityLabel)
-        self.submissionlayout.addWidget(self.qualityPercent)
-        self.submissionlayout.addWidget(self.sizeLabel)
-        self.submissionlayout.addWidget(self.sizePercent)
-
-        self.submissionlayout.addWidget(self.statusLabel)
-        self.submissionlayout.addWidget(self.statusList)
+        self._optionsBuilt = True
+        for index, each in enumerate(self._optionPanels()):
+            self.mainLayout.insertWidget(index + 1, each)
 
-        ## Check to see if the attr in the _step.yml is looking to upload to shotgun or not.
-        ## If it is show the upload options and set the button to true
-        if self.upload_to_shotgun:
-            self.submissionlayout.addWidget(self.upload)
-            self.upload.setChecked(True)
-        else:
-            self.upload.hide()
-            self.commentGroupBox.hide()
-            self.submissionGroupBox.setTitle('Local Playblast')
-        ## Check if we are an asset or a shot, and show the option to delete the turnTable group after playblasting
-        if self.app.get_setting('isAsset') and self.app.get_setting('allowAssetTurnTableBuild'):
-            self.deleteHrcGrp = QtGui.QRadioButton('Delete Turntable Grp?')
-            self.deleteHrcGrp.setAutoExclusive(False)
-            self.submissionlayout.addWidget(self.deleteHrcGrp)
-
-        #########################################################
-        ## Now add the go button regardless of shot or asset step
-        self.submissionlayout.addWidget(self.goButton)
-        self.submissionlayout.addStretch(1)
+    def _optionState(self):
+        """
+        (labels, checked labels) of every camera, viewport and renderer option.
+        Until the option panels are built these are the CONST defaults.
+        """
+        if self._optionsBuilt:
+            allButtons = self.camRadioButtons + self.viewportRadioButtons + self.rendererRadioButtons
+            return [str(each.text()) for each in allButtons], set([str(each.text()) for each in allButtons if each.isChecked()])
+        labels = self.lib.CAM_SETTINGS_OPTIONS + self.lib.VIEWPORT_SETTINGS_OPTIONS + self.lib.RENDERER_SETTINGS_OPTIONS
+        return labels, set(self.lib.CAM_SETTINGS_DEFAULT_ON + self.lib.VIEWPORT_SETTINGS_DEFAULT_ON + self.lib.RENDERER_SETTINGS_DEFAULT_ON)
+
+    @contextmanager
+    def _appSceneEdits(self):
+        """
+        Wrap the app's own scene edits (shot camera, render globals, frame range) in this. They are made again on every
+        playblast so they aren't the artist's unsaved changes: a scene that was saved before them is marked saved again
+        after, else the sharded, frame cache and output cache paths, which all work off the saved file, would never run.
+        """
+        wasModified = cmds.file(query = True, modified = True)
+        try:
+            yield
+        finally:
+            if not wasModified:
+                cmds.file(modified = False)
 
-        ############################################
-        ## Now add the groupboxes to the main layout.
-        logger.info('Building final Layout')
-        self.mainLayout.addWidget(self.infoGroupBox)
-        self.mainLayout.addWidget(self.cameraSettingsGroupBox)
-        self.mainLayout.addWidget(self.viewportSettingsGroupBox)
-        self.mainLayout.addWidget(self.rendererSettingsGroupBox)
-        logger.info('Building final Layout step 2')
-        if self.app.get_setting('isAsset'):
-            if self.app.get_setting('allowAssetTurnTableBuild'):
-                self.mainLayout.addWidget(self.turnTableGroupBox)
-            else:
-                pass
-        else:
-            logger.info('Building final Layout step 2.5')
+    def _prepareScene(self):
+        """
+        The scene side of the dialog: shot camera into the viewport, the modelEditor options and the render globals.
+        Runs on the first Playblast press instead of when the dialog opens, so the dialog shows straight away.
+        """
+        if self._scenePrepared:
+            return
+        if not self.app.get_setting('isAsset'):
             self._setupShotCamera()
-        logger.info('Building final Layout step 3')
-        self.mainLayout.addWidget(self.submissionGroupBox)
-        self.mainLayout.addWidget(self.commentGroupBox)
-        self.mainLayout.addStretch(1)
-        logger.info('Building final Layout complete..')
-
-        ###############################################################################
-        ## Now show or hide the options if the showOptions is turned on else hide these
-        if not self.app.get_setting('showOptions'):
-            self.groupBoxes = [self.infoGroupBox, self.cameraSettingsGroupBox, self.viewportSettingsGroupBox, self.rendererSettingsGroupBox]
-            for each in self.groupBoxes:
-                each.hide()
-
-        #######################################
-        ## Process all the radio button options
-        self._processRadioButtons()
-        logger.info('_processRadioButtons successful...')
-
-        #############################
-        ## Now set the default render globals
+        self._applyEditorState()
+        logger.info('_applyEditorState successful...')
         self._setupRenderGlobals()
-
-        logger.info('UI Built Successfully...')
+        self._scenePrepared = True
 
     def _buildAssetTurntableUI(self):
         """
@@ -453,13 +555,13 @@ class MainUI(QtGui.QWidget):
         Shot camera setup
         """
         camera = self.lib._findShotCamera()
-        if camera:
+        if camera and camera != -1:
             logger.info('camera: %s' % camera)
             ## Set the current modelEditors cam to this camera
             cmds.modelEditor(self.currentEditor, edit = True, camera = camera)
 
-            ## Now get the parent of the shape to send through to setup the camera Defaults.
-            getCamTransform = cmds.listRelatives(camera, parent = True)[0] ## need to send the camera transform to this function
+            ## Now get the parent of the shape to send through to setup the camera Defaults, the scene index already knows it.
+            getCamTransform = self.lib.getSceneIndex().transform(camera) ## need to send the camera transform to this function
 
             ## Setup the camearDefaults.
             self.lib._setCameraDefaults(getCamTransform)
@@ -513,264 +615,49 @@ class MainUI(QtGui.QWidget):
         cmds.select(clear = True)
 
     def _processRadioButtons(self):
-        self.editor = self.currentEditor
-        radioButtons = [self.camRadioButtons, self.viewportRadioButtons, self.rendererRadioButtons]
-        logger.info('Processing the radioButtonStates')
-        logger.info('CurrentEditor is: %s' % self.currentEditor)
-        for eachSettingList in radioButtons:
-            for eachSetting in eachSettingList:
-                if eachSetting.text() == 'NURBS Curves':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, nc = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, nc = False)
-                if eachSetting.text() == 'NURBS Surfaces':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, ns = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, ns = False)
-                if eachSetting.text() == 'Polygons':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, polymeshes = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, polymeshes = False)
-                if eachSetting.text() == 'Subdiv Surfaces':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, subdivSurfaces = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, subdivSurfaces = False)
-                if eachSetting.text() == 'Planes':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, planes = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, planes = False)
-                if eachSetting.text() == 'Lights':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, lights = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, lights = False)
-                if eachSetting.text() == 'Cameras':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, cameras = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, cameras = False)
-                if eachSetting.text() == 'Joints':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, joints = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, joints = False)
-                if eachSetting.text() == 'IK Handles':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, ikHandles = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, ikHandles = False)
-                if eachSetting.text() == 'Deformers':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, deformers = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, deformers = False)
-                if eachSetting.text() == 'Dynamics':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, dynamics = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, dynamics = False)
-                if eachSetting.text() == 'Fluids':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, fluids = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, fluids = False)
-                if eachSetting.text() == 'Hair Systems':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, hairSystems = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, hairSystems = False)
-                if eachSetting.text() == 'Follicles':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, follicles = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, follicles = False)
-                if eachSetting.text() == 'nCloths':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, nCloths = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, nCloths = False)
-                if eachSetting.text() == 'nParticles':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, nParticles = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, nParticles = False)
-                if eachSetting.text() == 'nRigids':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, nRigids = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, nRigids = False)
-                if eachSetting.text() == 'Dynamic Constraints':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, dynamicConstraints = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, dynamicConstraints = False)
-                if eachSetting.text() == 'Locators':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, locators = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, locators = False)
-                if eachSetting.text() == 'Dimensions':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, dimensions = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, dimensions = False)
-                if eachSetting.text() == 'Pivots':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, pivots = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, pivots = False)
-                if eachSetting.text() == 'Handles':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, handles = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, handles = False)
-                if eachSetting.text() == 'Textures':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, textures = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, textures = False)
-                if eachSetting.text() == 'Strokes':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, strokes = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, strokes = False)
-                if eachSetting.text() == 'Motion Trails':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, motionTrails = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, motionTrails = False)
-                if eachSetting.text() == 'Manipulators':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, manipulators = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, manipulators = False)
-                if eachSetting.text() == 'Clip Ghosts':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, clipGhosts = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, clipGhosts = False)
-                if eachSetting.text() == "NURBS CV's":
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, controlVertices = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, controlVertices = False)
-                if eachSetting.text() == 'NURBS Hulls':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, hulls = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, hulls = False)
-                if eachSetting.text() == 'Grid':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, grid = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, grid = False)
-                if eachSetting.text() == 'HUD':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, headsUpDisplay = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, headsUpDisplay = False)
-                if eachSetting.text() == 'Image Planes':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, imagePlane = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, imagePlane = False)
-                if eachSetting.text() == 'Selection Highlighting':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, selectionHiliteDisplay = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, selectionHiliteDisplay = False)
-                if eachSetting.text() == 'Texture Placements':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, textures = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, textures = False)
-                if eachSetting.text() == 'Plugin Shapes':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, pluginShapes = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, pluginShapes = False)
-                if eachSetting.text() == 'GPU Caches':
-                    try:## Extension only
-                        if eachSetting.isChecked():
-                            cmds.modelEditor(self.editor, edit = True,  pluginObjects = ['gpuCacheDisplayFilter', True])
-                        else:
-                            cmds.modelEditor(self.editor, edit = True, pluginObjects = ['gpuCacheDisplayFilter', False])
-                    except:
-                        pass
-                if eachSetting.text() == 'Nurbs CVs':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, cv = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, cv = False)
-                if eachSetting.text() == 'Nurbs CVs':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, cv = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, cv = False)
-                if eachSetting.text() == 'Use Default Mat':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, useDefaultMaterial = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, useDefaultMaterial = False)
-                if eachSetting.text() == 'X-Ray':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, xray = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, xray = False)
-                if eachSetting.text() == 'X-Ray Joints':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, jointXray = True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, jointXray = False)
-                if eachSetting.text() == 'Hardware Texturing':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, displayTextures = True, displayAppearance='smoothShaded', displayLights = "default")
-                        for eachSetting in self.viewportRadioButtons:
-                            if eachSetting.text() == 'SmoothShade All':
-                                eachSetting.setChecked(True)
-                            if eachSetting.text()  == 'WireFrame':
-                                eachSetting.setEnabled(False)
-                            if eachSetting.text()  == 'Bounding Box':
-                                eachSetting.setEnabled(False)
-
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, displayTextures = False)
-                        for eachSetting in self.viewportRadioButtons:
-                            if eachSetting.text()  == 'WireFrame':
-                                eachSetting.setEnabled(True)
-                            if eachSetting.text()  == 'Bounding Box':
-                                eachSetting.setEnabled(True)
-
-                if eachSetting.text() == 'WireFrame':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, displayAppearance = "wireframe")
-                if eachSetting.text() == 'SmoothShade All':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, displayAppearance = "smoothShaded")
-                if eachSetting.text() == 'Bounding Box':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, displayAppearance = "boundingBox")
-                if eachSetting.text() == 'Wireframe on Shaded':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, displayAppearance = "smoothShaded", activeOnly = False, wireframeOnShaded = True)
-                        for eachSetting in self.viewportRadioButtons:
-                            if eachSetting.text() == 'SmoothShade All':
-                                eachSetting.setChecked(True)
-                    else:
-                        cmds.modelEditor(self.editor, edit = True, wireframeOnShaded = False)
-                if eachSetting.text() == 'Default Renderer':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, rendererName =  'base_OpenGL_Renderer')
-                if eachSetting.text() == 'Viewport 2.0':
-                    if eachSetting.isChecked():
-                        cmds.modelEditor(self.editor, edit = True, rendererName = 'ogsRenderer')
+        """
+        Slot for every option radio button.
+        One click can toggle several buttons (exclusive groups, the buttons we check for the artist), so instead of
+        hitting the modelEditor per toggle we coalesce everything from this pass of the event loop into one apply.
+        """
+        if self._applyingEditorState or self._editorUpdatePending:
+            return
+        self._editorUpdatePending = True
+        QtCore.QTimer.singleShot(0, self._applyEditorState)
 
-        logger.info('Done processing each radio setting')
+    def _syncDependentButtons(self):
+        """
+        Hardware texturing and wireframe on shaded only work smooth shaded, so keep the shading buttons in step.
+        """
+        buttons = dict([(str(each.text()), each) for each in self.viewportRadioButtons])
+        hwTexturing = 'Hardware Texturing' in buttons and buttons['Hardware Texturing'].isChecked()
+        wireOnShaded = 'Wireframe on Shaded' in buttons and buttons['Wireframe on Shaded'].isChecked()
+        if (hwTexturing or wireOnShaded) and 'SmoothShade All' in buttons:
+            buttons['SmoothShade All'].setChecked(True)
+        for label in ('WireFrame', 'Bounding Box'):
+            if label in buttons:
+                buttons[label].setEnabled(not hwTexturing)
+
+    def _applyEditorState(self):
+        """
+        Works out the modelEditor state from the radio buttons and sends only what changed since the last apply
+        to the modelEditor in a single edit.
+        """
+        self._editorUpdatePending = False
+        self._applyingEditorState = True
+        try:
+            if self._optionsBuilt:
+                self._syncDependentButtons()
+            labels, checked = self._optionState()
+
+            wanted  = self.lib.buildEditorState(labels, checked)
+            changes = self.lib.diffEditorState(self._editorState, wanted)
+            if changes:
+                logger.info('CurrentEditor is: %s, changing: %s' % (self.currentEditor, changes))
+                self.lib.applyEditorState(self.currentEditor, changes)
+                self._editorState.update(changes)
+        finally:
+            self._applyingEditorState = False
 
     def doPlayblast(self):
         """
@@ -787,9 +674,29 @@ class MainUI(QtGui.QWidget):
         width           = self.app.get_setting("movie_width")
         height          = self.app.get_setting("movie_height")
         isAsset         = self.app.get_setting("isAsset")
-        user            = tank.util.get_current_user(self.app.tank)
-
-        self._setupPlayblast(work_template, width, height, comment, isAsset, user)
+        try:
+            user        = self.lib.getShotgunCache().currentUser(self.app.tank)
+        except self.lib.ShotgunUnavailable, e:
+            ## Only the version needs the user, and there won't be one while shotgun is offline
+            logger.warning('Could not get the current user from shotgun: %s' % e)
+            user        = None
+
+        self._trace = self.lib.startTrace(
+                                            'playblast',
+                                            secrets     = self.lib.getShotgunCredentials()[2:],
+                                            entity      = self.app.context.entity,
+                                            isAsset     = isAsset,
+                                            width       = width,
+                                            height      = height,
+                                            upload      = self.upload.isChecked()
+                                            )
+        try:
+            with self._trace.span('prepareScene'), self._appSceneEdits():
+                self._prepareScene()
+            self._setupPlayblast(work_template, width, height, comment, isAsset, user)
+        except Exception, e:
+            self._trace.finish(status = 'error', error = e)
+            raise
 
     def _setupPlayblast(self, work_template, width, height, comment, isAsset, user):
         """
@@ -799,6 +706,7 @@ class MainUI(QtGui.QWidget):
         store_on_disk = self.app.get_setting("store_on_disk")
         if not self.upload_to_shotgun and not store_on_disk:
             logger.info("App is not configured to store playblast on disk nor upload to shotgun! Check the shot_step.yml to fix this.")
+            self._trace.finish(status = 'disabled')
             return None
 
         ## Double check the artist wants to playblast.
@@ -806,32 +714,31 @@ class MainUI(QtGui.QWidget):
         if self.reply == QtGui.QMessageBox.Ok:
             ## Check the playblast ranged against shotguns cut in and out.
             logger.info('_setupPlayblast')
-            self._setFrameRanges(isAsset)
+            with self._trace.span('frameRange'), self._appSceneEdits():
+                self._setFrameRanges(isAsset)
             logger.info('_setupPlayblast')
 
             ## Now setup the output path for the mov
-            scene_path = os.path.abspath(cmds.file(query=True, sn= True))
-            try:
-                fields = work_template.get_fields(scene_path)
-            except:
-                QtGui.QMessageBox.information(None, "Aborted...", 'Please save your scene first before continuing. And relaunch the playblast tool...')
-                return -1
-
-            logger.info('fields: %s' % fields)
-            publish_path_template   = self.app.get_template("movie_path_template")
-            publish_path            = publish_path_template.apply_fields(fields)
-            work_path_template      = self.app.get_template("movie_workpath_template")
-            work_path               = work_path_template.apply_fields(fields)
+            with self._trace.span('templates'):
+                scene_path = os.path.abspath(cmds.file(query=True, sn= True))
+                try:
+                    fields = work_template.get_fields(scene_path)
+                except:
+                    QtGui.QMessageBox.information(None, "Aborted...", 'Please save your scene first before continuing. And relaunch the playblast tool...')
+                    self._trace.finish(status = 'unsaved')
+                    return -1
+
+                logger.info('fields: %s' % fields)
+                publish_path_template   = self.app.get_template("movie_path_template")
+                publish_path            = publish_path_template.apply_fields(fields)
+                work_path_template      = self.app.get_template("movie_workpath_template")
+                work_path               = work_path_template.apply_fields(fields)
 
             logger.info('publish_path_template: %s' % publish_path_template)
             logger.info('publish_path: %s' % publish_path)
             logger.info('work_path_template: %s' % work_path_template)
             logger.info('work_path: %s' % work_path)
 
-            if sys.platform == 'win32':
-                self.osPathToWorkFile = r'%s' % work_path
-                self.osPathToPublishFile = r'%s' % publish_path
-
             ## Now query the first and last frames of the animation
             getFirstFrame = cmds.playbackOptions(query = True, animationStartTime = True)
             getLastFrame = cmds.playbackOptions(query = True, animationEndTime = True)
@@ -849,123 +756,233 @@ class MainUI(QtGui.QWidget):
             logger.info('publish_path: \t%s' % publish_path)
             logger.info('work_path_template: \t%s' % work_path_template)
             logger.info('work_path: \t%s' % work_path)
-            logger.info('osPathToWorkFile: \t%s' % self.osPathToWorkFile.replace('\\', '/'))
-            logger.info('osPathToPublishFile: \t%s' % self.osPathToPublishFile.replace('\\', '/'))
 
             ## Now check for existing playblast. We check the publish folder because the working file gets moved into publish on upload.
             ## The playblast tool overwrites any playblasts it does with the same version name in the working directory.
-            if self._checkVersionExists(name = os.path.splitext(os.path.basename(publish_path))[0]):
+            ## When uploading the name is claimed with a placeholder version before rendering, so nobody can take it while we render.
+            ## With shotgun unreachable the playblast still goes to disk, it is submitted again once shotgun is back.
+            reservedVersion = None
+            offline         = False
+            with self._trace.span('versionCheck'):
+                try:
+                    if self.upload.isChecked():
+                        result = self._reserveVersion(publish_path, self._versionData(publish_path, store_on_disk, getFirstFrame, getLastFrame, comment, user))
+                        exists = result.collision
+                        if exists:
+                            logger.info(result.message())
+                        else:
+                            reservedVersion = result.version
+                    else:
+                        exists = self._checkVersionExists(publish_path)
+                except self.lib.ShotgunUnavailable, e:
+                    cmds.warning('Shotgun is unreachable, playblasting to disk only. Submit it again once shotgun is back: %s' % e)
+                    self._trace.set(shotgunOffline = True)
+                    exists  = False
+                    offline = True
+            if exists:
                 cmds.warning(self.EXISTSWARNING)
+                self._trace.finish(status = 'exists')
                 return -1
             else:
-                self._finishPlayblast(publish_path, width, height, store_on_disk, getFirstFrame, getLastFrame, comment, user, work_path)
+                self._finishPlayblast(publish_path, width, height, store_on_disk, getFirstFrame, getLastFrame, comment, user, work_path, reservedVersion, submit = self.upload.isChecked() and not offline)
+        else:
+            self._trace.finish(status = 'cancelled')
 
     def setProgress(self, progress):
         self.progressBar.setValue(progress)
 
-    def _finishPlayblast(self, publish_path, width, height, store_on_disk, getFirstFrame, getLastFrame, comment, user, work_path):
+    def _finishPlayblast(self, publish_path, width, height, store_on_disk, getFirstFrame, getLastFrame, comment, user, work_path, reservedVersion = None, submit = True):
         ## Now do the playblast if the user selected okay or there wasn't a duplicate found.
         logger.info('Duplicate check passed. Playblasting...')
 
-        ## Now render the playblast
-        self._render_pb_in_maya(getFirstFrame, getLastFrame, publish_path, work_path, width, height)
+        ## Now render the playblast, to local scratch if there is one so the encoder isn't writing over the network
+        scratch_path = self._scratchPath(work_path)
+        render_path = scratch_path or work_path
+        ## Keep the reserved name's lease alive however long the render takes
+        keeper = self.lib.ReservationKeeper(reservedVersion, self.lib.getShotgunPool().connection, self._reservationLease()).start() if reservedVersion else None
+        try:
+            with self._trace.span('playblast'):
+                fingerprint = self._outputFingerprint(getFirstFrame, getLastFrame, render_path, width, height)
+                if not (fingerprint and self._reuseOutput(fingerprint, render_path)):
+                    ## A new file rather than rewriting the old one in place, whatever else still points at it keeps its movie
+                    if os.path.exists(render_path):
+                        os.remove(render_path)
+                    self._render_pb_in_maya(getFirstFrame, getLastFrame, publish_path, render_path, width, height)
+                    if fingerprint and os.path.exists(render_path):
+                        cache = self._outputCache(render_path)
+                        cache.store(fingerprint, render_path)
+                        cache.evict()
+        except:
+            ## Render failed or was interrupted, give the reserved name back.
+            if reservedVersion:
+                self._releaseVersion(reservedVersion)
+            raise
+        finally:
+            if keeper:
+                keeper.stop()
         logger.info('PlayBlast finished..')
+        frames = int(getLastFrame + self.lib.PB_END_HANDLE - getFirstFrame + 1)
+        self._trace.set(framesRendered = frames, secondsPerFrame = round(self._trace.duration('playblast') / max(frames, 1), 4))
 
         ## Check if uploading is enabled in the UI and do the uploading if it is, else we will finish up here.
-        if self.upload.isChecked():
-            logger.info('Upload is turned on.. processing version to sg now..')
-
-            ## Move the working file to the publish path
-            try:
-                logger.info('RENAMING: osPathToWorkFile to osPathToPublishFile')
-                os.rename(self.osPathToWorkFile.replace('\\', '/'), self.osPathToPublishFile.replace('\\', '/'))
-            except:
-                logger.info('FAILED: \tTo rename osPathToWorkFile to osPathToPublishFile')
-                ## This could fail because the process is in use, and not the fact a freaking published file exists, due to maya trying to open the playblast once it's done!
-                ## So a quick check here to make sure it doesn't exist.. if it doesn't and it failed COPY it instead. FU maya...
-                if not os.path.exists(publish_path):
-                    logger.info('FAILED: \tTo rename because file is IN USE. Using shutil to copy instead.')
-                    shutil.copyfile(self.osPathToWorkFile.replace('\\', '/'), self.osPathToPublishFile.replace('\\', '/'))
-                else:
-                    logger.info('FAILED: \tTo rename because file already exists.. how the heck the remove previously failed.. who knows.. but try again now..')
-                    os.remove(self.osPathToPublishFile.replace('\\', '/'))
-                    os.rename(self.osPathToWorkFile.replace('\\', '/'), self.osPathToPublishFile.replace('\\', '/'))
-
-            ## Now submit the version to shotgun
-            logger.info('Submitting vesion info to shotgun...')
-
-            ## Doing a double check here for existing version in shotgun just to be on the safe side.
-            if not self._checkVersionExists(name = os.path.splitext(os.path.basename(publish_path))[0]):
-                sg_version = self._submit_version(
-                                                  path_to_movie     = publish_path,
-                                                  store_on_disk     = store_on_disk,
-                                                  first_frame       = getFirstFrame,
-                                                  last_frame        = getLastFrame,
-                                                  comment           = comment,
-                                                  user              = user
-                                                  )
-                logger.info('Version Submitted to shotgun successfully')
-
-                ## Uploading...
-                ## Now upload in a new thread and make our own event loop to wait for the thread to finish.
-                self.progressBar        = self.lib.ProgressBarUI()
-                self.progressBar.show()
-
-                logger.info('Uploading mov to shotgun for review.')
-
-                ######################################
-                ##### THE EVENT LOOP THREAD TO UPLOAD
-                event_loop = QtCore.QEventLoop()
-                logger.info('event_loop set...')
-
-                fileSize            = os.stat('%s' % publish_path)
-                fileInMB            = float(fileSize.st_size/1000000)
-                ##speed : 100 KBs 6mb per 60seconds approx
-                timeToUploadSecs    = (fileInMB/6)*100
-                step                = timeToUploadSecs/100
-                logger.info('step: %s' % step)
-
-                thread              = self.lib.UploaderThread(self.app, sg_version, publish_path, self.upload_to_shotgun)
-                logger.info('thread set...')
-                thread.finished.connect(self.progressBar.hide)
-                thread.finished.connect(event_loop.quit)
-                thread.start()
-                x = 1
-                i = 0
-                while (x > 0):
-                    threadRunning = thread.isRunning()
-                    if threadRunning:
-                        self.progressBar.updateProgress(i, os.path.splitext(os.path.basename(publish_path))[0])
-                        i = i + 1
-                        time.sleep(step)
-                    else:
-                        x = 0
-                logger.info('thread started...')
-                event_loop.exec_()
-
-                logger.info('event_loop.exec_...')
-                ######################################
-                ### THREAD FNISHED....
-
-                ## log any errors generated in the thread
-                for e in thread.get_errors():
-                    self.app.log_error(e)
-                    print e
+        if submit:
+            logger.info('Upload is turned on.. queuing the submission to sg now..')
+
+            ## Grab everything the submission needs from the UI now, the stages run in the background and never touch the UI.
+            deleteHrcGrp = getattr(self, 'deleteHrcGrp', None)
+            job = self.lib.SubmitJob(
+                                    name            = os.path.splitext(os.path.basename(publish_path))[0],
+                                    workPath        = work_path.replace('\\', '/'),
+                                    publishPath     = publish_path.replace('\\', '/'),
+                                    versionData     = self._versionData(
+                                                                        path_to_movie     = publish_path,
+                                                                        store_on_disk     = store_on_disk,
+                                                                        first_frame       = getFirstFrame,
+                                                                        last_frame        = getLastFrame,
+                                                                        comment           = comment,
+                                                                        user              = user
+                                                                        ),
+                                    storeOnDisk     = store_on_disk,
+                                    partSize        = self.app.get_setting('upload_part_size_mb') * 1024 * 1024,
+                                    workers         = self.app.get_setting('upload_workers'),
+                                    maxMemory       = self.app.get_setting('upload_max_memory_mb') * 1024 * 1024,
+                                    useMmap         = self.app.get_setting('upload_use_mmap'),
+                                    deleteTurntable = bool(self.app.get_setting('isAsset') and deleteHrcGrp and deleteHrcGrp.isChecked()),
+                                    spoolDir        = self.app.getSpoolDir(),
+                                    trace           = self._trace,
+                                    reservedVersion = reservedVersion,
+                                    hashField       = self.app.get_setting('movie_hash_field') or None,
+                                    scratchPath     = scratch_path and scratch_path.replace('\\', '/'),
+                                    thumbnail       = self.app.get_setting('upload_thumbnail'),
+                                    encoderPath     = self.app.get_setting('encoder_path')
+                                    )
+            ## The move, version create, upload, thumbnail and cleanup all happen off the main thread so maya is usable again straight away.
+            ## The queue finishes the trace once the job is done.
+            self._getSubmitQueue().submit(job)
+        else:
+            if reservedVersion:
+                self._releaseVersion(reservedVersion)
+            if os.path.exists(render_path):
+                self._trace.set(fileSize = os.path.getsize(render_path))
+            if scratch_path and os.path.exists(scratch_path):
+                ## Nothing reads the scratch copy after this, so it is moved rather than copied.
+                self.lib.getTransferQueue().submit(scratch_path, work_path)
+            self._trace.finish()
+
+    def _scratchPath(self, work_path):
+        """
+        Where to render work_path to on local scratch, or None when scratch_dir isn't set.
+        """
+        scratchRoot = self.app.get_setting('scratch_dir')
+        if not scratchRoot:
+            return None
+        path = self.lib.scratchPath(os.path.expanduser(scratchRoot), work_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self._trace.set(scratchPath = path)
+        return path
+
+    def _outputCache(self, work_path):
+        return self.lib.OutputCache(
+                                    cacheDir    = os.path.expanduser(self.app.get_setting('output_cache_dir') or self.lib.OUTPUT_CACHE_DIR),
+                                    maxBytes    = self.app.get_setting('output_cache_size_gb') * 1024 * 1024 * 1024,
+                                    movieFormat = os.path.splitext(work_path)[1].lstrip('.') or 'mov',
+                                    )
+
+    def _outputFingerprint(self, first_frame, last_frame, work_path, width, height):
+        """
+        Fingerprint of everything that goes into the movie, or None when the output can't be reused.
+        """
+        if not self.app.get_setting('output_cache'):
+            return None
+        if cmds.file(query = True, modified = True):
+            logger.info('Output cache: miss, the scene has unsaved changes.')
+            self._trace.set(outputCache = 'unsaved')
+            return None
+        if hasattr(self, 'rerenderFrames') and str(self.rerenderFrames.text()).strip():
+            self._trace.set(outputCache = 'forced')
+            return None
+        labels, checked = self._optionState()
+        with self._trace.span('fingerprint'):
+            return self.lib.outputFingerprint(
+                                            scene           = self.lib.sceneContentKey(os.path.abspath(cmds.file(query = True, sn = True)), stripCurves = False),
+                                            dependencies    = self.lib.dependencyKey(self.lib.sceneDependencies()),
+                                            camera          = cmds.modelEditor(self.currentEditor, query = True, camera = True),
+                                            firstFrame      = first_frame,
+                                            lastFrame       = last_frame,
+                                            width           = width,
+                                            height          = height,
+                                            quality         = self.qualityPercent.value(),
+                                            percent         = self.sizePercent.value(),
+                                            editor          = self.lib.buildEditorState(labels, checked),
+                                            pb              = self.lib.pbSettings(),
+                                            movieFormat     = os.path.splitext(work_path)[1],
+                                            renderMode      = [self.app.get_setting(each) for each in ('sharded_playblast', 'stream_encode', 'frame_cache')],
+                                            encoder         = [self.app.get_setting('encoder_path'), self.app.get_setting('encoder_args')],
+                                            maya            = cmds.about(version = True),
+                                            )
+
+    def _reuseOutput(self, fingerprint, work_path):
+        """
+        Puts the movie from an identical earlier playblast at work_path. Returns True on a hit.
+        """
+        source = self._outputCache(work_path).fetch(fingerprint, work_path)
+        if source:
+            logger.info('Output cache: hit, same scene and settings as %s, skipping the playblast.' % source)
+            self._trace.set(outputCache = 'hit', renderMode = 'reused')
+            return True
+        logger.info('Output cache: miss (%s)' % fingerprint)
+        self._trace.set(outputCache = 'miss')
+        return False
 
-                ## Remove from file system if required
-                if not store_on_disk and os.path.exists(publish_path):
-                    os.unlink(publish_path)
+    def _getSubmitQueue(self):
+        """
+        Returns the shared submit queue, hooking this UI up to its signals the first time.
+        """
+        queue = self.lib.getSubmitQueue()
+        if not getattr(self, '_submitQueueConnected', False):
+            queue.jobQueued.connect(self._jobQueued)
+            queue.stageStarted.connect(self._jobStageStarted)
+            queue.progress.connect(self._jobProgress)
+            queue.uploadQueued.connect(self._jobUploadQueued)
+            queue.jobFinished.connect(self._jobFinished)
+            self._submitQueueConnected = True
+            self.progressBar = self.lib.ProgressBarUI(title = 'Upload Progress:')
+        return queue
+
+    def _jobQueued(self, name, pending):
+        logger.info('Queued %s for submission, %s submission(s) pending.' % (name, pending))
+        self.progressBar.show()
+
+    def _jobStageStarted(self, name, stage):
+        logger.info('%s: %s...' % (name, stage))
+        self.progressBar.doingWhat = '%s (%s)' % (name, stage)
+        self.progressBar.resetRate()
+        self.progressBar.updateProgress(0, self.progressBar.doingWhat)
+
+    def _jobProgress(self, name, sent, total):
+        self.progressBar.updateBytes(sent, total)
+
+    def _jobUploadQueued(self, name, position):
+        if position:
+            self.progressBar.updateProgress(0, '%s (waiting to upload, number %s in the queue)' % (name, position))
+        else:
+            self.progressBar.updateProgress(0, self.progressBar.doingWhat)
 
-                ## Remove turntable if option is selected
-                if self.app.get_setting('isAsset'):
-                    if self.deleteHrcGrp.isChecked():
-                        cmds.delete('turnTable_hrc')
+    def _jobFinished(self, name, errors):
+        ## log any errors generated in the submission
+        for e in errors:
+            self.app.log_error(e)
+            print e
 
-                logger.info('Upload to shotgun finished.')
-                cmds.warning('UPLOAD COMPLETE!')
+        if errors:
+            cmds.warning('SUBMISSION OF %s FAILED! %s' % (name, errors[-1]))
+        else:
+            logger.info('Upload to shotgun finished.')
+            cmds.warning('UPLOAD COMPLETE! %s' % name)
 
-            else:
-                cmds.warning(self.EXISTSWARNING)
+        if not self.lib.getSubmitQueue().pending():
+            self.progressBar.hide()
 
     def _setFrameRanges(self, isAsset):
         """
@@ -978,9 +995,15 @@ class MainUI(QtGui.QWidget):
                 getLastFrame    = cmds.playbackOptions(query = True, animationEndTime = True)
                 self.set_frame_range(self.app.engine.name, getFirstFrame, getLastFrame)
         else:
-            (new_in, new_out)           = self.get_frame_range_from_shotgun()
+            try:
+                (new_in, new_out)       = self.get_frame_range_from_shotgun()
+            except self.lib.ShotgunUnavailable, e:
+                cmds.warning('Could not get the cut in and out from shotgun, keeping the scene frame range: %s' % e)
+                return
             (current_in, current_out)   = self.get_current_frame_range(self.app.engine.name)
             if new_in is None or new_out is None:
+                ## Don't keep serving the empty range, the next playblast should see the cut once someone fills it in.
+                self.lib.getShotgunCache().invalidate('frameRange', self.app.context.entity['type'], self.app.context.entity['id'])
                 # lazy import so that this script still loads in batch mode
                 message =  "Shotgun has not yet been populated with \n"
                 message += "in and out frame data for this Shot."
@@ -1009,13 +1032,12 @@ class MainUI(QtGui.QWidget):
         entity          = self.app.context.entity
 
         sg_entity_type  = self.app.context.entity["type"]
-        sg_filters      = [["id", "is", entity["id"]]]
 
         sg_in_field     = self.app.get_setting("sg_in_frame_field")
         sg_out_field    = self.app.get_setting("sg_out_frame_field")
-        fields          = [sg_in_field, sg_out_field]
 
-        data            = self.app.shotgun.find_one(sg_entity_type, filters=sg_filters, fields=fields)
+        ## Served from the session cache, repeat playblasts of the same shot don't go back to shotgun.
+        data            = self.lib.getShotgunCache().frameRange(self.lib.guardShotgun(self.app.shotgun), entity, sg_in_field, sg_out_field)
 
         # check if fields exist!
         if sg_in_field not in data:
@@ -1046,57 +1068,64 @@ class MainUI(QtGui.QWidget):
         STOLEN FROM tk-multi-setframerange v0.1.7
         """
         if engine == "tk-maya":
-            import pymel.core as pm
-            # set frame ranges for plackback
-            pm.playbackOptions(minTime=in_frame,
-                               maxTime=out_frame,
-                               animationStartTime=in_frame,
-                               animationEndTime=out_frame)
+            # set frame ranges for plackback, plain cmds so we never pay for importing pymel
+            cmds.playbackOptions(minTime=in_frame,
+                                 maxTime=out_frame,
+                                 animationStartTime=in_frame,
+                                 animationEndTime=out_frame)
             # set frame ranges for rendering
-            defaultRenderGlobals = pm.PyNode('defaultRenderGlobals')
-            defaultRenderGlobals.startFrame.set(in_frame)
-            defaultRenderGlobals.endFrame.set(out_frame)
+            cmds.setAttr('defaultRenderGlobals.startFrame', in_frame)
+            cmds.setAttr('defaultRenderGlobals.endFrame', out_frame)
         else:
             raise tank.TankError("Don't know how to set current frame range for engine %s!" % engine)
 
-    def _checkVersionExists(self, name):
-        ## Instance the api for talking directly to shotgun.
-        try:
-            ## Try getting it from the default config CONST first
-            base_url        = configCONST.SHOTGUN_URL
-            script_name     = configCONST.SHOTGUN_TOOLKIT_NAME
-            api_key         = configCONST.SHOTGUN_TOOLKIT_API_KEY
-        except:
-            ## Else get from the lib CONST
-            base_url       = self.lib.SHOTGUN_URL
-            script_name    = self.lib.SHOTGUN_TOOLKIT_NAME
-            api_key        = self.lib.SHOTGUN_TOOLKIT_API_KEY
+    def _checkVersionExists(self, path_to_movie):
+        ## Grab the credentials for talking directly to shotgun.
+        ## These come from the default config CONST first, else from the lib CONST
+        base_url, script_name, api_key = self.lib.getShotgunCredentials()
 
         logger.info('base_url: %s' % base_url)
         logger.info('script_name: %s' % script_name)
-        logger.info('api_key: %s' % api_key)
 
-        self.sgsrv      = Shotgun(base_url = base_url, script_name = script_name, api_key = api_key, ensure_ascii=True, connect=True)
-        logger.info('self.sgsrv%s' % self.sgsrv)
+        ## Reuse a pooled connection instead of a brand new handshake + auth on every check.
+        pool = self.lib.getShotgunPool()
+        with pool.connection(base_url, script_name, api_key) as sgsrv:
+            ## Match the code the version gets created with as well as the bare file name older submissions used.
+            exists = self.lib.findVersion(sgsrv, self.lib.versionCodes(path_to_movie), self.app.context.project, self._reservationLease())
+        logger.info('ShotgunPool stats: %s' % pool.stats())
 
-        exists = self.sgsrv.find_one('Version', filters = [["code", "is", name]], fields = ['code'])
         if exists:
             return True
         else:
             return False
 
-    def _submit_version(self, path_to_movie, store_on_disk, first_frame, last_frame, comment, user):
+    def _reservationLease(self):
+        return self.app.get_setting('reservation_lease_minutes') * 60
+
+    def _reserveVersion(self, path_to_movie, data):
         """
-        Create a version in Shotgun for this path and linked to this publish.
+        Claims the version name with a placeholder version in shotgun. Returns VersionReserved or VersionCollision.
+        """
+        with self.lib.getShotgunPool().connection() as sgsrv:
+            return self.lib.reserveVersion(sgsrv, data, self.lib.versionCodes(path_to_movie),
+                                           status = self.app.get_setting('reservation_status'), lease = self._reservationLease())
+
+    def _releaseVersion(self, version):
+        try:
+            with self.lib.getShotgunPool().connection() as sgsrv:
+                self.lib.releaseReservation(sgsrv, version)
+        except Exception, e:
+            logger.warning('Could not release the reserved version %s: %s' % (version['id'], e))
+
+    def _versionData(self, path_to_movie, store_on_disk, first_frame, last_frame, comment, user):
+        """
+        Build the data for the version in Shotgun for this path and linked to this publish.
+        The version itself gets created by the submit queue.
         """
         # get current shotgun user
         current_user    = user
-        name            = os.path.splitext(os.path.basename(path_to_movie))[0]
-        # create a name for the version based on the file name grab the file name, strip off extension
-        # do some replacements
-        name            = name.replace("_", " ")
-        # and capitalize
-        name            = name.capitalize()
+        # create a name for the version based on the file name, underscores to spaces and capitalized
+        name            = self.lib.versionCode(path_to_movie)
         data = {
             "code":         name,
             "entity":       self.app.context.entity,
@@ -1110,8 +1139,7 @@ class MainUI(QtGui.QWidget):
         if store_on_disk:
             data["sg_path_to_movie"] = path_to_movie
 
-        sg_version = self.app.tank.shotgun.create("Version", data)
-        return sg_version
+        return data
 
     def _render_pb_in_maya(self, first_frame, last_frame, publish_path, work_path, width, height):
         """
@@ -1126,7 +1154,7 @@ class MainUI(QtGui.QWidget):
         cmds.modelEditor(self.currentEditor, e = True, activeView = True)
 
         ## Find sound files and use the first found if there are more than one.
-        soundFiles = cmds.ls(type = 'audio')
+        soundFiles = [self.lib.getSceneIndex().shortName(each) for each in self.lib.getSceneIndex().nodes('audio')]
         if soundFiles:
             sound = soundFiles[0]
             if len(soundFiles) > 1:
@@ -1137,6 +1165,34 @@ class MainUI(QtGui.QWidget):
 
         logger.info('sound: %s' % sound)
 
+        ## Inclusive last frame to render, the same in every render mode
+        end_frame = last_frame + self.lib.PB_END_HANDLE
+
+        if self.app.get_setting('sharded_playblast'):
+            if cmds.file(query = True, modified = True):
+                cmds.warning('Scene has unsaved changes, the sharded playblast renders the saved scene so playblasting in maya instead.')
+            else:
+                self._trace.set(renderMode = 'sharded')
+                self._render_sharded_pb(first_frame, end_frame, work_path, width, height, sound)
+                return
+
+        if self.app.get_setting('frame_cache'):
+            if cmds.file(query = True, modified = True):
+                cmds.warning('Scene has unsaved changes, the frame cache keys frames on the saved scene so rendering every frame.')
+            elif self.lib.timeDependentNodes():
+                cmds.warning('Scene has expressions, caches or dynamics, frames can change without their keys changing so rendering every frame.')
+            else:
+                self._trace.set(renderMode = 'cached')
+                self._render_cached_pb(first_frame, end_frame, work_path, width, height, sound)
+                return
+
+        if self.app.get_setting('stream_encode'):
+            self._trace.set(renderMode = 'streamed')
+            self._render_streamed_pb(first_frame, end_frame, work_path, width, height, sound)
+            return
+
+        self._trace.set(renderMode = 'maya')
+
         ############################
         ## Now do the main playblast
         if self.upload_to_shotgun:
@@ -1152,7 +1208,7 @@ class MainUI(QtGui.QWidget):
                         combineSound    = self.lib.PB_COMBINESOUND,
                         compression     = self.lib.PB_COMPRESSION,
                         startTime       = first_frame,
-                        endTime         = last_frame + 1,
+                        endTime         = end_frame,
                         forceOverwrite  = self.lib.PB_FORCEOVERWRITE,
                         format          = self.lib.PB_FORMAT,
                         framePadding    = self.lib.PB_FRAMEPADDING,
@@ -1167,32 +1223,170 @@ class MainUI(QtGui.QWidget):
                         sound           = sound
                         )
 
+    def _render_sharded_pb(self, first_frame, last_frame, work_path, width, height, sound):
+        """
+        Renders the range in chunks across several headless mayapy processes and stitches the frames into work_path.
+        """
+        mayapy = self.app.get_setting('mayapy_path') or self.lib.defaultMayapy()
+        shards = self.lib.ShardedPlayblast(
+                                            scenePath       = os.path.abspath(cmds.file(query = True, sn = True)),
+                                            firstFrame      = first_frame,
+                                            lastFrame       = last_frame,
+                                            output          = work_path,
+                                            camera          = cmds.modelEditor(self.currentEditor, query = True, camera = True),
+                                            editorState     = self.lib.buildEditorState(*self._optionState()),
+                                            renderGlobals   = self._renderGlobalValues(),
+                                            width           = width,
+                                            height          = height,
+                                            percent         = self.sizePercent.value(),
+                                            quality         = self.qualityPercent.value(),
+                                            workers         = self.app.get_setting('shard_workers'),
+                                            chunkSize       = self.app.get_setting('shard_chunk_size'),
+                                            rendererCommand = [mayapy, self.lib.PLAYBLAST_WORKER_SCRIPT],
+                                            framePadding    = self.lib.PB_FRAMEPADDING,
+                                            fps             = self.lib.getSceneFps(),
+                                            sound           = cmds.getAttr('%s.filename' % sound) if sound else None,
+                                            encoderPath     = self.app.get_setting('encoder_path'),
+                                            encoderArgs     = self.app.get_setting('encoder_args'),
+                                            )
+        logger.info('Sharded playblast to work_path: %s' % work_path)
+        shards.run(progressCallback = lambda done, count: logger.info('Sharded playblast: %s of %s chunks done' % (done, count)))
+
+    def _render_cached_pb(self, first_frame, last_frame, work_path, width, height, sound):
+        """
+        Only renders the frames whose inputs changed since they were cached, links the rest out of the frame cache and encodes.
+        """
+        cache       = self.lib.FrameCache(
+                                            cacheDir    = os.path.expanduser(self.app.get_setting('frame_cache_dir') or self.lib.FRAME_CACHE_DIR),
+                                            maxBytes    = self.app.get_setting('frame_cache_size_gb') * 1024 * 1024 * 1024,
+                                            )
+        labels, checked = self._optionState()
+        settings    = self.lib.settingsKey(
+                                            camera      = cmds.modelEditor(self.currentEditor, query = True, camera = True),
+                                            editor      = self.lib.buildEditorState(labels, checked),
+                                            width       = width,
+                                            height      = height,
+                                            percent     = self.sizePercent.value(),
+                                            quality     = self.qualityPercent.value(),
+                                            maya        = cmds.about(version = True),
+                                            )
+        with self._trace.span('frameKeys'):
+            scene   = self.lib.sceneContentKey(os.path.abspath(cmds.file(query = True, sn = True)))
+            keys    = self.lib.frameKeys(settings, scene, self.lib.readAnimCurves(), first_frame, last_frame)
+
+        frameDir    = '%s_frames' % os.path.splitext(work_path)[0]
+        framePrefix = os.path.join(frameDir, os.path.splitext(os.path.basename(work_path))[0])
+        pattern     = self.lib.sequencePattern(framePrefix, self.lib.FRAME_CACHE_FORMAT, self.lib.PB_FRAMEPADDING)
+        framePath   = lambda frame: pattern % frame
+        if not os.path.isdir(frameDir):
+            os.makedirs(frameDir)
+        try:
+            forced  = self.lib.parseFrameRanges(self.rerenderFrames.text()) if hasattr(self, 'rerenderFrames') else []
+            dirty   = cache.restore(keys, framePath, forced)
+            logger.info('Frame cache: %s of %s frames cached, rendering %s' % (len(keys) - len(dirty), len(keys), self.lib.framesToRanges(dirty)))
+            self._trace.set(framesCached = len(keys) - len(dirty), framesDirty = len(dirty))
+            for start, end in self.lib.framesToRanges(dirty):
+                cmds.playblast(
+                                filename        = framePrefix,
+                                activeEditor    = self.lib.PB_ACTIVEEDITOR,
+                                clearCache      = self.lib.PB_CLEARCACHE,
+                                compression     = self.lib.FRAME_CACHE_FORMAT,
+                                startTime       = start,
+                                endTime         = end,
+                                forceOverwrite  = True,
+                                format          = 'image',
+                                framePadding    = self.lib.PB_FRAMEPADDING,
+                                offScreen       = self.lib.PB_OFFSCREEN,
+                                options         = self.lib.PB_OPTIONS,
+                                percent         = self.sizePercent.value(),
+                                quality         = self.qualityPercent.value(),
+                                showOrnaments   = self.lib.PB_SHOWORNAMENTS,
+                                viewer          = False,
+                                widthHeight     = [width, height],
+                                )
+                for frame in range(start, end + 1):
+                    cache.store(keys[frame], framePath(frame))
+            with self._trace.span('encode'):
+                self.lib.encodeSequence(
+                                        pattern     = pattern,
+                                        firstFrame  = first_frame,
+                                        output      = work_path,
+                                        fps         = self.lib.getSceneFps(),
+                                        sound       = cmds.getAttr('%s.filename' % sound) if sound else None,
+                                        encoderPath = self.app.get_setting('encoder_path'),
+                                        encoderArgs = self.app.get_setting('encoder_args'),
+                                        )
+        finally:
+            shutil.rmtree(frameDir, ignore_errors = True)
+        cache.evict()
+
+    def _render_streamed_pb(self, first_frame, last_frame, work_path, width, height, sound):
+        """
+        Playblasts to an image sequence in batches while the encoder eats the frames as they land.
+        The batches wait on the encoder so the scratch frames on disk never go over stream_max_pending_frames.
+        """
+        maxPending  = self.app.get_setting('stream_max_pending_frames')
+        frameDir    = '%s_frames' % os.path.splitext(work_path)[0]
+        framePrefix = os.path.join(frameDir, os.path.splitext(os.path.basename(work_path))[0])
+        if not os.path.isdir(frameDir):
+            os.makedirs(frameDir)
+
+        stream = self.lib.StreamEncoder(
+                                        pattern     = self.lib.sequencePattern(framePrefix, 'png', self.lib.PB_FRAMEPADDING),
+                                        firstFrame  = first_frame,
+                                        lastFrame   = last_frame,
+                                        output      = work_path,
+                                        fps         = self.lib.getSceneFps(),
+                                        sound       = cmds.getAttr('%s.filename' % sound) if sound else None,
+                                        encoderPath = self.app.get_setting('encoder_path'),
+                                        encoderArgs = self.app.get_setting('encoder_args'),
+                                        maxPending  = maxPending,
+                                        )
+        logger.info('Stream playblasting to work_path: %s' % work_path)
+        stream.start()
+        try:
+            for start, end in self.lib.splitFrameRange(first_frame, last_frame, max(maxPending / 2, 1)):
+                stream.waitForCapacity(end - start + 1)
+                cmds.playblast(
+                                filename        = framePrefix,
+                                activeEditor    = self.lib.PB_ACTIVEEDITOR,
+                                clearCache      = self.lib.PB_CLEARCACHE,
+                                compression     = 'png',
+                                startTime       = start,
+                                endTime         = end,
+                                forceOverwrite  = True,
+                                format          = 'image',
+                                framePadding    = self.lib.PB_FRAMEPADDING,
+                                offScreen       = self.lib.PB_OFFSCREEN,
+                                options         = self.lib.PB_OPTIONS,
+                                percent         = self.sizePercent.value(),
+                                quality         = self.qualityPercent.value(),
+                                showOrnaments   = self.lib.PB_SHOWORNAMENTS,
+                                viewer          = False,
+                                widthHeight     = [width, height],
+                                )
+                stream.markRendered(end)
+            stream.finish()
+        except:
+            stream.abort()
+            raise
+        finally:
+            shutil.rmtree(frameDir, ignore_errors = True)
+
     def _setupRenderGlobals(self):
         """
         Used to setup your renderGlobals.
-        We set the start and end times and the default widths and then call the external for studio customisation.
+        We set the default resolution and the viewport 2.0 HW globals and then call the external for studio customisation.
+        The sharded workers apply the same values, see _renderGlobalValues.
         """
-        # Set globals default resolution
-        cmds.setAttr('defaultResolution.width', self.renderWidth)
-        cmds.setAttr('defaultResolution.height', self.renderHeight)
-        cmds.setAttr('defaultResolution.pixelAspect', 1)
-        cmds.setAttr('defaultResolution.deviceAspectRatio', 1.7778)
+        self.lib.applyRenderGlobals(self._renderGlobalValues())
 
         ## Setup any custom globals from the users lib file.
         self.lib.setRenderGlobals()
-
-        ## Setup the viewport 2.0 HW globals
-        self._setupVP2()
         print 'Default render settings initialized.'
 
-    def _setupVP2(self):
+    def _renderGlobalValues(self):
         #cmds.optionMenuGrp('VP20multisampleMenu', e = True,  value = 16)
         #cmds.attrFieldSliderGrp('attrFieldSliderGrp21', e = True, en = True)
         #cmds.setAttr("hardwareRenderingGlobals.textureMaxResolution", 128)
-        cmds.setAttr("hardwareRenderingGlobals.multiSampleEnable", self.lib.HW_MULTI_SAMPLE_ENABLE)
-        cmds.setAttr("hardwareRenderingGlobals.ssaoEnable", self.lib.HW_SSAC_ENABLE)
-        cmds.setAttr("hardwareRenderingGlobals.ssaoAmount", self.lib.HW_SSAC_AMOUNT)
-        cmds.setAttr("hardwareRenderingGlobals.ssaoRadius", self.lib.HW_SSAC_RADIUS)
-        cmds.setAttr("hardwareRenderingGlobals.ssaoFilterRadius", self.lib.HW_FILTER_RADIUS)
-        cmds.setAttr("hardwareRenderingGlobals.ssaoSamples", self.lib.HW_SSAO_SAMPLES)
-        cmds.setAttr("hardwareRenderingGlobals.consolidateWorld", self.lib.HW_CONSOLODATEWORLD)
\ No newline at end of file
+        return self.lib.renderGlobalValues(self.lib, self.renderWidth, self.renderHeight)
\ No newline at end of file
@@ -0,0 +1,433 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Benchmarks for the submit path, run outside maya against the fake maya.cmds, tank and shotgun_api3 in
+benchmarks/fakes. Times each step the artist waits on and writes the numbers as json so runs on different
+commits can be compared:
+
+    python benchmarks/benchSubmit.py --repeat 5 --output before.json
+    git checkout my-branch
+    python benchmarks/benchSubmit.py --repeat 5 --output after.json --compare before.json
+
+The fakes sleep for the configured latencies, so the numbers show how many round trips / how much waiting
+each step does, not how fast a real shotgun site is.
+"""
+import os, sys, time, json, errno, shutil, tempfile, platform, subprocess, argparse, logging
+
+HERE    = os.path.dirname(os.path.abspath(__file__))
+ROOT    = os.path.dirname(HERE)
+sys.path[0:0] = [os.path.join(HERE, 'fakes'), os.path.join(ROOT, 'python'), ROOT]
+logging.basicConfig(level = logging.WARNING)
+
+import fakeConfig
+import lib
+import app
+
+MOVIE_NAME = 'shot010_anim_v001'
+
+
+class FakeButton(object):
+    def __init__(self, label, checked = False):
+        self._label     = label
+        self._checked   = checked
+        self._enabled   = True
+
+    def text(self):
+        return self._label
+
+    def isChecked(self):
+        return self._checked
+
+    def setChecked(self, checked):
+        self._checked = checked
+
+    def setEnabled(self, enabled):
+        self._enabled = enabled
+
+    def currentText(self):
+        return self._label
+
+
+class FakeContext(object):
+    entity  = {'type': 'Shot', 'id': 1234, 'name': 'shot010'}
+    task    = {'type': 'Task', 'id': 5678, 'name': 'anim'}
+    project = {'type': 'Project', 'id': 1, 'name': 'bench'}
+
+
+class FakeApp(object):
+    def __init__(self, settings):
+        self.settings   = settings
+        self.context    = FakeContext()
+
+    def get_setting(self, name, default = None):
+        return self.settings.get(name, default)
+
+    @property
+    def shotgun(self):
+        import shotgun_api3
+        return shotgun_api3.Shotgun('https://bench.shotgunstudio.com', connect = False)
+
+    def import_module(self, name):
+        return lib
+
+
+def buildUI(settings):
+    """
+    A MainUI without the Qt widgets, just the state the benchmarked methods use.
+    """
+    ui = app.MainUI.__new__(app.MainUI)
+    ui.app                  = FakeApp(settings)
+    ui.lib                  = lib
+    ui.currentEditor        = 'modelPanel4'
+    ui._editorState         = {}
+    ui._editorUpdatePending = False
+    ui._applyingEditorState = False
+    ui._trace               = lib.NULL_TRACE
+    ui._optionsBuilt        = True
+    ui._scenePrepared       = True
+    ui.statusList           = FakeButton('rev')
+    ui.camRadioButtons      = [FakeButton(each, each in lib.CONST.CAM_SETTINGS_DEFAULT_ON) for each in lib.CONST.CAM_SETTINGS_OPTIONS]
+    ui.viewportRadioButtons = [FakeButton(each, each in lib.CONST.VIEWPORT_SETTINGS_DEFAULT_ON) for each in lib.CONST.VIEWPORT_SETTINGS_OPTIONS]
+    ui.rendererRadioButtons = [FakeButton(each, each in lib.CONST.RENDERER_SETTINGS_DEFAULT_ON) for each in lib.CONST.RENDERER_SETTINGS_OPTIONS]
+    return ui
+
+
+def resetPool():
+    ## lib.ShotgunPool is the re-exported class, the singleton lives on the module.
+    sys.modules['lib.ShotgunPool']._POOL = None
+
+
+def makeMovie(path, size, content = None):
+    ## Every movie is different unless content says otherwise, so the upload dedupe only kicks in when asked to.
+    with open(path, 'wb') as f:
+        f.write((content or os.path.basename(path)).ljust(64))
+        size -= 64
+        block = '\0' * (1024 * 1024)
+        while size > 0:
+            f.write(block[:min(size, len(block))])
+            size -= len(block)
+
+
+class Bench(object):
+    def __init__(self, repeat, tempDir, movieSize):
+        self.repeat     = repeat
+        self.tempDir    = tempDir
+        self.movieSize  = movieSize
+        self.results    = {}
+        self._count     = 0
+
+    def _unique(self, prefix):
+        ## Every run submits a new name, otherwise the second run would collide with the first.
+        self._count += 1
+        return '%s_%03d' % (prefix, self._count)
+
+    def run(self, name, func, setup = None):
+        """
+        Times func self.repeat times. setup() runs untimed before each run and its result is passed to func.
+        """
+        times   = []
+        counts  = {}
+        for x in range(self.repeat):
+            arg = setup() if setup else None
+            fakeConfig.reset()
+            start = time.time()
+            func(arg) if setup else func()
+            times.append(time.time() - start)
+            for key, value in fakeConfig.COUNTERS.items():
+                counts[key] = counts.get(key, 0) + value
+        self._record(name, times, counts)
+
+    def _record(self, name, times, counts):
+        times.sort()
+        self.results[name] = {
+                                'runs':     len(times),
+                                'min':      round(times[0], 6),
+                                'median':   round(times[len(times) // 2], 6),
+                                'mean':     round(sum(times) / len(times), 6),
+                                'max':      round(times[-1], 6),
+                                'calls':    dict([(key, value / float(len(times))) for key, value in sorted(counts.items())]),
+                             }
+        print '%-32s median %8.4fs  min %8.4fs  max %8.4fs' % (name, self.results[name]['median'], times[0], times[-1])
+
+    def _job(self, suffix, content = None):
+        name        = self._unique('%s_%s' % (MOVIE_NAME, suffix))
+        workPath    = os.path.join(self.tempDir, 'work', '%s.mov' % name)
+        publishPath = os.path.join(self.tempDir, '%s.mov' % name)
+        if not os.path.isdir(os.path.dirname(workPath)):
+            os.makedirs(os.path.dirname(workPath))
+        makeMovie(workPath, self.movieSize, content)
+        if os.path.exists(publishPath):
+            os.remove(publishPath)
+        return lib.SubmitJob(
+                            name            = name,
+                            workPath        = workPath,
+                            publishPath     = publishPath,
+                            versionData     = {'code': MOVIE_NAME},
+                            storeOnDisk     = True,
+                            partSize        = 20 * 1024 * 1024,
+                            workers         = 4,
+                            spoolDir        = os.path.join(self.tempDir, 'spool'),
+                            )
+
+    def runOpen(self, settings):
+        ## A fresh interpreter each run, the import cost only shows up once per maya session
+        code = 'import sys, time, logging; sys.path[0:0] = %r; logging.basicConfig(level = logging.ERROR); start = time.time(); import app; sys.stdout.write(repr(time.time() - start))' % sys.path[:3]
+        def importApp():
+            out = subprocess.Popen([sys.executable, '-c', code], stdout = subprocess.PIPE).communicate()[0]
+            return float(out.strip().splitlines()[-1])
+        self._record('importApp', [importApp() for x in range(self.repeat)], {})
+
+        self.run('openUI', lambda: app.MainUI(FakeApp(settings)))
+        def openWithOptions():
+            ui = app.MainUI(FakeApp(settings))
+            ui._toggleOptionPanels(True)
+        self.run('openUI.showOptions', openWithOptions)
+
+    def runAll(self, ui):
+        queue = lib.SubmitQueue()
+
+        def toggle():
+            button = ui.camRadioButtons[0]
+            button.setChecked(not button.isChecked())
+            ui._processRadioButtons()
+        self.run('processRadioButtons', toggle)
+
+        ## A scene change invalidates the index, the next lookup does the bulk scan again
+        events = lib.ManualEventSource()
+        lib.setSceneIndex(lib.SceneIndex(events))
+        self.run('findShotCamera.cold', lambda arg: lib._findShotCamera(), setup = events.fire)
+        self.run('findShotCamera', lib._findShotCamera)
+
+        self.run('checkVersionExists.cold', lambda pool: ui._checkVersionExists(MOVIE_NAME + '.mov'), setup = resetPool)
+        self.run('checkVersionExists.warm', lambda: ui._checkVersionExists(MOVIE_NAME + '.mov'))
+
+        def versionJob():
+            path = '%s.mov' % self._unique(MOVIE_NAME)
+            return lib.SubmitJob(os.path.basename(path), path, path, ui._versionData(path, True, 1001, 1100, 'benchmark', None), True, 0, 0)
+        self.run('submitVersion', queue._createVersion, setup = versionJob)
+
+        def reserve(job):
+            result = ui._reserveVersion(job.publishPath, job.versionData)
+            job.reservedVersion = result.version
+            queue._createVersion(job)
+        self.run('submitVersion.reserved', reserve, setup = versionJob)
+
+        def collidingJob():
+            job = versionJob()
+            with lib.getShotgunPool().connection() as sg:
+                sg.create('Version', dict(job.versionData))
+            return job
+        def collide(job):
+            try:
+                queue._createVersion(job)
+            except lib.VersionCollisionError:
+                pass
+        self.run('submitVersion.collision', collide, setup = collidingJob)
+
+        def publish(job):
+            queue._chooseSource(job)
+            queue._move(job)
+        self.run('publishMove.rename', publish, setup = lambda: self._job('rename'))
+
+        def failFirstRename(job, error, func = publish):
+            rename = os.rename
+            def failing(src, dst):
+                os.rename = rename
+                raise error
+            os.rename = failing
+            try:
+                func(job)
+            finally:
+                os.rename = rename
+        ## Same as the rename failing because maya still has the movie open on windows
+        self.run('publishMove.link', lambda job: failFirstRename(job, OSError(errno.EACCES, 'in use')), setup = lambda: self._job('link'))
+        ## Same as the publish area being on another filesystem
+        self.run('publishMove.copy', lambda job: failFirstRename(job, OSError(errno.EXDEV, 'cross device')), setup = lambda: self._job('copy'))
+
+        def uploadSetup():
+            job = self._job('upload')
+            publish(job)
+            return job
+        self.run('upload', lambda job: lib.uploadMovie(1, job.publishPath, job.partSize, job.workers), setup = uploadSetup)
+
+        def submitSetup():
+            job = self._job('submit')
+            job.versionData = ui._versionData(job.publishPath, True, 1001, 1100, 'benchmark', None)
+            return job
+        self.run('submitQueue.process', queue._process, setup = submitSetup)
+
+        ## The same movie submitted again for the same shot, eg just a new comment
+        def resubmitSetup():
+            job = self._job('resubmit', content = 'resubmit')
+            job.versionData = ui._versionData(job.publishPath, True, 1001, 1100, 'benchmark', None)
+            job.hashField   = 'sg_movie_hash'
+            job.dedupeIndex = os.path.join(self.tempDir, 'dedupe.json')
+            return job
+        queue._process(resubmitSetup())
+        self.run('submitQueue.process.resubmit', queue._process, setup = resubmitSetup)
+
+        ## Rendered to local scratch, the upload and the copy out to the publish path run side by side
+        def scratchSetup():
+            job = self._job('scratch')
+            job.versionData = ui._versionData(job.publishPath, True, 1001, 1100, 'benchmark', None)
+            job.scratchPath = job.workPath
+            return job
+        self.run('submitQueue.process.scratch', queue._process, setup = scratchSetup)
+
+        ## Publish area on another filesystem, the publish copy overlaps the version create and upload
+        def crossDeviceSetup():
+            job = self._job('crossDevice')
+            job.versionData = ui._versionData(job.publishPath, True, 1001, 1100, 'benchmark', None)
+            return job
+        ## Same submission through an upload scheduler daemon on localhost, the cost of asking for a slot and the tokens
+        from lib import uploadSchedulerDaemon
+        scheduler = uploadSchedulerDaemon.serveInThread()
+        lib.setUploadScheduler('127.0.0.1:%s' % scheduler.server_address[1])
+        try:
+            self.run('submitQueue.process.scheduled', queue._process, setup = submitSetup)
+        finally:
+            lib.setUploadScheduler(None)
+            scheduler.shutdown()
+
+        self.run('submitQueue.process.crossDevice', lambda job: failFirstRename(job, OSError(errno.EXDEV, 'cross device'), queue._process), setup = crossDeviceSetup)
+
+    def runFaults(self, ui):
+        """
+        The same steps against a shotgun that fails, hangs or is down, with short deadlines so the runs don't take all day.
+        What counts is that each one comes back within its deadline instead of freezing the dialog.
+        """
+        queue   = lib.SubmitQueue()
+        breaker = lib.getShotgunBreaker()
+        entity  = FakeContext.entity
+        fakeConfig.ENTITIES.setdefault('Shot', {})[entity['id']] = dict(entity, sg_cut_in = 1001, sg_cut_out = 1100)
+        lib.setShotgunPolicy(lib.ShotgunCallPolicy(readTimeout = 1, writeTimeout = 1, connectTimeout = 1, backoff = 0.05))
+
+        def expect(error, func, *args):
+            try:
+                func(*args)
+            except error:
+                return
+            raise AssertionError('%s did not raise %s' % (func.__name__, error.__name__))
+
+        def coldRead(failNext = 0, hang = 0.0):
+            def setup():
+                breaker.reset()
+                lib.getShotgunCache().invalidate('frameRange')
+                fakeConfig.SG_FAIL_NEXT = failNext
+                fakeConfig.SG_HANG      = hang
+            return setup
+        try:
+            ## A 502 on the first go, the read is retried
+            self.run('frameRange.retried', lambda arg: ui.get_frame_range_from_shotgun(), setup = coldRead(failNext = 1))
+            ## Shotgun sits on the read for longer than the deadline
+            self.run('frameRange.hung', lambda arg: expect(lib.ShotgunTimeout, ui.get_frame_range_from_shotgun), setup = coldRead(hang = 3))
+            fakeConfig.SG_HANG = 0.0
+            ## Read once more so there is a frame range for offline, already expired
+            cache = lib.getShotgunCache()
+            ttl, cache.ttl = cache.ttl, 0
+            breaker.reset()
+            ui.get_frame_range_from_shotgun()
+            cache.ttl = ttl
+
+            ## Down for good, the breaker opens and everything after fails fast
+            fakeConfig.SG_DOWN = True
+            def openBreaker():
+                resetPool()
+                while not breaker.isOpen():
+                    try:
+                        ui._checkVersionExists(MOVIE_NAME + '.mov')
+                    except lib.ShotgunUnavailable:
+                        pass
+            self.run('checkVersionExists.down', lambda arg: expect(lib.ShotgunUnavailable, ui._checkVersionExists, MOVIE_NAME + '.mov'), setup = breaker.reset)
+            self.run('checkVersionExists.offline', lambda arg: expect(lib.ShotgunOffline, ui._checkVersionExists, MOVIE_NAME + '.mov'), setup = openBreaker)
+            ## The frame range read earlier is served expired rather than not at all
+            self.run('frameRange.offline', lambda arg: ui.get_frame_range_from_shotgun(), setup = openBreaker)
+
+            def offlineSetup():
+                openBreaker()
+                job = self._job('offline')
+                job.versionData = ui._versionData(job.publishPath, True, 1001, 1100, 'benchmark', None)
+                return job
+            def submitOffline(job):
+                queue._process(job)
+                if not job.errors or not os.path.exists(job.sourcePath):
+                    raise AssertionError('The offline submission of %s should fail and keep the movie' % job.name)
+            self.run('submitQueue.process.offline', submitOffline, setup = offlineSetup)
+        finally:
+            fakeConfig.SG_DOWN      = False
+            fakeConfig.SG_FAIL_NEXT = 0
+            fakeConfig.SG_HANG      = 0.0
+            lib.setShotgunPolicy(None)
+            breaker.reset()
+
+
+def gitCommit():
+    try:
+        return subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd = ROOT, stdout = subprocess.PIPE, stderr = subprocess.PIPE).communicate()[0].strip()
+    except OSError:
+        return ''
+
+
+def compare(results, previousPath):
+    with open(previousPath, 'r') as f:
+        previous = json.load(f)['benchmarks']
+    print '\n%-32s %10s %10s %8s' % ('compared to %s' % os.path.basename(previousPath), 'before', 'after', 'ratio')
+    for name, result in sorted(results.items()):
+        if name in previous and previous[name]['median']:
+            before = previous[name]['median']
+            print '%-32s %10.4f %10.4f %7.2fx' % (name, before, result['median'], result['median'] / before)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the playblast submit path against fake maya, tank and shotgun.')
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--cmds-latency', type = float, default = fakeConfig.CMDS_LATENCY)
+    parser.add_argument('--cameras', type = int, default = fakeConfig.CAMERA_COUNT)
+    parser.add_argument('--sg-connect-latency', type = float, default = fakeConfig.SG_CONNECT_LATENCY)
+    parser.add_argument('--sg-call-latency', type = float, default = fakeConfig.SG_CALL_LATENCY)
+    parser.add_argument('--sg-bandwidth-mb', type = float, default = fakeConfig.SG_UPLOAD_BANDWIDTH / (1024 * 1024))
+    parser.add_argument('--movie-mb', type = int, default = 50)
+    parser.add_argument('--output', default = 'benchmark.json')
+    parser.add_argument('--compare', default = '', help = 'A previous output to compare the medians against.')
+    args = parser.parse_args(argv)
+
+    fakeConfig.CMDS_LATENCY         = args.cmds_latency
+    fakeConfig.CAMERA_COUNT         = args.cameras
+    fakeConfig.SG_CONNECT_LATENCY   = args.sg_connect_latency
+    fakeConfig.SG_CALL_LATENCY      = args.sg_call_latency
+    fakeConfig.SG_UPLOAD_BANDWIDTH  = args.sg_bandwidth_mb * 1024 * 1024
+
+    settings = {'reservation_status': 'na', 'reservation_lease_minutes': 120, 'upload_to_shotgun': True, 'store_on_disk': True, 'movie_width': 1280, 'movie_height': 720, 'isAsset': False,
+                'sg_in_frame_field': 'sg_cut_in', 'sg_out_frame_field': 'sg_cut_out'}
+    tempDir = tempfile.mkdtemp(prefix = 'playblastBench_')
+    try:
+        bench = Bench(args.repeat, tempDir, args.movie_mb * 1024 * 1024)
+        bench.runOpen(dict(settings, showOptions = True, new_version_status = 'rev'))
+        ui = buildUI(settings)
+        bench.runAll(ui)
+        bench.runFaults(ui)
+    finally:
+        shutil.rmtree(tempDir, ignore_errors = True)
+
+    output = {
+                'meta': {
+                            'commit':       gitCommit(),
+                            'time':         time.strftime('%Y-%m-%dT%H:%M:%S'),
+                            'python':       platform.python_version(),
+                            'platform':     platform.platform(),
+                        },
+                'config': vars(args),
+                'benchmarks': bench.results,
+             }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent = 2, sort_keys = True)
+    print 'Wrote %s' % args.output
+    if args.compare:
+        compare(bench.results, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
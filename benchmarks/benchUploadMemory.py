@@ -0,0 +1,131 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Checks the multi part upload's memory stays bounded however big the movie is. Uploads a sparse file (5GB by
+default, it takes no disk space) to a local stand in for the storage endpoint (HttpPartTarget's protocol, ETags
+are the part md5s like S3) from a child process, and fails if the child's peak RSS grew by more than the
+upload's maxMemory plus some slack:
+
+    python benchmarks/benchUploadMemory.py --size-gb 5 --max-memory-mb 16
+    python benchmarks/benchUploadMemory.py --size-gb 5 --mmap
+"""
+import os, sys, json, time, uuid, hashlib, tempfile, threading, subprocess, argparse, resource, BaseHTTPServer, SocketServer
+
+HERE    = os.path.dirname(os.path.abspath(__file__))
+ROOT    = os.path.dirname(HERE)
+
+## Interpreter, sockets and the per worker send blocks on top of maxMemory
+SLACK_MB = 16
+
+
+class StorageHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body = '', headers = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else ''
+        if self.path.startswith('/uploads?'):
+            self._reply(200, json.dumps({'upload_id': uuid.uuid4().hex}))
+        elif self.path.endswith('/complete'):
+            self.server.completed.append(json.loads(body)['etags'])
+            self._reply(200, '{}')
+        else:
+            self._reply(404)
+
+    def do_PUT(self):
+        ## Read and hash the part in blocks, the stand in must not be the one holding the movie either
+        remaining = int(self.headers['Content-Length'])
+        digest = hashlib.md5()
+        while remaining:
+            block = self.rfile.read(min(remaining, 1024 * 1024))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+        self._reply(200, '', {'ETag': '"%s"' % digest.hexdigest()})
+
+
+class StorageServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StorageHandler)
+        self.completed = []
+
+
+def peakRss():
+    ## KB on linux, bytes on osx
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak * 1024 if sys.platform != 'darwin' else peak
+
+
+def child(args):
+    sys.path[0:0] = [os.path.join(HERE, 'fakes'), os.path.join(ROOT, 'python')]
+    import lib
+    uploader = lib.ChunkedUploader(lib.HttpPartTarget(args.url), partSize = args.part_mb * 1024 * 1024, workers = args.workers,
+                                   maxMemory = args.max_memory_mb * 1024 * 1024, useMmap = args.mmap)
+    before = peakRss()
+    start = time.time()
+    checksum = uploader.upload(args.path)
+    print json.dumps({'before': before, 'peak': peakRss(), 'seconds': time.time() - start, 'checksum': checksum})
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Check the multi part upload holds no more than its maxMemory.')
+    parser.add_argument('--size-gb', type = float, default = 5)
+    parser.add_argument('--part-mb', type = int, default = 20)
+    parser.add_argument('--workers', type = int, default = 4)
+    parser.add_argument('--max-memory-mb', type = int, default = 16)
+    parser.add_argument('--mmap', action = 'store_true')
+    parser.add_argument('--child', action = 'store_true', help = argparse.SUPPRESS)
+    parser.add_argument('--url', default = '', help = argparse.SUPPRESS)
+    parser.add_argument('--path', default = '', help = argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args)
+
+    tempDir = tempfile.mkdtemp(prefix = 'benchUploadMemory')
+    path = os.path.join(tempDir, 'turntable_4k.mov')
+    size = int(args.size_gb * 1024 * 1024 * 1024)
+    with open(path, 'wb') as f:
+        f.truncate(size)
+    server = StorageServer()
+    thread = threading.Thread(target = server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        command = [sys.executable, os.path.abspath(__file__), '--child', '--url', 'http://127.0.0.1:%s' % server.server_address[1], '--path', path,
+                   '--part-mb', str(args.part_mb), '--workers', str(args.workers), '--max-memory-mb', str(args.max_memory_mb)]
+        if args.mmap:
+            command.append('--mmap')
+        out = subprocess.Popen(command, stdout = subprocess.PIPE).communicate()[0]
+        result = json.loads(out.strip().splitlines()[-1])
+    finally:
+        server.shutdown()
+        os.remove(path)
+        os.rmdir(tempDir)
+
+    growth  = (result['peak'] - result['before']) / (1024.0 * 1024.0)
+    limit   = args.max_memory_mb + SLACK_MB
+    print '%.1fGB in %s parts of %sMB, %s workers, %s: %.1fs, %.0f MB/s' % (size / (1024.0 ** 3), len(server.completed[0]) if server.completed else 0,
+            args.part_mb, args.workers, 'mmap' if args.mmap else 'read buffer', result['seconds'], size / (1024.0 * 1024.0) / max(result['seconds'], 0.001))
+    print 'peak rss grew %.1f MB during the upload (limit %s MB), checksum %s' % (growth, limit, result['checksum'])
+    if growth > limit:
+        print 'FAILED: the upload held more than its maxMemory'
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
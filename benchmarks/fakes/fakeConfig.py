@@ -0,0 +1,40 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Knobs for the fake maya.cmds, tank and shotgun_api3 modules the benchmarks run against.
+All latencies are in seconds, the benchmark harness sets these from its command line.
+"""
+## Per maya.cmds call
+CMDS_LATENCY        = 0.0
+## Number of cameras cmds.ls(type = 'camera') returns, only the first one is tagged as the shot cam.
+CAMERA_COUNT        = 10
+## Shotgun connect (TLS handshake + auth) and per api call round trip
+SG_CONNECT_LATENCY  = 0.2
+SG_CALL_LATENCY     = 0.05
+## Shotgun upload bandwidth in bytes per second
+SG_UPLOAD_BANDWIDTH = 50 * 1024 * 1024
+## Faults injected into the fake shotgun: every call and connect fails with a 503 while SG_DOWN, the next
+## SG_FAIL_NEXT calls fail, and every call hangs for SG_HANG seconds first.
+SG_DOWN             = False
+SG_FAIL_NEXT        = 0
+SG_HANG             = 0.0
+## The scene's unsaved changes flag, cmds.setAttr sets it and cmds.file(modified = False) clears it like in maya
+SCENE_MODIFIED      = False
+## What cmds.file(query = True, sn = True) returns, the saved scene
+SCENE_PATH          = ''
+
+## Counters the harness reads back after each benchmark
+COUNTERS            = {}
+## Entities created through the fake shotgun, shared by every connection like a real site. type -> id -> data
+ENTITIES            = {}
+LAST_ID             = 0
+
+
+def count(name):
+    COUNTERS[name] = COUNTERS.get(name, 0) + 1
+
+
+def reset():
+    COUNTERS.clear()
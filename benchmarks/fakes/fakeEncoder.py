@@ -0,0 +1,35 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Stand in for ffmpeg that reads an image sequence the way encoder.encodeSequence asks for it
+(-framerate fps -start_number N -i pattern ... output) and writes the frames it read to output as json.
+Like ffmpeg it stops at the first missing frame. --fail anywhere in the args makes it exit 1.
+"""
+import os, sys, json
+
+
+def main(argv = None):
+    args = sys.argv[1:] if argv is None else argv
+    if '--fail' in args:
+        sys.stderr.write('fakeEncoder: failing\n')
+        return 1
+    fps     = args[args.index('-framerate') + 1]
+    frame   = int(args[args.index('-start_number') + 1])
+    pattern = args[args.index('-i') + 1]
+    frames  = []
+    while os.path.exists(pattern % frame):
+        with open(pattern % frame) as f:
+            frames.append(json.load(f))
+        frame += 1
+    if not frames:
+        sys.stderr.write('fakeEncoder: no frames at %s\n' % pattern)
+        return 1
+    with open(args[-1], 'w') as f:
+        json.dump({'fps': fps, 'frames': frames}, f)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
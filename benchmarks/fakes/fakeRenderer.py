@@ -0,0 +1,64 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Stand in for playblastWorker.py that needs no maya. Takes the same args and writes a small file for each frame
+of the chunk, so ShardedPlayblast can be run with rendererCommand = [python, fakeRenderer.py]. Args put before
+the worker args inject faults:
+
+    --fail-at 12    exit 1 without writing anything when the chunk holds frame 12
+    --skip 12       exit 0 but never write frame 12
+    --log chunks    append "start end" for each chunk rendered
+
+Without --start / --end it renders the fake scene range, SCENE_START to SCENE_END.
+"""
+import sys, argparse, json
+
+SCENE_START = 1
+SCENE_END   = 24
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scene', required = True)
+    parser.add_argument('--start', type = float, default = SCENE_START)
+    parser.add_argument('--end', type = float, default = SCENE_END)
+    parser.add_argument('--output', required = True)
+    parser.add_argument('--camera', default = '')
+    parser.add_argument('--width', type = int)
+    parser.add_argument('--height', type = int)
+    parser.add_argument('--percent', type = int)
+    parser.add_argument('--quality', type = int)
+    parser.add_argument('--image-format', default = 'png')
+    parser.add_argument('--editor-state', type = json.loads, default = {})
+    parser.add_argument('--render-globals', type = json.loads, default = [])
+    parser.add_argument('--end-handle', type = int, default = 0)
+    parser.add_argument('--report', default = '')
+    parser.add_argument('--padding', type = int, default = 4)
+    parser.add_argument('--fail-at', type = int, action = 'append', default = [])
+    parser.add_argument('--skip', type = int, action = 'append', default = [])
+    parser.add_argument('--log', default = '')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    args.end += args.end_handle
+    frames = range(int(args.start), int(args.end) + 1)
+    if [each for each in args.fail_at if each in frames]:
+        sys.stderr.write('fakeRenderer: failing frames %s-%s\n' % (frames[0], frames[-1]))
+        return 1
+    for frame in frames:
+        if frame in args.skip:
+            continue
+        with open('%s.%0*d.%s' % (args.output, args.padding, frame, args.image_format), 'w') as f:
+            json.dump({'frame': frame, 'camera': args.camera, 'editorState': args.editor_state, 'renderGlobals': args.render_globals}, f)
+    if args.log:
+        with open(args.log, 'a') as f:
+            f.write('%s %s\n' % (frames[0], frames[-1]))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'scene': args.scene, 'start': args.start, 'end': args.end, 'output': args.output, 'camera': args.camera, 'fps': 24}, f)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Fake maya.cmds for the benchmarks. Every call costs fakeConfig.CMDS_LATENCY and is counted,
+calls without a fake below just return None.
+"""
+import sys, time
+import fakeConfig
+
+
+class FakeCmds(object):
+    def __init__(self, module):
+        ## Keep the real module alive, python 2 clears a module's globals once nothing references it.
+        self._module = module
+
+    def _call(self, name):
+        fakeConfig.count('cmds.%s' % name)
+        if fakeConfig.CMDS_LATENCY:
+            time.sleep(fakeConfig.CMDS_LATENCY)
+
+    def ls(self, *args, **kwargs):
+        self._call('ls')
+        types = kwargs.get('type') or []
+        if isinstance(types, basestring):
+            types = [types]
+        if 'camera' in types:
+            long = kwargs.get('long')
+            cameras = [('|cam%s|cam%sShape' % (x, x)) if long else ('cam%sShape' % x) for x in range(fakeConfig.CAMERA_COUNT)]
+            if kwargs.get('showType'):
+                return sum([[each, 'camera'] for each in cameras], [])
+            return cameras
+        if args and isinstance(args[0], (list, tuple)):
+            ## Attribute paths, only cam0 carries the type attr that marks the shot camera
+            return [each for each in args[0] if each.lstrip('|') == 'cam0.type']
+        return []
+
+    def allNodeTypes(self, *args, **kwargs):
+        self._call('allNodeTypes')
+        ## No plugins loaded, so no AlembicNode or gpuCache
+        return ['camera', 'audio', 'imagePlane', 'expression', 'nucleus', 'particle', 'nParticle', 'fluidShape', 'cacheFile', 'transform', 'mesh']
+
+    def listRelatives(self, node, **kwargs):
+        self._call('listRelatives')
+        if kwargs.get('shapes'):
+            return ['%sShape' % node]
+        return [node.replace('Shape', '')]
+
+    def objExists(self, name):
+        self._call('objExists')
+        ## Only cam0 carries the type attr that marks the shot camera
+        return name == 'cam0.type'
+
+    def getPanel(self, *args, **kwargs):
+        self._call('getPanel')
+        if kwargs.get('type') == 'modelPanel':
+            return ['modelPanel4']
+        return 'modelPanel4'
+
+    def modelPanel(self, *args, **kwargs):
+        self._call('modelPanel')
+        return 'modelPanel4'
+
+    def playbackOptions(self, *args, **kwargs):
+        self._call('playbackOptions')
+        if kwargs.get('query'):
+            return 1001.0 if (kwargs.get('animationStartTime') or kwargs.get('minTime')) else 1100.0
+
+    def file(self, *args, **kwargs):
+        self._call('file')
+        if kwargs.get('query') and kwargs.get('modified'):
+            return fakeConfig.SCENE_MODIFIED
+        if kwargs.get('query') and (kwargs.get('sn') or kwargs.get('sceneName')):
+            return fakeConfig.SCENE_PATH
+        if kwargs.get('query') and kwargs.get('list'):
+            return [fakeConfig.SCENE_PATH] if fakeConfig.SCENE_PATH else []
+        if not kwargs.get('query') and 'modified' in kwargs:
+            fakeConfig.SCENE_MODIFIED = bool(kwargs['modified'])
+
+    def setAttr(self, *args, **kwargs):
+        self._call('setAttr')
+        fakeConfig.SCENE_MODIFIED = True
+
+    def currentUnit(self, *args, **kwargs):
+        self._call('currentUnit')
+        return 'film'
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        def call(*args, **kwargs):
+            self._call(name)
+        return call
+
+
+sys.modules[__name__] = FakeCmds(sys.modules[__name__])
@@ -0,0 +1,134 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Fake shotgun_api3 for the benchmarks. Connecting, api calls and uploads cost the latencies in fakeConfig,
+and fail or hang the way fakeConfig's SG_DOWN, SG_FAIL_NEXT and SG_HANG say.
+"""
+import os, time, datetime
+import fakeConfig
+
+
+class ShotgunError(Exception):
+    pass
+
+
+class Fault(ShotgunError):
+    pass
+
+
+class ProtocolError(ShotgunError):
+    pass
+
+
+def _fault():
+    if fakeConfig.SG_HANG:
+        time.sleep(fakeConfig.SG_HANG)
+    if fakeConfig.SG_DOWN:
+        fakeConfig.count('sg.fault')
+        raise ProtocolError('503 Service Unavailable')
+    if fakeConfig.SG_FAIL_NEXT > 0:
+        fakeConfig.SG_FAIL_NEXT -= 1
+        fakeConfig.count('sg.fault')
+        raise ProtocolError('502 Bad Gateway')
+
+
+def _matches(entity, filters):
+    for field, relation, value in filters or []:
+        if relation == 'is' and entity.get(field) != value:
+            return False
+        if relation == 'in' and entity.get(field) not in value:
+            return False
+        if relation == 'is_not' and entity.get(field) == value:
+            return False
+    return True
+
+
+class Shotgun(object):
+    def __init__(self, base_url, script_name = None, api_key = None, connect = True, **kwargs):
+        self.base_url   = base_url
+        if connect:
+            fakeConfig.count('sg.connect')
+            _fault()
+            time.sleep(fakeConfig.SG_CONNECT_LATENCY)
+
+    def _call(self, name):
+        fakeConfig.count('sg.%s' % name)
+        _fault()
+        time.sleep(fakeConfig.SG_CALL_LATENCY)
+
+    def info(self):
+        self._call('info')
+        return {'version': [7, 0, 0]}
+
+    def schema_field_read(self, entity_type, field_name = None):
+        self._call('schema_field_read')
+        return {field_name: {'properties': {'valid_values': {'value': ['rev', 'apr', 'na']}}}}
+
+    def _find(self, entity_type, filters, order = None, limit = 0):
+        found = [dict(each) for id, each in sorted(fakeConfig.ENTITIES.get(entity_type, {}).items()) if _matches(each, filters)]
+        if order and order[0].get('direction') == 'desc':
+            found.reverse()
+        return found[:limit] if limit else found
+
+    def find_one(self, entity_type, filters = None, fields = None, order = None, **kwargs):
+        self._call('find_one')
+        found = self._find(entity_type, filters, order, 1)
+        return found[0] if found else None
+
+    def find(self, entity_type, filters = None, fields = None, order = None, limit = 0, **kwargs):
+        self._call('find')
+        return self._find(entity_type, filters, order, limit)
+
+    def _create(self, entity_type, data):
+        entities = fakeConfig.ENTITIES.setdefault(entity_type, {})
+        result = dict(data)
+        ## Ids are never reused, like a real site
+        fakeConfig.LAST_ID += 1
+        result.update({'type': entity_type, 'id': fakeConfig.LAST_ID, 'created_at': datetime.datetime.now(), 'updated_at': datetime.datetime.now()})
+        entities[result['id']] = result
+        return dict(result)
+
+    def create(self, entity_type, data, return_fields = None):
+        self._call('create')
+        return self._create(entity_type, data)
+
+    def update(self, entity_type, entity_id, data):
+        self._call('update')
+        fakeConfig.ENTITIES.setdefault(entity_type, {}).setdefault(entity_id, {'type': entity_type, 'id': entity_id}).update(data, updated_at = datetime.datetime.now())
+        return dict(data, type = entity_type, id = entity_id)
+
+    def delete(self, entity_type, entity_id):
+        self._call('delete')
+        return fakeConfig.ENTITIES.get(entity_type, {}).pop(entity_id, None) is not None
+
+    def batch(self, requests):
+        ## One round trip for the lot, like the real api
+        self._call('batch')
+        results = []
+        for each in requests:
+            if each['request_type'] == 'create':
+                results.append(self._create(each['entity_type'], each['data']))
+            elif each['request_type'] == 'update':
+                fakeConfig.ENTITIES.setdefault(each['entity_type'], {}).setdefault(each['entity_id'], {}).update(each['data'])
+                results.append(dict(each['data'], type = each['entity_type'], id = each['entity_id']))
+            elif each['request_type'] == 'delete':
+                results.append(fakeConfig.ENTITIES.get(each['entity_type'], {}).pop(each['entity_id'], None) is not None)
+        return results
+
+    def upload(self, entity_type, entity_id, path, field_name = None, display_name = None, tag_list = None):
+        self._call('upload')
+        time.sleep(os.path.getsize(path) / float(fakeConfig.SG_UPLOAD_BANDWIDTH))
+        attachment = self._create('Attachment', {'this_file': os.path.basename(path)})
+        if field_name:
+            fakeConfig.ENTITIES.setdefault(entity_type, {}).setdefault(entity_id, {'type': entity_type, 'id': entity_id})[field_name] = {'type': 'Attachment', 'id': attachment['id'], 'name': os.path.basename(path)}
+        return attachment['id']
+
+    def upload_thumbnail(self, entity_type, entity_id, path, **kwargs):
+        self._call('upload_thumbnail')
+        time.sleep(os.path.getsize(path) / float(fakeConfig.SG_UPLOAD_BANDWIDTH))
+        return self._create('Attachment', {'this_file': os.path.basename(path)})['id']
+
+    def close(self):
+        pass
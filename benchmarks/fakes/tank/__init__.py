@@ -0,0 +1,12 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Fake toolkit core for the benchmarks, just enough for app.py and the lib to import and run.
+"""
+from . import platform, templatekey, util
+
+
+class TankError(Exception):
+    pass
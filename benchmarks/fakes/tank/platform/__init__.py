@@ -0,0 +1,15 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Fake tank.platform for the benchmarks.
+"""
+
+
+class Application(object):
+    def __init__(self, settings = None):
+        self.settings = settings or {}
+
+    def get_setting(self, name, default = None):
+        return self.settings.get(name, default)
@@ -0,0 +1,81 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Fake tank.platform.qt for the benchmarks. No event loop, so QTimer.singleShot runs its slot straight away
+and signals call their connected slots directly.
+"""
+
+
+class _Stub(object):
+    """
+    Stands in for any Qt class or enum the code touches but the benchmarks don't care about.
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return _Stub()
+
+    def __call__(self, *args, **kwargs):
+        return _Stub()
+
+
+class _BoundSignal(object):
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def emit(self, *args):
+        for each in self._slots:
+            each(*args)
+
+
+class Signal(object):
+    def __init__(self, *types):
+        self.types = types
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        signals = instance.__dict__.setdefault('_fakeSignals', {})
+        return signals.setdefault(id(self), _BoundSignal())
+
+
+class QThread(object):
+    def __init__(self, *args):
+        pass
+
+    def start(self):
+        self.run()
+
+    def wait(self, *args):
+        return True
+
+    def isRunning(self):
+        return False
+
+
+class QTimer(object):
+    @staticmethod
+    def singleShot(msec, slot):
+        slot()
+
+
+class _QtCore(_Stub):
+    Signal  = Signal
+    QThread = QThread
+    QTimer  = QTimer
+
+
+class _QtGui(_Stub):
+    QWidget = _Stub
+
+
+QtCore  = _QtCore()
+QtGui   = _QtGui()
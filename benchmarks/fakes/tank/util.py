@@ -0,0 +1,2 @@
+def get_current_user(tk):
+    return {'type': 'HumanUser', 'id': 1, 'name': 'Benchmark User'}
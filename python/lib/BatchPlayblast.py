@@ -0,0 +1,362 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Headless batch playblasts for dailies. Takes a list of saved scenes and / or shotgun entities, resolves
+each one through the same templates and frame range logic as the app, playblasts them across a pool of
+mayapy workers (playblastWorker.py) and writes a json report of what happened to every job. Run it through
+runBatchPlayblast.py, this module is part of the lib package and can't be run directly:
+
+    python runBatchPlayblast.py --work-template maya_shot_work --movie-template maya_shot_playblast
+                                --movie-workpath-template maya_shot_playblast_work --workers 4
+                                --report dailies.json /jobs/abc/shot010_anim_v012.ma Shot:1234
+
+Needs the toolkit core (tank) importable. An entity resolves to its latest scene on disk matching the work template.
+Each scene plays through its own tagged shot camera unless --camera is given, with the CONST default display options
+and render globals, and the same PB_END_HANDLE past the last frame as the app.
+"""
+import os, sys, time, json, shutil, subprocess, threading, Queue, tempfile, traceback
+from . import CONST, encoder
+from .ShardedPlayblast import defaultMayapy, WORKER_SCRIPT
+from .modelEditorState import defaultEditorState
+from .sceneSetup import renderGlobalValues
+from .UploadSpool import UploadSpool, SPOOL_DIR, shotgunUpload
+from .versionSubmit import versionCode, versionCodes, findVersion, createUniqueVersion, VersionCollisionError
+from .PublishMover import PublishMover, MoveError
+import logging
+logger = logging.getLogger(__name__)
+
+BATCH_WORKERS   = 2
+IN_FRAME_FIELD  = 'sg_cut_in'
+OUT_FRAME_FIELD = 'sg_cut_out'
+
+STATUS_DONE     = 'done'
+STATUS_SKIPPED  = 'skipped'
+STATUS_FAILED   = 'failed'
+
+
+class BatchError(Exception):
+    pass
+
+
+def parseTarget(target):
+    """
+    Returns ('entity', {'type': 'Shot', 'id': 1234}) for Shot:1234, else ('scene', path).
+    """
+    if ':' in target and not os.path.exists(target):
+        entityType, entityId = target.rsplit(':', 1)
+        if entityId.isdigit():
+            return 'entity', {'type': entityType, 'id': int(entityId)}
+    return 'scene', os.path.abspath(target)
+
+
+class BatchJob(object):
+    """
+    One scene going through the batch. Everything on it ends up in the report.
+    """
+    def __init__(self, target):
+        self.target         = target
+        self.scene          = None
+        self.entity         = None
+        self.name           = None
+        self.workPath       = None
+        self.publishPath    = None
+        self.firstFrame     = None
+        self.lastFrame      = None
+        self.version        = None
+        self.status         = None
+        self.error          = None
+        self.timings        = {}
+
+    def asDict(self):
+        return {
+                'target':       self.target,
+                'scene':        self.scene,
+                'entity':       self.entity,
+                'name':         self.name,
+                'workPath':     self.workPath,
+                'publishPath':  self.publishPath,
+                'firstFrame':   self.firstFrame,
+                'lastFrame':    self.lastFrame,
+                'versionId':    self.version['id'] if self.version else None,
+                'status':       self.status,
+                'error':        self.error,
+                'timings':      self.timings,
+                }
+
+
+class BatchPlayblast(object):
+    """
+    Runs the jobs over at most self.workers mayapy processes at a time.
+    rendererCommand is the command the worker args are appended to, by default mayapy running playblastWorker.py.
+    Leave camera empty to have the worker look through each scene's own shot camera.
+    """
+    def __init__(self, workTemplate, movieTemplate, movieWorkTemplate, width = 1280, height = 720, workers = BATCH_WORKERS,
+                 isAsset = False, camera = '', editorState = None, inField = IN_FRAME_FIELD, outField = OUT_FRAME_FIELD, percent = 100,
+                 quality = 75, upload = False, comment = '', status = 'rev', storeOnDisk = True, skipExisting = True, rendererCommand = None,
+                 encoderPath = encoder.ENCODER_PATH, encoderArgs = encoder.ENCODER_ARGS, spoolDir = SPOOL_DIR):
+        self.workTemplate       = workTemplate
+        self.movieTemplate      = movieTemplate
+        self.movieWorkTemplate  = movieWorkTemplate
+        self.width              = width
+        self.height             = height
+        self.workers            = max(int(workers), 1)
+        self.isAsset            = isAsset
+        self.camera             = camera
+        self.editorState        = defaultEditorState() if editorState is None else editorState
+        self.renderGlobals      = renderGlobalValues(CONST, width, height)
+        self.inField            = inField
+        self.outField           = outField
+        self.percent            = percent
+        self.quality            = quality
+        self.upload             = upload
+        self.comment            = comment
+        self.status             = status
+        self.storeOnDisk        = storeOnDisk
+        self.skipExisting       = skipExisting
+        self.rendererCommand    = rendererCommand or [defaultMayapy(), WORKER_SCRIPT]
+        self.encoderPath        = encoderPath
+        self.encoderArgs        = encoderArgs
+        self.spoolDir           = spoolDir
+        self._tkLock            = threading.Lock()
+
+    def _timed(self, job, step, func, *args):
+        start = time.time()
+        try:
+            return func(*args)
+        finally:
+            job.timings[step] = round(time.time() - start, 3)
+
+    def resolve(self, job):
+        """
+        Fills in the scene, entity, paths and shotgun frame range for the job, the same way the app does from the open scene.
+        """
+        import tank
+        kind, value = parseTarget(job.target)
+        ## Toolkit instances aren't safe to build from several threads at once.
+        with self._tkLock:
+            if kind == 'entity':
+                tk      = tank.tank_from_entity(value['type'], value['id'])
+                context = tk.context_from_entity(value['type'], value['id'])
+                workTemplate = tk.templates[self.workTemplate]
+                job.scene = self._latestScene(tk, workTemplate, context)
+            else:
+                tk      = tank.tank_from_path(value)
+                context = tk.context_from_path(value)
+                workTemplate = tk.templates[self.workTemplate]
+                job.scene = value
+        job.entity = context.entity
+
+        fields = workTemplate.get_fields(job.scene)
+        job.publishPath = tk.templates[self.movieTemplate].apply_fields(fields).replace('\\', '/')
+        job.workPath    = tk.templates[self.movieWorkTemplate].apply_fields(fields).replace('\\', '/')
+        job.name        = os.path.splitext(os.path.basename(job.publishPath))[0]
+
+        ## Shots play the cut in to cut out from shotgun, assets (or shots missing the cut) play the scene's own range.
+        if not self.isAsset and context.entity:
+            data = tk.shotgun.find_one(context.entity['type'], filters = [['id', 'is', context.entity['id']]], fields = [self.inField, self.outField])
+            if data and data.get(self.inField) is not None and data.get(self.outField) is not None:
+                job.firstFrame  = data[self.inField]
+                job.lastFrame   = data[self.outField]
+            else:
+                logger.warning('BatchPlayblast: %s has no %s / %s, using the scene range.' % (context.entity, self.inField, self.outField))
+        return tk, context
+
+    def _latestScene(self, tk, workTemplate, context):
+        fields = context.as_template_fields(workTemplate)
+        scenes = tk.paths_from_template(workTemplate, fields, skip_keys = ['version'])
+        if not scenes:
+            raise BatchError('No scene matching %s found for %s' % (workTemplate, context))
+        return max(scenes, key = lambda each: workTemplate.get_fields(each).get('version', 0))
+
+    def render(self, job):
+        """
+        Playblasts the job's scene in a mayapy worker and encodes the frames into the work movie.
+        """
+        renderStart = time.time()
+        frameDir    = tempfile.mkdtemp(prefix = '%s_batch_' % job.name)
+        prefix      = os.path.join(frameDir, job.name)
+        reportPath  = os.path.join(frameDir, 'report.json')
+        command     = list(self.rendererCommand) + [
+                                                    '--scene',          job.scene,
+                                                    '--output',         prefix,
+                                                    '--camera',         self.camera,
+                                                    '--width',          str(self.width),
+                                                    '--height',         str(self.height),
+                                                    '--percent',        str(self.percent),
+                                                    '--quality',        str(self.quality),
+                                                    '--image-format',   'png',
+                                                    '--editor-state',   json.dumps(self.editorState),
+                                                    '--render-globals', json.dumps(self.renderGlobals),
+                                                    '--end-handle',     str(CONST.PB_END_HANDLE),
+                                                    '--report',         reportPath,
+                                                    ]
+        if job.firstFrame is not None:
+            command += ['--start', str(job.firstFrame), '--end', str(job.lastFrame)]
+        try:
+            logger.info('BatchPlayblast: rendering %s' % job.scene)
+            process = subprocess.Popen(command, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+            out = process.communicate()[0]
+            if process.returncode != 0 or not os.path.exists(reportPath):
+                raise BatchError('Worker exited with %s:\n%s' % (process.returncode, out[-2000:]))
+            with open(reportPath, 'r') as f:
+                rendered = json.load(f)
+            job.firstFrame  = rendered['start']
+            job.lastFrame   = rendered['end'] - CONST.PB_END_HANDLE
+            job.timings['render'] = round(time.time() - renderStart, 3)
+
+            if not os.path.isdir(os.path.dirname(job.workPath)):
+                os.makedirs(os.path.dirname(job.workPath))
+            encodeStart = time.time()
+            encoder.encodeSequence(encoder.sequencePattern(prefix, 'png', CONST.PB_FRAMEPADDING), job.firstFrame, job.workPath,
+                                   rendered.get('fps', 24), encoderPath = self.encoderPath, encoderArgs = self.encoderArgs)
+            job.timings['encode'] = round(time.time() - encodeStart, 3)
+        finally:
+            shutil.rmtree(frameDir, ignore_errors = True)
+
+    def publish(self, job, tk, context):
+        """
+        Moves the work movie to the publish path and, if uploading, creates the version and sends the movie through the upload spool.
+        """
+        if job.workPath != job.publishPath:
+            ## Never replace a published movie, a rerun over a published version has to go up a version.
+            if os.path.exists(job.publishPath):
+                raise BatchError('%s is already published, not overwriting it' % job.publishPath)
+            try:
+                PublishMover().move(job.workPath, job.publishPath)
+            except (MoveError, OSError, IOError), e:
+                raise BatchError('Could not publish %s to %s: %s' % (job.workPath, job.publishPath, e))
+        if not self.upload:
+            return
+
+        from .ShotgunPool import getShotgunPool
+        import tank
+        user = tank.util.get_current_user(tk)
+        data = {
+            "code":             versionCode(job.publishPath),
+            "entity":           context.entity,
+            "sg_task":          context.task,
+            "user":             user,
+            "created_by":       user,
+            "project":          context.project,
+            "description":      self.comment,
+            "sg_status_list":   self.status,
+        }
+        if self.storeOnDisk:
+            data["sg_path_to_movie"] = job.publishPath
+        with getShotgunPool().connection() as sg:
+            result = createUniqueVersion(sg, data, versionCodes(job.publishPath))
+        if result.collision:
+            raise VersionCollisionError(result)
+        job.version = result.version
+
+        spool = UploadSpool(self.spoolDir)
+        spool.add(job.version['id'], job.publishPath, deleteAfterUpload = not self.storeOnDisk)
+        spool.process(job.version['id'], shotgunUpload)
+
+    def _versionExists(self, job):
+        from .ShotgunPool import getShotgunPool
+        with getShotgunPool().connection() as sg:
+            return findVersion(sg, versionCodes(job.publishPath)) is not None
+
+    def runJob(self, job):
+        start = time.time()
+        try:
+            tk, context = self._timed(job, 'resolve', self.resolve, job)
+            if self.skipExisting and self.upload and self._versionExists(job):
+                job.status  = STATUS_SKIPPED
+                job.error   = 'A version called %s already exists in shotgun' % job.name
+                return job
+            self.render(job)
+            self._timed(job, 'publish', self.publish, job, tk, context)
+            job.status = STATUS_DONE
+        except Exception, e:
+            logger.warning('BatchPlayblast: %s failed: %s' % (job.target, e))
+            job.status  = STATUS_FAILED
+            job.error   = '%s\n%s' % (e, traceback.format_exc())
+        finally:
+            job.timings['total'] = round(time.time() - start, 3)
+        return job
+
+    def run(self, targets, progressCallback = None):
+        """
+        Runs every target and returns the BatchJobs in the order given.
+        progressCallback(job, jobsDone, jobCount) is called from the worker threads as jobs finish.
+        """
+        jobs    = [BatchJob(each) for each in targets]
+        pending = Queue.Queue()
+        for each in jobs:
+            pending.put(each)
+        lock    = threading.Lock()
+        done    = []
+
+        def worker():
+            while True:
+                try:
+                    job = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                self.runJob(job)
+                with lock:
+                    done.append(job)
+                    doneCount = len(done)
+                if progressCallback:
+                    progressCallback(job, doneCount, len(jobs))
+
+        threads = [threading.Thread(target = worker) for x in range(min(self.workers, len(jobs)))]
+        for each in threads:
+            each.setDaemon(True)
+            each.start()
+        for each in threads:
+            each.join()
+        return jobs
+
+
+def writeReport(jobs, path, wallTime):
+    report = {
+                'wallTime':     round(wallTime, 3),
+                'done':         len([each for each in jobs if each.status == STATUS_DONE]),
+                'skipped':      len([each for each in jobs if each.status == STATUS_SKIPPED]),
+                'failed':       len([each for each in jobs if each.status == STATUS_FAILED]),
+                'jobs':         [each.asDict() for each in jobs],
+              }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent = 2)
+    return report
+
+
+def main(argv = None):
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Playblast a batch of scenes or shotgun entities with a pool of mayapy workers.')
+    parser.add_argument('targets', nargs = '+', help = 'Scene paths and / or shotgun entities as Type:id')
+    parser.add_argument('--work-template', required = True)
+    parser.add_argument('--movie-template', required = True)
+    parser.add_argument('--movie-workpath-template', required = True)
+    parser.add_argument('--workers', type = int, default = BATCH_WORKERS)
+    parser.add_argument('--width', type = int, default = 1280)
+    parser.add_argument('--height', type = int, default = 720)
+    parser.add_argument('--camera', default = '', help = 'Camera to look through in every scene, by default each scene\'s tagged shot camera.')
+    parser.add_argument('--asset', action = 'store_true', help = 'Use the scene range instead of the shotgun cut in / out.')
+    parser.add_argument('--in-field', default = IN_FRAME_FIELD)
+    parser.add_argument('--out-field', default = OUT_FRAME_FIELD)
+    parser.add_argument('--upload', action = 'store_true', help = 'Create a version and upload each movie.')
+    parser.add_argument('--comment', default = 'Batch playblast')
+    parser.add_argument('--status', default = 'rev')
+    parser.add_argument('--no-store-on-disk', action = 'store_true')
+    parser.add_argument('--mayapy', default = None)
+    parser.add_argument('--report', default = 'playblast_report.json')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level = logging.INFO)
+
+    batch = BatchPlayblast(args.work_template, args.movie_template, args.movie_workpath_template,
+                           width = args.width, height = args.height, workers = args.workers, isAsset = args.asset,
+                           camera = args.camera, inField = args.in_field, outField = args.out_field, upload = args.upload,
+                           comment = args.comment, status = args.status, storeOnDisk = not args.no_store_on_disk,
+                           rendererCommand = [args.mayapy, WORKER_SCRIPT] if args.mayapy else None)
+    start = time.time()
+    jobs = batch.run(args.targets, progressCallback = lambda job, done, count: logger.info('BatchPlayblast: [%s/%s] %s %s' % (done, count, job.status, job.target)))
+    report = writeReport(jobs, args.report, time.time() - start)
+    logger.info('BatchPlayblast: %(done)s done, %(skipped)s skipped, %(failed)s failed in %(wallTime)ss' % report)
+    return 1 if report['failed'] else 0
+
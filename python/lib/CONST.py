@@ -21,6 +21,8 @@ SHOTGUN_TOOLKIT_NAME            = 'Toolkit'
 SHOTGUN_TOOLKIT_API_KEY         = 'APIKEY'
 
 STATUS_LIST  = ['na', 'rev', 'vwd']
+## Order the upload scheduler sends Versions in by status, anything else goes after these.
+UPLOAD_STATUS_PRIORITY = ['rev', 'vwd', 'na']
 
 ### The following set the options that will show up for the artists to set.
 CAM_SETTINGS_OPTIONS = ['NURBS Curves',
@@ -84,6 +86,55 @@ RENDERER_SETTINGS_OPTIONS = ['Default Renderer',
 ### The following set the default cam options to on you can copy and paste from the list above to turn any of them on by default.
 RENDERER_SETTINGS_DEFAULT_ON = ['Default Renderer']
 
+### The following maps each on/off option label above to the modelEditor flag it drives.
+### If you add an option to one of the lists above add its modelEditor flag here too.
+### Display appearance, hardware texturing, wireframe on shaded, the renderers and GPU Caches are handled by the app itself.
+MODEL_EDITOR_FLAGS = {'NURBS Curves':           'nurbsCurves',
+                      'NURBS Surfaces':         'nurbsSurfaces',
+                      'Polygons':               'polymeshes',
+                      'Subdiv Surfaces':        'subdivSurfaces',
+                      'Planes':                 'planes',
+                      'Lights':                 'lights',
+                      'Cameras':                'cameras',
+                      'Joints':                 'joints',
+                      'IK Handles':             'ikHandles',
+                      'Deformers':              'deformers',
+                      'Dynamics':               'dynamics',
+                      'Fluids':                 'fluids',
+                      'Hair Systems':           'hairSystems',
+                      'Follicles':              'follicles',
+                      'nCloths':                'nCloths',
+                      'nParticles':             'nParticles',
+                      'nRigids':                'nRigids',
+                      'Dynamic Constraints':    'dynamicConstraints',
+                      'Locators':               'locators',
+                      'Dimensions':             'dimensions',
+                      'Pivots':                 'pivots',
+                      'Handles':                'handles',
+                      'Textures':               'textures',
+                      'Texture Placements':     'textures',
+                      'Strokes':                'strokes',
+                      'Motion Trails':          'motionTrails',
+                      'Manipulators':           'manipulators',
+                      'Clip Ghosts':            'clipGhosts',
+                      "NURBS CV's":             'controlVertices',
+                      'Nurbs CVs':              'controlVertices',
+                      'NURBS Hulls':            'hulls',
+                      'Grid':                   'grid',
+                      'HUD':                    'headsUpDisplay',
+                      'Image Planes':           'imagePlane',
+                      'Selection Highlighting': 'selectionHiliteDisplay',
+                      'Plugin Shapes':          'pluginShapes',
+                      'Use Default Mat':        'useDefaultMaterial',
+                      'X-Ray':                  'xray',
+                      'X-Ray Joints':           'jointXray',
+                      }
+### modelEditor plugin display filters, these are set through the pluginObjects flag.
+MODEL_EDITOR_PLUGIN_FILTERS = {'GPU Caches': 'gpuCacheDisplayFilter'}
+### modelEditor rendererName for each of the RENDERER_SETTINGS_OPTIONS
+MODEL_EDITOR_RENDERERS = {'Default Renderer':   'base_OpenGL_Renderer',
+                          'Viewport 2.0':       'ogsRenderer'}
+
 ## The below settings mainly correspond to the cmds.playblast options used by the app to perform the playblast
 PB_FORMAT               = 'qt'
 PB_COMPRESSION          = 'h.264'
@@ -97,6 +148,8 @@ PB_OPTIONS              = False
 PB_SEQUENCETIME         = False
 PB_SHOWORNAMENTS        = True
 PB_VIEWER               = True
+## Frames rendered past the animation end time, the maya playblast has always gone to endTime + 1. Every render mode uses it.
+PB_END_HANDLE           = 1
 
 
 HW_MULTI_SAMPLE_ENABLE  = 1
@@ -0,0 +1,414 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Multi part upload engine. Splits the movie into parts, sends several parts at once over a
+bounded pool of worker threads, retries only the parts that failed and keeps a small manifest
+on disk next to the movie so an interrupted upload picks up where it stopped.
+
+Parts are streamed from disk, never read whole: each worker reads through one reused buffer (or one mmap
+window) of maxMemory / workers, so a multi GB movie costs the same memory as a small one. Every part is
+md5'd on the way out and, for targets whose ETags are known to be the part md5 (etagIsChecksum), checked against
+the ETag the storage hands back. SSE-KMS buckets and some S3 compatible stores hand back ETags that aren't.
+"""
+import os, io, time, json, mmap, hashlib, threading, Queue, httplib, urlparse, mimetypes
+from .ShotgunPool import getShotgunPool
+import logging
+logger = logging.getLogger(__name__)
+
+## Default part size, S3 needs parts of at least 5MB except for the last one.
+PART_SIZE           = 20 * 1024 * 1024
+## Number of parts in flight at once.
+UPLOAD_WORKERS      = 4
+## Attempts per part before the part is given up on for this run.
+PART_ATTEMPTS       = 3
+## Seconds to wait before the first retry of a part, doubled on each retry.
+RETRY_BACKOFF       = 2.0
+## Bytes handed to the socket per send, each block is reported to the progress callback.
+SEND_BLOCK_SIZE     = 64 * 1024
+## Read buffers of all the workers together, whatever the part size.
+MAX_MEMORY          = 16 * 1024 * 1024
+## S3 part ETags are the md5 of the part
+PART_CHECKSUM       = 'md5'
+MANIFEST_SUFFIX     = '.upload.json'
+
+
+class UploadError(Exception):
+    """
+    Raised when one or more parts could not be sent. The manifest is left on disk so the next run resumes.
+    """
+    def __init__(self, message, failedParts = None):
+        Exception.__init__(self, message)
+        self.failedParts = failedParts or []
+
+
+def readBlocks(path, offset, length, bufferSize, useMmap = False):
+    """
+    Yields length bytes of path from offset as blocks of at most SEND_BLOCK_SIZE. The file is read through
+    one reused buffer, or one read only mmap window, of bufferSize, so memory stays at bufferSize however big
+    the range is.
+    """
+    end = offset + length
+    with io.open(path, 'rb', buffering = 0) as f:
+        if useMmap:
+            ## Windows have to start on a multiple of the allocation granularity
+            granularity = mmap.ALLOCATIONGRANULARITY
+            windowSize  = max(granularity, bufferSize - bufferSize % granularity)
+            position    = offset
+            while position < end:
+                start   = position - position % granularity
+                size    = min(windowSize, end - start)
+                window  = mmap.mmap(f.fileno(), size, access = mmap.ACCESS_READ, offset = start)
+                try:
+                    for each in range(position - start, size, SEND_BLOCK_SIZE):
+                        yield window[each:min(each + SEND_BLOCK_SIZE, size)]
+                finally:
+                    window.close()
+                position = start + size
+        else:
+            buf     = bytearray(bufferSize)
+            view    = memoryview(buf)
+            f.seek(offset)
+            remaining = length
+            while remaining > 0:
+                read = f.readinto(view[:min(bufferSize, remaining)])
+                if not read:
+                    raise UploadError('%s is shorter than expected, it changed during the upload' % path)
+                for each in range(0, read, SEND_BLOCK_SIZE):
+                    yield view[each:min(each + SEND_BLOCK_SIZE, read)].tobytes()
+                remaining -= read
+
+
+def putData(url, data, contentType = 'application/octet-stream', timeout = 300, progress = None, throttle = None):
+    """
+    PUTs the data to the url and returns the ETag the storage handed back.
+    progress, if given, is called with the number of bytes each time a block has been written to the socket.
+    throttle, if given, is called with the number of bytes before each block is sent and may block, see UploadScheduler.
+    """
+    blocks = (data[offset:offset + SEND_BLOCK_SIZE] for offset in range(0, len(data), SEND_BLOCK_SIZE))
+    return putStream(url, blocks, len(data), contentType, timeout, progress, throttle)
+
+
+def putStream(url, blocks, length, contentType = 'application/octet-stream', timeout = 300, progress = None, throttle = None, digest = None):
+    """
+    Same as putData for length bytes coming from the blocks iterable, eg readBlocks.
+    digest, if given, is a hashlib object every block is fed to on the way out.
+    """
+    ## Urls rebuilt from the json manifest come back as unicode, httplib then chokes on the binary body.
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    parsed  = urlparse.urlparse(url)
+    if parsed.scheme == 'https':
+        conn = httplib.HTTPSConnection(parsed.netloc, timeout = timeout)
+    else:
+        conn = httplib.HTTPConnection(parsed.netloc, timeout = timeout)
+    path = parsed.path or '/'
+    if parsed.query:
+        path = '%s?%s' % (path, parsed.query)
+    try:
+        conn.putrequest('PUT', path)
+        conn.putheader('Content-Type', contentType)
+        conn.putheader('Content-Length', str(length))
+        conn.endheaders()
+        for block in blocks:
+            if throttle:
+                throttle(len(block))
+            conn.send(block)
+            if digest:
+                digest.update(block)
+            if progress:
+                progress(len(block))
+        response = conn.getresponse()
+        response.read()
+        if response.status >= 300:
+            raise UploadError('PUT to %s failed with %s %s' % (parsed.netloc, response.status, response.reason))
+        return response.getheader('etag', '')
+    finally:
+        conn.close()
+
+
+class HttpPartTarget(object):
+    """
+    Minimal multi part storage protocol over plain http, used against a local stand in for the storage endpoint.
+        POST {baseUrl}/uploads?filename=x          -> {"upload_id": "..."}
+        PUT  {baseUrl}/uploads/{upload_id}/{part}  -> ETag header
+        POST {baseUrl}/uploads/{upload_id}/complete with {"etags": [...]}
+    The ETags are the part md5s unless etagIsChecksum is turned off.
+    """
+    def __init__(self, baseUrl, etagIsChecksum = True):
+        self.baseUrl = baseUrl.rstrip('/')
+        self.key     = self.baseUrl
+        self.etagIsChecksum = etagIsChecksum
+
+    def _post(self, path, body = ''):
+        parsed  = urlparse.urlparse(self.baseUrl + path)
+        conn    = httplib.HTTPConnection(parsed.netloc)
+        try:
+            conn.request('POST', parsed.path + ('?%s' % parsed.query if parsed.query else ''), body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            data = response.read()
+            if response.status >= 300:
+                raise UploadError('POST %s failed with %s %s' % (path, response.status, response.reason))
+            return data
+        finally:
+            conn.close()
+
+    def start(self, path):
+        return json.loads(self._post('/uploads?filename=%s' % os.path.basename(path)))
+
+    def partUrl(self, uploadInfo, path, partNumber):
+        return '%s/uploads/%s/%s' % (self.baseUrl, uploadInfo['upload_id'], partNumber)
+
+    def complete(self, uploadInfo, path, etags):
+        self._post('/uploads/%s/complete' % uploadInfo['upload_id'], json.dumps({'etags': etags}))
+
+
+class ShotgunStorageTarget(object):
+    """
+    Multi part target for a shotgun site with direct to cloud storage uploads.
+    This leans on the same private helpers shotgun_api3 uses for its own (serial) multi part uploads.
+    The site's bucket may be SSE-KMS encrypted, where the ETags aren't the md5, so they're only checked with etagIsChecksum.
+    """
+    def __init__(self, sg, entityType, entityId, fieldName, etagIsChecksum = False):
+        self.sg         = sg
+        self.entityType = entityType
+        self.entityId   = entityId
+        self.fieldName  = fieldName
+        self.key        = '%s/%s/%s/%s' % (sg.base_url, entityType, entityId, fieldName)
+        self.etagIsChecksum = etagIsChecksum
+        ## The part links come from the shared connection which is not thread safe, the PUTs themselves run in parallel.
+        self._lock      = threading.Lock()
+
+    def isSupported(self):
+        for each in ('_get_attachment_upload_info', '_get_upload_part_link', '_complete_multipart_upload', '_requires_direct_s3_upload', '_send_form'):
+            if not hasattr(self.sg, each):
+                return False
+        return self.sg._requires_direct_s3_upload(self.entityType, self.fieldName)
+
+    def start(self, path):
+        return self.sg._get_attachment_upload_info(False, os.path.basename(path), True)
+
+    def partUrl(self, uploadInfo, path, partNumber):
+        with self._lock:
+            return self.sg._get_upload_part_link(uploadInfo, os.path.basename(path), partNumber)
+
+    def complete(self, uploadInfo, path, etags):
+        filename = os.path.basename(path)
+        self.sg._complete_multipart_upload(uploadInfo, filename, etags)
+
+        ## Now link the uploaded content to the entity field.
+        url = urlparse.urlunparse((self.sg.config.scheme, self.sg.config.server, '/upload/api_link_file', None, None, None))
+        params = {
+            'entity_type':      self.entityType,
+            'entity_id':        self.entityId,
+            'upload_link_info': uploadInfo['upload_info'],
+            'field_name':       self.fieldName,
+            'display_name':     filename,
+        }
+        result = self.sg._send_form(url, params)
+        if not result.startswith('1'):
+            raise UploadError('Could not link the uploaded file to %s %s: %s' % (self.entityType, self.entityId, result))
+
+
+class ChunkedUploader(object):
+    """
+    Uploads a file in parts through a target (HttpPartTarget, ShotgunStorageTarget).
+    Parts that are already in the manifest from a previous run are skipped.
+    progressCallback is called from the worker threads as progressCallback(bytesSent, totalBytes).
+    """
+    def __init__(self, target, partSize = PART_SIZE, workers = UPLOAD_WORKERS, attempts = PART_ATTEMPTS, backoff = RETRY_BACKOFF, progressCallback = None, throttle = None, maxMemory = MAX_MEMORY, useMmap = False):
+        self.target     = target
+        self.progressCallback = progressCallback
+        self.throttle   = throttle
+        self.partSize   = max(int(partSize), 1)
+        self.workers    = max(int(workers), 1)
+        ## Each worker's share of maxMemory for its read buffer
+        self.bufferSize = max(SEND_BLOCK_SIZE, int(maxMemory or MAX_MEMORY) // self.workers)
+        self.useMmap    = useMmap
+        self.attempts   = max(int(attempts), 1)
+        self.backoff    = backoff
+        self._lock      = threading.Lock()
+        self._sent      = 0
+        self._total     = 0
+
+    def _addSent(self, count):
+        with self._lock:
+            self._sent += count
+            sent = self._sent
+        if self.progressCallback:
+            self.progressCallback(sent, self._total)
+
+    def manifestPath(self, path):
+        return '%s%s' % (path, MANIFEST_SUFFIX)
+
+    def _loadManifest(self, path, size, mtime):
+        manifestPath = self.manifestPath(path)
+        if not os.path.exists(manifestPath):
+            return None
+        try:
+            with open(manifestPath, 'r') as f:
+                manifest = json.load(f)
+        except (IOError, ValueError), e:
+            logger.warning('ChunkedUploader: ignoring unreadable manifest %s: %s' % (manifestPath, e))
+            return None
+        ## Only resume if it is the same file going to the same place with the same part layout.
+        if (manifest.get('size') != size or manifest.get('mtime') != mtime
+                or manifest.get('partSize') != self.partSize or manifest.get('target') != self.target.key):
+            logger.info('ChunkedUploader: manifest does not match the file on disk, starting a fresh upload.')
+            return None
+        return manifest
+
+    def _saveManifest(self, path, manifest):
+        ## Write to a temp name first so a crash mid write never leaves a half written manifest behind.
+        manifestPath = self.manifestPath(path)
+        tmpPath = '%s.tmp' % manifestPath
+        with open(tmpPath, 'w') as f:
+            json.dump(manifest, f)
+        if os.path.exists(manifestPath):
+            os.remove(manifestPath)
+        os.rename(tmpPath, manifestPath)
+
+    def _sendPart(self, path, manifest, partNumber, size, contentType):
+        """
+        Streams the part from disk, every attempt reads it again rather than holding it. Returns (etag, md5).
+        """
+        offset  = (partNumber - 1) * self.partSize
+        length  = min(self.partSize, size - offset)
+        attempt = 1
+        while True:
+            ## Track what this attempt sent so a failed attempt can be taken back off the progress.
+            attemptSent = [0]
+            def progress(count):
+                attemptSent[0] += count
+                self._addSent(count)
+            try:
+                url     = self.target.partUrl(manifest['uploadInfo'], path, partNumber)
+                digest  = hashlib.new(PART_CHECKSUM)
+                blocks  = readBlocks(path, offset, length, self.bufferSize, self.useMmap)
+                etag    = putStream(url, blocks, length, contentType, progress = progress, throttle = self.throttle, digest = digest)
+                checksum = digest.hexdigest()
+                stripped = (etag or '').strip('"').lower()
+                if stripped != checksum:
+                    ## An md5 ETag that doesn't match means the part got mangled on the way, send it again
+                    if getattr(self.target, 'etagIsChecksum', False):
+                        raise UploadError('part %s arrived as %s, sent %s' % (partNumber, stripped, checksum))
+                    logger.debug('ChunkedUploader: part %s ETag %s is not its md5 %s, not checked' % (partNumber, stripped, checksum))
+                return etag, checksum
+            except Exception, e:
+                self._addSent(-attemptSent[0])
+                if attempt >= self.attempts:
+                    raise
+                wait = self.backoff * (2 ** (attempt - 1))
+                logger.info('ChunkedUploader: part %s failed (%s), retry %s in %ss' % (partNumber, e, attempt, wait))
+                time.sleep(wait)
+                attempt += 1
+
+    def upload(self, path):
+        """
+        Uploads the file, resuming from the manifest if there is one. Removes the manifest once the upload is complete.
+        Returns the checksum of the whole upload in the S3 multi part style, the md5 of the part md5s plus -partCount,
+        or None if a part resumed from an older manifest has no md5.
+        """
+        stat        = os.stat(path)
+        size        = stat.st_size
+        mtime       = int(stat.st_mtime)
+        partCount   = max(1, (size + self.partSize - 1) // self.partSize)
+        contentType = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        manifest = self._loadManifest(path, size, mtime)
+        if manifest is None:
+            manifest = {
+                'size':         size,
+                'mtime':        mtime,
+                'partSize':     self.partSize,
+                'target':       self.target.key,
+                'uploadInfo':   self.target.start(path),
+                'parts':        {},
+                'checksums':    {},
+            }
+            self._saveManifest(path, manifest)
+        else:
+            logger.info('ChunkedUploader: resuming %s, %s of %s parts already sent.' % (path, len(manifest['parts']), partCount))
+
+        ## Parts sent by a previous run count as already uploaded.
+        self._total = size
+        self._sent  = 0
+        self._addSent(sum([min(self.partSize, size - (int(each) - 1) * self.partSize) for each in manifest['parts']]))
+
+        pending = Queue.Queue()
+        for partNumber in range(1, partCount + 1):
+            if str(partNumber) not in manifest['parts']:
+                pending.put(partNumber)
+        failed = []
+
+        def worker():
+            while True:
+                try:
+                    partNumber = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    etag, checksum = self._sendPart(path, manifest, partNumber, size, contentType)
+                except Exception, e:
+                    logger.warning('ChunkedUploader: part %s of %s failed: %s' % (partNumber, path, e))
+                    with self._lock:
+                        failed.append(partNumber)
+                    continue
+                with self._lock:
+                    manifest['parts'][str(partNumber)] = etag
+                    manifest.setdefault('checksums', {})[str(partNumber)] = checksum
+                    self._saveManifest(path, manifest)
+
+        threads = [threading.Thread(target = worker) for x in range(min(self.workers, pending.qsize()))]
+        for each in threads:
+            each.setDaemon(True)
+            each.start()
+        for each in threads:
+            each.join()
+
+        if failed:
+            raise UploadError('%s of %s parts failed to upload for %s, run the upload again to resume.' % (len(failed), partCount, path), sorted(failed))
+
+        etags = [manifest['parts'][str(partNumber)] for partNumber in range(1, partCount + 1)]
+        self.target.complete(manifest['uploadInfo'], path, etags)
+        os.remove(self.manifestPath(path))
+        checksum = self._uploadChecksum(manifest, partCount)
+        logger.info('ChunkedUploader: %s uploaded in %s parts (%s).' % (path, partCount, checksum))
+        return checksum
+
+    def _uploadChecksum(self, manifest, partCount):
+        checksums = manifest.get('checksums', {})
+        if len(checksums) != partCount:
+            return None
+        digest = hashlib.new(PART_CHECKSUM)
+        for partNumber in range(1, partCount + 1):
+            digest.update(checksums[str(partNumber)].decode('hex'))
+        return '%s-%s' % (digest.hexdigest(), partCount)
+
+
+def uploadMovie(versionId, path_to_movie, partSize, workers, progressCallback = None, throttle = None, maxMemory = MAX_MEMORY, useMmap = False):
+    """
+    Uploads the movie to the Version's sg_uploaded_movie field through a pooled connection.
+    Uses the parallel, resumable, streamed multi part upload when the site supports direct uploads.
+    Returns the upload's checksum, None for the plain api upload.
+    """
+    ## Use the process wide pool so we don't pay for a brand new connection per upload.
+    with getShotgunPool().connection() as sg:
+        target = ShotgunStorageTarget(sg, "Version", versionId, "sg_uploaded_movie")
+        if target.isSupported():
+            ## Parallel multi part upload that resumes from its manifest if a previous run was interrupted.
+            uploader = ChunkedUploader(target, partSize = partSize, workers = workers, progressCallback = progressCallback, throttle = throttle, maxMemory = maxMemory, useMmap = useMmap)
+            return uploader.upload(path_to_movie)
+        else:
+            ## The plain api upload gives us no progress, so all we can report is the start and the end.
+            ## It also builds the whole form body in memory, only sites without direct uploads end up here.
+            total = os.path.getsize(path_to_movie)
+            if progressCallback:
+                progressCallback(0, total)
+            ## Nothing to pace block by block, so the whole movie is paid for up front
+            if throttle:
+                throttle(total)
+            sg.upload("Version", versionId, path_to_movie, "sg_uploaded_movie")
+            if progressCallback:
+                progressCallback(total, total)
@@ -0,0 +1,333 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Per frame render cache for re-playblasting a shot after changing part of it. Every frame gets a key from:
+
+    - the render settings: camera, the viewport / renderer options, resolution, scale, quality and maya version
+    - the scene content that isn't keyframes: the saved .ma with the animation curves and ui nodes stripped out
+      (a binary .mb is hashed whole, so any save re-renders everything)
+    - the keys of every animation curve segment the frame sits in
+
+Changing the keys between 40 and 60 only changes the segments around them, so only those frames get new keys and
+get rendered; everything else is linked back out of the cache before encoding. Frames can also be declared dirty
+by hand, eg after a change the keys can't see like an unkeyed shader tweak.
+
+The cache is a directory of <key>.png files trimmed back to its size limit, least recently used first.
+"""
+import os, sys, json, math, shutil, hashlib, bisect, uuid
+from .PublishMover import COPY_BLOCK_SIZE
+import logging
+logger = logging.getLogger(__name__)
+
+FRAME_CACHE_DIR         = os.path.join(os.path.expanduser('~'), '.tk-jbd-playblast', 'framecache')
+FRAME_CACHE_MAX_BYTES   = 20 * 1024 * 1024 * 1024
+## Trimming goes this far under the limit so the next run doesn't trim again straight away
+EVICT_TARGET            = 0.9
+IMAGE_FORMAT            = 'png'
+## Time to value curves. The unitless input ones (set driven keys) don't depend on time and go in the scene key.
+TIME_CURVE_TYPES        = ['animCurveTL', 'animCurveTA', 'animCurveTT', 'animCurveTU']
+## Nodes the frame can depend on without any keys changing. With any of these in the scene the cache is skipped.
+TIME_DEPENDENT_TYPES    = ['expression', 'nucleus', 'particle', 'nParticle', 'fluidShape', 'cacheFile', 'AlembicNode', 'gpuCache']
+## Nodes in a .ma that change on every save without changing what the playblast looks like
+UI_NODE_NAMES           = ['uiConfigurationScriptNode']
+UI_NODE_TYPES           = ['nodeGraphEditorInfo', 'hyperGraphInfo', 'hyperLayout']
+## Curve pre / post infinity values from cycle up repeat the whole curve past its ends
+INFINITY_CYCLE          = 3
+
+
+def _hash(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys = True, default = str)).hexdigest()
+
+
+def settingsKey(**settings):
+    """
+    Key for everything about the render that isn't the scene, eg settingsKey(camera = 'shotCam', width = 1280, ...).
+    """
+    return _hash(settings)
+
+
+def parseFrameRanges(text):
+    """
+    '40-60, 75' -> [(40, 60), (75, 75)]. Anything that isn't a frame or a range is ignored with a warning.
+    """
+    ranges = []
+    for each in (text or '').replace(';', ',').split(','):
+        each = each.strip()
+        if not each:
+            continue
+        try:
+            if '-' in each[1:]:
+                start, end = each[0] + each[1:].split('-', 1)[0], each[1:].split('-', 1)[1]
+                start, end = int(start), int(end)
+            else:
+                start = end = int(each)
+        except ValueError:
+            logger.warning('FrameCache: ignoring %r, frames are given as 40-60, 75' % each)
+            continue
+        ranges.append((min(start, end), max(start, end)))
+    return ranges
+
+
+def framesToRanges(frames):
+    """
+    [40, 41, 42, 75] -> [(40, 42), (75, 75)]
+    """
+    ranges = []
+    for frame in sorted(set(frames)):
+        if ranges and frame == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], frame)
+        else:
+            ranges.append((frame, frame))
+    return ranges
+
+
+def _segmentHash(name, keys, infinity, index):
+    ## The segment a time sits in is decided by the key at or before it and the one after it.
+    ## Either is missing before the first / after the last key, where the infinity settings rule,
+    ## and a cycling infinity depends on every key.
+    before = keys[index - 1] if index > 0 else None
+    after = keys[index] if index < len(keys) else None
+    if (index == 0 and infinity[0] >= INFINITY_CYCLE) or (index == len(keys) and infinity[1] >= INFINITY_CYCLE):
+        before = after = keys
+    return int(hashlib.sha1('%s|%r|%r' % (name, before, after)).hexdigest()[:16], 16)
+
+
+def frameKeys(settings, scene, curves, firstFrame, lastFrame):
+    """
+    Returns {frame: key} for the range.
+    @param curves: {curveName: ((preInfinity, postInfinity), [(time, value, tangents...), ...])} keys sorted by time,
+                   see readAnimCurves.
+    Each frame's animation part combines one hash per curve for the segment the frame is in. The combined
+    value only changes when a key is crossed, so this is one pass over the keys rather than frames * curves.
+    """
+    firstFrame  = int(firstFrame)
+    lastFrame   = int(lastFrame)
+    base        = _hash(settings, scene)
+    combined    = 0
+    ## frame -> the curve keys crossed on the way to it
+    crossings   = {}
+    for name, (infinity, keys) in curves.items():
+        name = '%s|%s' % (name, infinity)
+        times = [key[0] for key in keys]
+        index = bisect.bisect_right(times, firstFrame)
+        combined ^= _segmentHash(name, keys, infinity, index)
+        for keyIndex in range(index, len(keys)):
+            ## The first whole frame at or after the key sits in the segment after it
+            frame = int(math.ceil(times[keyIndex]))
+            if frame > lastFrame:
+                break
+            crossings.setdefault(frame, []).append((name, keys, infinity, keyIndex))
+
+    keysByFrame = {}
+    for frame in range(firstFrame, lastFrame + 1):
+        for name, keys, infinity, index in crossings.get(frame, []):
+            combined ^= _segmentHash(name, keys, infinity, index)
+            combined ^= _segmentHash(name, keys, infinity, index + 1)
+        keysByFrame[frame] = hashlib.sha1('%s|%x|%s' % (base, combined, frame)).hexdigest()
+    return keysByFrame
+
+
+def readAnimCurves():
+    """
+    Reads every time based animation curve in the scene as frameKeys wants them.
+    """
+    import maya.cmds as cmds
+    curves = {}
+    for curve in cmds.ls(type = TIME_CURVE_TYPES) or []:
+        times = cmds.keyframe(curve, query = True, timeChange = True) or []
+        if not times:
+            continue
+        values      = cmds.keyframe(curve, query = True, valueChange = True)
+        inAngles    = cmds.keyTangent(curve, query = True, inAngle = True)
+        outAngles   = cmds.keyTangent(curve, query = True, outAngle = True)
+        inWeights   = cmds.keyTangent(curve, query = True, inWeight = True)
+        outWeights  = cmds.keyTangent(curve, query = True, outWeight = True)
+        inTypes     = cmds.keyTangent(curve, query = True, inTangentType = True)
+        outTypes    = cmds.keyTangent(curve, query = True, outTangentType = True)
+        infinity    = (cmds.getAttr('%s.preInfinity' % curve), cmds.getAttr('%s.postInfinity' % curve))
+        ## Where the curve goes, so reconnecting a curve to another attribute counts as a change
+        outputs     = sorted(cmds.listConnections('%s.output' % curve, plugs = True, source = False) or [])
+        keys = zip(times, values, inAngles, outAngles, inWeights, outWeights, inTypes, outTypes)
+        curves['%s>%s' % (curve, ','.join(outputs))] = (infinity, sorted(keys))
+    return curves
+
+
+def timeDependentNodes():
+    """
+    Nodes whose output changes over time without any keys, eg expressions and caches. Frames can't be cached with these around.
+    """
+    from .SceneIndex import getSceneIndex
+    return getSceneIndex().nodes(*TIME_DEPENDENT_TYPES)
+
+
+def _maContent(path, stripCurves = True):
+    """
+    The .ma with the ui nodes, comments, fileInfo, the current time and (stripCurves) the time curves stripped out, as a hash.
+    """
+    digest = hashlib.sha1()
+    skip = False
+    inTime = False
+    with open(path, 'r') as f:
+        for line in f:
+            if line.startswith('\t') or line.startswith(' '):
+                if skip or (inTime and ('".o"' in line or '".unw"' in line)):
+                    continue
+                digest.update(line)
+                continue
+            skip = False
+            inTime = False
+            if line.startswith('//') or line.startswith('fileInfo'):
+                continue
+            if line.startswith('createNode '):
+                parts = line.split()
+                nodeType = parts[1]
+                name = parts[parts.index('-n') + 1].strip('";') if '-n' in parts else ''
+                if (stripCurves and nodeType in TIME_CURVE_TYPES) or nodeType in UI_NODE_TYPES or name in UI_NODE_NAMES:
+                    skip = True
+                    continue
+            if line.startswith('select -ne :time1'):
+                inTime = True
+            digest.update(line)
+    return digest.hexdigest()
+
+
+def sceneContentKey(scenePath, stripCurves = True):
+    """
+    Key for the saved scene, minus its keyframes unless stripCurves is False. Only valid while the scene has no unsaved changes.
+    """
+    if scenePath.lower().endswith('.ma'):
+        return 'ma:%s' % _maContent(scenePath, stripCurves)
+    digest = hashlib.sha1()
+    with open(scenePath, 'rb') as f:
+        while True:
+            block = f.read(COPY_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return 'file:%s' % digest.hexdigest()
+
+
+def _linkOrCopy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    link = getattr(os, 'link', None)
+    if link is not None:
+        try:
+            link(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+
+class FrameCache(object):
+    """
+    cache = FrameCache()
+    dirty = cache.restore(keys, framePath, forced = [(40, 60)])
+    ... render framesToRanges(dirty) to framePath(frame) ...
+    for frame in dirty:
+        cache.store(keys[frame], framePath(frame))
+    cache.evict()
+    """
+    def __init__(self, cacheDir = FRAME_CACHE_DIR, maxBytes = FRAME_CACHE_MAX_BYTES, imageFormat = IMAGE_FORMAT):
+        self.cacheDir       = cacheDir
+        self.maxBytes       = maxBytes
+        self.imageFormat    = imageFormat
+        if not os.path.isdir(self.cacheDir):
+            try:
+                os.makedirs(self.cacheDir)
+            except OSError:
+                if not os.path.isdir(self.cacheDir):
+                    raise
+
+    def path(self, key):
+        return os.path.join(self.cacheDir, key[:2], '%s.%s' % (key, self.imageFormat))
+
+    def fetch(self, key, dst):
+        """
+        Puts the cached frame at dst. Returns False if it isn't cached (any more).
+        """
+        path = self.path(key)
+        try:
+            _linkOrCopy(path, dst)
+        except (IOError, OSError):
+            return False
+        ## mtime is the LRU clock, atime isn't kept up to date on most mounts
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return True
+
+    def store(self, key, src):
+        path = self.path(key)
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                pass
+        ## Temp name then rename, so a reader never links half a frame
+        tmpPath = '%s.%s.tmp' % (path, uuid.uuid4().hex[:8])
+        try:
+            _linkOrCopy(src, tmpPath)
+            if sys.platform == 'win32' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmpPath, path)
+        except (IOError, OSError), e:
+            logger.warning('FrameCache: could not cache %s: %s' % (src, e))
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+
+    def restore(self, keys, framePath, forced = ()):
+        """
+        Puts every cached frame of keys ({frame: key}) at framePath(frame) and returns the sorted frames that still need rendering.
+        @param forced: (start, end) ranges to render regardless of the cache
+        """
+        dirty = []
+        for frame in sorted(keys):
+            if any(start <= frame <= end for start, end in forced) or not self.fetch(keys[frame], framePath(frame)):
+                dirty.append(frame)
+        return dirty
+
+    def _files(self):
+        found = []
+        for root, dirs, files in os.walk(self.cacheDir):
+            for each in files:
+                path = os.path.join(root, each)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, stat.st_size, path))
+        return found
+
+    def size(self):
+        return sum([each[1] for each in self._files()])
+
+    def evict(self):
+        """
+        Removes the least recently used frames until the cache is under its limit. Returns the bytes removed.
+        """
+        files = self._files()
+        total = sum([each[1] for each in files])
+        if total <= self.maxBytes:
+            return 0
+        removed = 0
+        target = total - int(self.maxBytes * EVICT_TARGET)
+        for mtime, size, path in sorted(files):
+            if removed >= target:
+                break
+            try:
+                os.remove(path)
+                removed += size
+            except OSError:
+                pass
+        logger.info('FrameCache: evicted %.1f MB from %s' % (removed / (1024.0 * 1024.0), self.cacheDir))
+        return removed
+
+    def clear(self):
+        shutil.rmtree(self.cacheDir, ignore_errors = True)
+        os.makedirs(self.cacheDir)
@@ -0,0 +1,146 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Skips uploading a movie shotgun already has. Artists often submit the same playblast again with just a new
+comment, so the movie's content hash is stored on the Version (HASH_FIELD, a text field) and in a small
+local index of hash -> Version and attachment. When a new Version's movie matches an earlier upload for the
+same entity, the new Version is pointed at that attachment instead of sending the bytes again.
+"""
+import os, sys, time, json, hashlib, threading, uuid
+from .PublishMover import COPY_BLOCK_SIZE, CHECKSUM
+import logging
+logger = logging.getLogger(__name__)
+
+DEDUPE_INDEX    = os.path.join(os.path.expanduser('~'), '.tk-jbd-playblast', 'dedupe.json')
+## Text field on the Version the hash goes in. The same algorithm as PublishMover so a copied movie needs no second pass.
+HASH_FIELD      = 'sg_movie_hash'
+HASH_ALGORITHM  = CHECKSUM
+## The oldest entries are dropped past this many
+MAX_ENTRIES     = 2000
+
+
+def hashMovie(path, algorithm = HASH_ALGORITHM, blockSize = COPY_BLOCK_SIZE):
+    """
+    Streams the file through the hash, one reusable buffer so a multi GB movie costs blockSize of memory.
+    """
+    digest = hashlib.new(algorithm)
+    buf = bytearray(blockSize)
+    view = memoryview(buf)
+    with open(path, 'rb') as f:
+        while True:
+            read = f.readinto(buf)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+
+def _key(checksum, entity):
+    return '%s:%s:%s' % (checksum, entity['type'], entity['id'])
+
+
+class DedupeIndex(object):
+    """
+    hash + entity -> {versionId, attachment, moviePath, size, recorded}, kept in one json file.
+    It is only ever a hint, every hit is checked against shotgun before it is used.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, path = DEDUPE_INDEX):
+        self.path = path
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write(self, entries):
+        ## Same as the spool, temp name then rename so a crash never leaves half an index.
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        tmpPath = '%s.%s.tmp' % (self.path, uuid.uuid4().hex)
+        with open(tmpPath, 'w') as f:
+            json.dump(entries, f)
+        if sys.platform == 'win32' and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmpPath, self.path)
+
+    def get(self, checksum, entity):
+        with self._lock:
+            return self._read().get(_key(checksum, entity))
+
+    def put(self, checksum, entity, versionId, attachment, moviePath = None):
+        record = {
+                    'versionId':    versionId,
+                    'attachment':   attachment,
+                    'moviePath':    moviePath,
+                    'size':         os.path.getsize(moviePath) if moviePath and os.path.exists(moviePath) else None,
+                    'recorded':     time.time(),
+                 }
+        with self._lock:
+            ## Read again under the lock so another submission's entry isn't lost
+            entries = self._read()
+            entries[_key(checksum, entity)] = record
+            if len(entries) > MAX_ENTRIES:
+                for key in sorted(entries, key = lambda each: entries[each]['recorded'])[:len(entries) - MAX_ENTRIES]:
+                    del entries[key]
+            self._write(entries)
+        return record
+
+    def forget(self, checksum, entity):
+        with self._lock:
+            entries = self._read()
+            if entries.pop(_key(checksum, entity), None) is not None:
+                self._write(entries)
+
+
+def _attachment(version):
+    movie = version.get('sg_uploaded_movie') if version else None
+    if isinstance(movie, dict) and movie.get('id'):
+        return {'type': movie.get('type', 'Attachment'), 'id': movie['id'], 'name': movie.get('name')}
+    return None
+
+
+def findUploadedMovie(sg, checksum, entity, hashField = HASH_FIELD, index = None, exclude = None):
+    """
+    Returns {'versionId', 'attachment'} for an earlier Version of entity whose uploaded movie has the same hash, or None.
+    The local index is tried first, one find_one to confirm it, then a find on the hash field.
+    """
+    if index is not None:
+        record = index.get(checksum, entity)
+        if record and record['versionId'] != exclude:
+            version = sg.find_one('Version', filters = [['id', 'is', record['versionId']], [hashField, 'is', checksum]], fields = ['sg_uploaded_movie'])
+            attachment = _attachment(version)
+            if attachment:
+                return {'versionId': record['versionId'], 'attachment': attachment}
+            ## Deleted, re uploaded or replaced since, don't trust it again
+            index.forget(checksum, entity)
+
+    filters = [['entity', 'is', entity], [hashField, 'is', checksum]]
+    if exclude:
+        filters.append(['id', 'is_not', exclude])
+    for version in sg.find('Version', filters = filters, fields = ['sg_uploaded_movie'], order = [{'field_name': 'id', 'direction': 'desc'}]):
+        attachment = _attachment(version)
+        if attachment:
+            if index is not None:
+                index.put(checksum, entity, version['id'], attachment)
+            return {'versionId': version['id'], 'attachment': attachment}
+    return None
+
+
+def linkUploadedMovie(sg, versionId, match):
+    """
+    Points the Version's sg_uploaded_movie at the matched attachment. Returns False if the site won't have it,
+    the caller then uploads as normal.
+    """
+    try:
+        sg.update('Version', versionId, {'sg_uploaded_movie': {'type': 'Attachment', 'id': match['attachment']['id']}})
+    except Exception, e:
+        logger.warning('MovieDedupe: could not reuse the movie of Version %s for Version %s, uploading it: %s' % (match['versionId'], versionId, e))
+        return False
+    return True
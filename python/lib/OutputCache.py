@@ -0,0 +1,199 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Whole movie memoization. A playblast of the same saved scene with the same settings makes the same movie, so
+every movie is kept under a fingerprint of everything that goes into it:
+
+    - the saved scene (a .ma minus the save noise, see FrameCache.sceneContentKey) and the files it reads
+      (references, textures, caches, sound) by path, size and mtime
+    - camera, frame range, width and height, quality and scale, the modelEditor state and the CONST.PB_* settings
+    - how the movie is made (render mode, encoder)
+
+Playblasting again with the same fingerprint copies the known movie to the work path instead of rendering.
+Movies are looked for where the last render left them in the work area first, then in the cache directory, which
+is trimmed least recently used first like the FrameCache. Movies are always copied in and out of the cache, never
+hard linked, as maya and the encoder rewrite their output in place and would change the cached movie with it.
+Both copies are checked against the size and mtime recorded when they were stored before they are used.
+"""
+import os, sys, json, time, shutil, threading, uuid
+from . import CONST
+from .FrameCache import FrameCache, _hash
+import logging
+logger = logging.getLogger(__name__)
+
+OUTPUT_CACHE_DIR        = os.path.join(os.path.expanduser('~'), '.tk-jbd-playblast', 'outputcache')
+OUTPUT_CACHE_MAX_BYTES  = 20 * 1024 * 1024 * 1024
+INDEX_FILE              = 'index.json'
+
+
+def pbSettings():
+    """
+    The CONST.PB_* playblast and HW_* viewport 2.0 settings as a dict, so a studio changing any of them misses the cache.
+    The app sets the HW_* globals itself before every playblast without them counting as unsaved changes, so the saved
+    scene the fingerprint reads doesn't show them.
+    """
+    return dict([(name, getattr(CONST, name)) for name in dir(CONST) if name.startswith(('PB_', 'HW_'))])
+
+
+def dependencyKey(paths):
+    """
+    Key for the files the scene reads, by path, size and mtime. Missing files count as missing.
+    """
+    stats = []
+    for path in sorted(set(paths)):
+        try:
+            stat = os.stat(path)
+            stats.append((path, stat.st_size, int(stat.st_mtime)))
+        except OSError:
+            stats.append((path, None, None))
+    return _hash(stats)
+
+
+def sceneDependencies():
+    """
+    Every file the open scene reads, references, textures, caches and sound included.
+    """
+    import maya.cmds as cmds
+    scene = os.path.abspath(cmds.file(query = True, sn = True))
+    return [each for each in (cmds.file(query = True, list = True) or []) if os.path.abspath(each) != scene]
+
+
+def outputFingerprint(**parts):
+    """
+    outputFingerprint(scene = ..., camera = ..., firstFrame = ..., ...) -> hex key
+    """
+    return _hash(parts)
+
+
+class OutputCache(FrameCache):
+    """
+    FrameCache of whole movies, plus an index of where each fingerprint's movie was last rendered to.
+
+    cache = OutputCache(movieFormat = 'mov')
+    if not cache.fetch(fingerprint, workPath):
+        ... render workPath ...
+        cache.store(fingerprint, workPath)
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, cacheDir = OUTPUT_CACHE_DIR, maxBytes = OUTPUT_CACHE_MAX_BYTES, movieFormat = 'mov'):
+        FrameCache.__init__(self, cacheDir, maxBytes, movieFormat)
+        self.indexPath = os.path.join(self.cacheDir, INDEX_FILE)
+
+    def _readIndex(self):
+        try:
+            with open(self.indexPath, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _writeIndex(self, index):
+        tmpPath = '%s.%s.tmp' % (self.indexPath, uuid.uuid4().hex)
+        with open(tmpPath, 'w') as f:
+            json.dump(index, f)
+        if sys.platform == 'win32' and os.path.exists(self.indexPath):
+            os.remove(self.indexPath)
+        os.rename(tmpPath, self.indexPath)
+
+    def _workCopy(self, fingerprint):
+        ## The movie where the last render put it, as long as nothing has touched it since.
+        with self._lock:
+            record = self._readIndex().get(fingerprint)
+        if not record:
+            return None
+        try:
+            stat = os.stat(record['workPath'])
+        except OSError:
+            return None
+        if stat.st_size != record['size'] or int(stat.st_mtime) != record['mtime']:
+            return None
+        return record['workPath']
+
+    def _cacheCopy(self, fingerprint):
+        ## The movie in the cache directory, as long as it is still the one that was stored.
+        path = self.path(fingerprint)
+        with self._lock:
+            record = self._readIndex().get(fingerprint)
+        if not record or 'cacheSize' not in record:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != record['cacheSize'] or int(stat.st_mtime) != record['cacheMtime']:
+            logger.warning('OutputCache: %s changed since it was cached, not using it.' % path)
+            return None
+        return path
+
+    def lookup(self, fingerprint):
+        """
+        Returns where the movie for fingerprint is, or None.
+        """
+        return self._workCopy(fingerprint) or self._cacheCopy(fingerprint)
+
+    def _copy(self, src, dst):
+        ## Temp name then rename, so nobody reads half a movie
+        tmpPath = '%s.%s.tmp' % (dst, uuid.uuid4().hex[:8])
+        try:
+            shutil.copyfile(src, tmpPath)
+            if os.path.exists(dst):
+                os.remove(dst)
+            os.rename(tmpPath, dst)
+        finally:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+
+    def fetch(self, fingerprint, dst):
+        """
+        Puts a copy of the movie for fingerprint at dst. Returns where it came from, or None on a miss.
+        """
+        workCopy = self._workCopy(fingerprint)
+        if workCopy:
+            if os.path.abspath(workCopy) != os.path.abspath(dst):
+                self._copy(workCopy, dst)
+            return workCopy
+        path = self._cacheCopy(fingerprint)
+        if path is None:
+            return None
+        try:
+            self._copy(path, dst)
+        except (IOError, OSError), e:
+            logger.warning('OutputCache: could not fetch %s: %s' % (path, e))
+            return None
+        ## mtime is the LRU clock, the index is kept in step so the check above still passes next time
+        try:
+            os.utime(path, None)
+            with self._lock:
+                index = self._readIndex()
+                if fingerprint in index:
+                    index[fingerprint]['cacheMtime'] = int(os.stat(path).st_mtime)
+                    self._writeIndex(index)
+        except OSError:
+            pass
+        return path
+
+    def store(self, fingerprint, src):
+        path = self.path(fingerprint)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        try:
+            self._copy(src, path)
+        except (IOError, OSError), e:
+            logger.warning('OutputCache: could not cache %s: %s' % (src, e))
+            return
+        stat = os.stat(src)
+        cached = os.stat(path)
+        with self._lock:
+            index = self._readIndex()
+            index[fingerprint] = {'workPath': os.path.abspath(src), 'size': stat.st_size, 'mtime': int(stat.st_mtime), 'stored': time.time(),
+                                  'cacheSize': cached.st_size, 'cacheMtime': int(cached.st_mtime)}
+            ## Drop the entries whose cached movie has been evicted and whose work copy is gone
+            for key in index.keys():
+                if not os.path.exists(self.path(key)) and not os.path.exists(index[key]['workPath']):
+                    del index[key]
+            self._writeIndex(index)
+
+    def _files(self):
+        return [each for each in FrameCache._files(self) if os.path.basename(each[2]) != INDEX_FILE]
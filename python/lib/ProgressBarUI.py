@@ -1,5 +1,17 @@
+import time
+from collections import deque
 from tank.platform.qt import QtCore, QtGui
 
+## Seconds of recent transfer history used for the moving average throughput.
+RATE_WINDOW = 5.0
+
+
+def _formatBytes(count):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(count) < 1024.0 or unit == 'GB':
+            return '%.1f %s' % (count, unit)
+        count = count / 1024.0
+
 
 class ProgressBarUI(QtGui.QWidget):
     """
@@ -29,6 +41,10 @@ class ProgressBarUI(QtGui.QWidget):
         #self.setWindowFlags(Qt.SplashScreen)
         self.layout.addStretch(1)
 
+        ## (time, bytesSent) samples inside the RATE_WINDOW for the moving average
+        self._samples       = deque()
+        self.doingWhat      = ''
+
     def updateProgress(self, percent = 0, doingWhat = ''):
         self.progressBar.setValue(percent)
         self.doingLabel.setText(doingWhat)
@@ -37,4 +53,35 @@ class ProgressBarUI(QtGui.QWidget):
     def showEvent(self, e):
         QtGui.QWidget.showEvent(self, e)
         self.resize(400, 50)        
-        self.move(QtCore.QApplication.desktop().screen().rect().center()- self.rect().center())
\ No newline at end of file
+        self.move(QtCore.QApplication.desktop().screen().rect().center()- self.rect().center())
+
+    def resetRate(self):
+        """
+        Forget the transfer history, call this before reusing the bar for another transfer.
+        """
+        self._samples.clear()
+
+    def updateBytes(self, sent, total):
+        """
+        Slot for the uploader progress signal. Drives the bar from the bytes actually sent and shows
+        throughput and ETA from a moving average over the last RATE_WINDOW seconds of transfer.
+        """
+        now = time.time()
+        self._samples.append((now, sent))
+        while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW:
+            self._samples.popleft()
+
+        rate = 0.0
+        firstTime, firstSent = self._samples[0]
+        if now > firstTime:
+            rate = max(sent - firstSent, 0) / (now - firstTime)
+
+        if rate > 0:
+            eta = int((total - sent) / rate)
+            etaText = '%d:%02d' % (eta // 60, eta % 60)
+        else:
+            etaText = '--:--'
+
+        percent = int(sent * 100 / total) if total else 100
+        self.progressBar.setValue(percent)
+        self.doingLabel.setText('%s  %s / %s  %s/s  ETA %s' % (self.doingWhat, _formatBytes(sent), _formatBytes(total), _formatBytes(rate), etaText))
@@ -0,0 +1,28 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Rate limit for upload progress callbacks, so the GUI thread isn't flooded with events.
+"""
+import time
+
+## Min seconds between progress callbacks so the GUI thread isn't flooded with events.
+PROGRESS_INTERVAL = 0.1
+
+
+class ProgressThrottle(object):
+    """
+    Wraps a progress(sent, total) callable so it fires at most once per interval, plus always on completion.
+    """
+    def __init__(self, callback, interval = PROGRESS_INTERVAL):
+        self.callback   = callback
+        self.interval   = interval
+        self._lastCall  = 0
+
+    def __call__(self, sent, total):
+        now = time.time()
+        if sent < total and now - self._lastCall < self.interval:
+            return
+        self._lastCall = now
+        self.callback(sent, total)
@@ -0,0 +1,241 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Moves the rendered movie from the work path to the publish path as cheaply as the filesystems allow:
+
+    1. rename, atomic and free on the same filesystem
+    2. hardlink then remove the source, same filesystem when the rename was refused (eg windows file in use)
+    3. reflink (FICLONE), copy on write clone on filesystems that support it
+    4. a copy into a temp name next to the destination, hashed on the way through, fsynced and renamed into place
+
+The publish path only ever sees the complete file, a reader can never pick up a half copied movie.
+"""
+import os, sys, time, errno, hashlib, uuid
+import logging
+logger = logging.getLogger(__name__)
+
+## Read / write size for the copy. Big blocks keep the syscall count down on multi GB movies.
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+CHECKSUM        = 'sha1'
+## linux/fs.h FICLONE
+FICLONE         = 0x40049409
+
+METHOD_RENAME   = 'rename'
+METHOD_HARDLINK = 'hardlink'
+METHOD_REFLINK  = 'reflink'
+METHOD_COPY     = 'copy'
+
+
+class MoveError(Exception):
+    pass
+
+
+class MoveResult(object):
+    """
+    What the mover did. checksum is only filled in when the data was actually copied.
+    """
+    def __init__(self, method, size, seconds, checksum = None, sourceKept = False):
+        self.method     = method
+        self.size       = size
+        self.seconds    = seconds
+        self.checksum   = checksum
+        self.sourceKept = sourceKept
+
+    @property
+    def bytesPerSec(self):
+        return int(self.size / max(self.seconds, 0.000001))
+
+    def asDict(self):
+        return {'method': self.method, 'size': self.size, 'seconds': round(self.seconds, 6), 'bytesPerSec': self.bytesPerSec,
+                'checksum': self.checksum, 'sourceKept': self.sourceKept}
+
+    def __repr__(self):
+        return 'MoveResult(%s, %s bytes, %.1f MB/s)' % (self.method, self.size, self.bytesPerSec / (1024.0 * 1024.0))
+
+
+def _replace(src, dst):
+    """
+    Atomic rename over an existing dst. posix rename already replaces, windows needs dst out of the way first.
+    """
+    if sys.platform == 'win32' and os.path.exists(dst):
+        backup = '%s.%s.old' % (dst, uuid.uuid4().hex[:8])
+        os.rename(dst, backup)
+        try:
+            os.rename(src, dst)
+        except OSError:
+            os.rename(backup, dst)
+            raise
+        os.remove(backup)
+    else:
+        os.rename(src, dst)
+
+
+def _fsyncDir(path):
+    ## Make the rename itself durable. Directories can't be opened on windows, nothing to do there.
+    if sys.platform == 'win32':
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class PublishMover(object):
+    """
+    mover = PublishMover()
+    result = mover.move(workPath, publishPath)
+    """
+    def __init__(self, blockSize = COPY_BLOCK_SIZE, checksum = CHECKSUM, verify = True, progressCallback = None, throttle = None):
+        self.blockSize          = blockSize
+        self.checksum           = checksum
+        ## Re read the destination after a copy and compare checksums
+        self.verify             = verify
+        ## progressCallback(bytesDone, total) during a copy
+        self.progressCallback   = progressCallback
+        ## throttle(bytes) is called after every block written and may block to hold the copy to a bandwidth, see ScratchTransfer.TokenBucket
+        self.throttle           = throttle
+
+    def move(self, src, dst, allowCopy = True):
+        """
+        Moves src to dst. With allowCopy off only the metadata moves (1 to 3) are tried and None is returned
+        if the data would have to be copied, so the caller can do the copy itself later.
+        """
+        if src == dst:
+            return MoveResult(METHOD_RENAME, os.path.getsize(dst), 0.0)
+        if not os.path.isfile(src):
+            raise MoveError('Nothing to move, %s does not exist' % src)
+        dstDir = os.path.dirname(dst)
+        if dstDir and not os.path.isdir(dstDir):
+            os.makedirs(dstDir)
+
+        size    = os.path.getsize(src)
+        start   = time.time()
+        try:
+            _replace(src, dst)
+            _fsyncDir(dstDir)
+            return MoveResult(METHOD_RENAME, size, time.time() - start)
+        except OSError, e:
+            crossDevice = e.errno == errno.EXDEV
+            logger.info('PublishMover: rename %s -> %s failed (%s), %s' % (src, dst, e, 'copying' if crossDevice else 'trying a link'))
+
+        if not crossDevice:
+            result = self._link(src, dst, size, start)
+            if result:
+                return result
+        result = self._reflink(src, dst, size, start)
+        if result or not allowCopy:
+            return result
+        return self._copy(src, dst, size, start)
+
+    def copy(self, src, dst):
+        """
+        Same as move but src is left where it is, eg the local scratch copy the upload still reads from.
+        """
+        if not os.path.isfile(src):
+            raise MoveError('Nothing to copy, %s does not exist' % src)
+        dstDir = os.path.dirname(dst)
+        if dstDir and not os.path.isdir(dstDir):
+            os.makedirs(dstDir)
+        size    = os.path.getsize(src)
+        start   = time.time()
+        return self._reflink(src, dst, size, start, removeSource = False) or self._copy(src, dst, size, start, removeSource = False)
+
+    def _removeSource(self, src):
+        try:
+            os.remove(src)
+            return False
+        except OSError, e:
+            ## Usually maya still has the movie open on windows. The publish is complete, the work copy just stays behind.
+            logger.warning('PublishMover: could not remove %s after moving it: %s' % (src, e))
+            return True
+
+    def _tempName(self, dst):
+        return os.path.join(os.path.dirname(dst), '.%s.%s.tmp' % (os.path.basename(dst), uuid.uuid4().hex[:8]))
+
+    def _link(self, src, dst, size, start):
+        link = getattr(os, 'link', None)
+        if link is None:
+            return None
+        tmp = self._tempName(dst)
+        try:
+            link(src, tmp)
+        except OSError:
+            return None
+        _replace(tmp, dst)
+        _fsyncDir(os.path.dirname(dst))
+        return MoveResult(METHOD_HARDLINK, size, time.time() - start, sourceKept = self._removeSource(src))
+
+    def _reflink(self, src, dst, size, start, removeSource = True):
+        try:
+            import fcntl
+        except ImportError:
+            return None
+        tmp = self._tempName(dst)
+        try:
+            with open(src, 'rb') as fsrc:
+                with open(tmp, 'wb') as fdst:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                    os.fsync(fdst.fileno())
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return None
+        _replace(tmp, dst)
+        _fsyncDir(os.path.dirname(dst))
+        return MoveResult(METHOD_REFLINK, size, time.time() - start, sourceKept = self._removeSource(src) if removeSource else True)
+
+    def _hashFile(self, path):
+        digest = hashlib.new(self.checksum)
+        buf = bytearray(self.blockSize)
+        view = memoryview(buf)
+        with open(path, 'rb') as f:
+            while True:
+                read = f.readinto(buf)
+                if not read:
+                    break
+                digest.update(view[:read])
+        return digest.hexdigest()
+
+    def _copy(self, src, dst, size, start, removeSource = True):
+        tmp     = self._tempName(dst)
+        digest  = hashlib.new(self.checksum)
+        ## One reusable buffer, no new string per block
+        buf     = bytearray(self.blockSize)
+        view    = memoryview(buf)
+        done    = 0
+        try:
+            with open(src, 'rb') as fsrc:
+                with open(tmp, 'wb') as fdst:
+                    while True:
+                        read = fsrc.readinto(buf)
+                        if not read:
+                            break
+                        fdst.write(view[:read])
+                        digest.update(view[:read])
+                        done += read
+                        if self.throttle:
+                            self.throttle(read)
+                        if self.progressCallback:
+                            self.progressCallback(done, size)
+                    fdst.flush()
+                    os.fsync(fdst.fileno())
+            if done != size or os.path.getsize(tmp) != size:
+                raise MoveError('Copy of %s is incomplete, %s of %s bytes' % (src, done, size))
+            checksum = digest.hexdigest()
+            if self.verify and self._hashFile(tmp) != checksum:
+                raise MoveError('Copy of %s does not match the source %s checksum' % (src, self.checksum))
+            _replace(tmp, dst)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        _fsyncDir(os.path.dirname(dst))
+        return MoveResult(METHOD_COPY, size, time.time() - start, checksum = checksum, sourceKept = self._removeSource(src) if removeSource else True)
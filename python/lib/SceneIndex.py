@@ -0,0 +1,202 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Preflight index of the scene nodes the app looks up: cameras (and which of them is tagged as the shot cam),
+audio, image planes and the time dependent nodes the frame cache cares about. One bulk cmds.ls gathers the lot
+plus one more for the camera tag attrs, instead of a listRelatives and objExists per camera on every lookup,
+which adds up on sets with hundreds of referenced layout cameras.
+
+The index is built on first use and kept until a scene change event marks it dirty: a node of an indexed type
+added or removed, any rename, or a scene open / new / import / reference change. Events come from an event
+source, MayaEventSource inside maya, or ManualEventSource where there are no callbacks (mayapy, benchmarks)
+and the caller fires the events itself.
+"""
+import threading
+from .FrameCache import TIME_DEPENDENT_TYPES
+from .sceneSetup import SHOT_CAMERA_ATTR
+import logging
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES         = ['camera', 'audio', 'imagePlane'] + TIME_DEPENDENT_TYPES
+## Events after which the set of known node types may have changed
+PLUGIN_EVENTS       = ('pluginLoaded', 'pluginUnloaded')
+
+
+def knownIndexTypes():
+    """
+    INDEX_TYPES less the plugin types (eg AlembicNode, gpuCache) whose plugin isn't loaded, cmds.ls raises on an unknown type.
+    """
+    import maya.cmds as cmds
+    known = set(cmds.allNodeTypes() or [])
+    return [each for each in INDEX_TYPES if each in known]
+
+
+class ManualEventSource(object):
+    """
+    Event source without any maya callbacks. Call fire() to tell the subscribers the scene changed.
+    """
+    def __init__(self):
+        self._callbacks = []
+
+    def subscribe(self, callback, nodeTypes):
+        self._callbacks.append(callback)
+        return callback
+
+    def unsubscribe(self, handle):
+        if handle in self._callbacks:
+            self._callbacks.remove(handle)
+
+    def fire(self, event = 'changed'):
+        for each in list(self._callbacks):
+            each(event)
+
+
+class MayaEventSource(object):
+    """
+    Scene change events from OpenMaya message callbacks.
+    """
+    SCENE_MESSAGES = ['kAfterOpen', 'kAfterNew', 'kAfterImport', 'kAfterCreateReference', 'kAfterLoadReference',
+                      'kAfterUnloadReference', 'kAfterRemoveReference', 'kAfterImportReference']
+
+    def subscribe(self, callback, nodeTypes):
+        import maya.OpenMaya as om
+        ids = []
+        for each in self.SCENE_MESSAGES:
+            ids.append(om.MSceneMessage.addCallback(getattr(om.MSceneMessage, each), lambda data, event = each: callback(event)))
+        for nodeType in nodeTypes:
+            try:
+                ids.append(om.MDGMessage.addNodeAddedCallback(lambda node, data: callback('nodeAdded'), nodeType))
+                ids.append(om.MDGMessage.addNodeRemovedCallback(lambda node, data: callback('nodeRemoved'), nodeType))
+            except RuntimeError:
+                ## Plugin node types (eg AlembicNode) only exist once their plugin is loaded
+                pass
+        ids.append(om.MNodeMessage.addNameChangedCallback(om.MObject(), lambda node, previous, data: callback('renamed')))
+        ## Plugin messages only take string array callbacks
+        ids.append(om.MSceneMessage.addStringArrayCallback(om.MSceneMessage.kAfterPluginLoad, lambda strs, data: callback('pluginLoaded')))
+        ids.append(om.MSceneMessage.addStringArrayCallback(om.MSceneMessage.kAfterPluginUnload, lambda strs, data: callback('pluginUnloaded')))
+        return ids
+
+    def unsubscribe(self, handle):
+        import maya.OpenMaya as om
+        for each in handle:
+            try:
+                om.MMessage.removeCallback(each)
+            except RuntimeError:
+                pass
+
+
+class SceneIndex(object):
+    """
+    index = getSceneIndex()
+    index.shotCameras()     -> camera shapes whose transform has the shot cam tag
+    index.nodes('audio')    -> audio nodes
+    """
+    def __init__(self, eventSource = None):
+        self._eventSource   = eventSource
+        self._handle        = None
+        self._lock          = threading.Lock()
+        self._dirty         = True
+        ## Set when a plugin (un)loads, the node added / removed callbacks are made again for the types that now exist
+        self._resubscribe   = False
+        ## type -> [long names]
+        self._nodes         = {}
+        self._tagged        = set()
+        self.builds         = 0
+
+    def _subscribe(self):
+        if self._handle is not None and self._resubscribe:
+            self._eventSource.unsubscribe(self._handle)
+            self._handle = None
+        self._resubscribe = False
+        if self._handle is not None:
+            return
+        if self._eventSource is None:
+            self._eventSource = MayaEventSource()
+        self._handle = self._eventSource.subscribe(self.invalidate, INDEX_TYPES)
+
+    def invalidate(self, event = None):
+        if event in PLUGIN_EVENTS:
+            self._resubscribe = True
+        self._dirty = True
+
+    def close(self):
+        if self._handle is not None:
+            self._eventSource.unsubscribe(self._handle)
+            self._handle = None
+        self._dirty = True
+
+    def _build(self):
+        import maya.cmds as cmds
+        ## long + showType gives [longName, type, longName, type, ...], the parent is the long name minus the last part
+        found = cmds.ls(type = knownIndexTypes(), long = True, showType = True) or []
+        nodes = {}
+        for x in range(0, len(found) - 1, 2):
+            nodes.setdefault(found[x + 1], []).append(found[x])
+        cameraTransforms = [each.rsplit('|', 1)[0] for each in nodes.get('camera', [])]
+        tagged = set()
+        if cameraTransforms:
+            ## ls of attribute paths returns just the ones that exist
+            tagged = set([each.rsplit('.', 1)[0] for each in cmds.ls(['%s.%s' % (each, SHOT_CAMERA_ATTR) for each in cameraTransforms], long = True) or []])
+        self._nodes     = nodes
+        self._tagged    = tagged
+        self.builds     += 1
+
+    def _ensure(self):
+        with self._lock:
+            ## Subscribe before building so nothing that happens during the build is missed
+            self._subscribe()
+            if self._dirty:
+                ## Cleared before the build so an event during it isn't lost, and set again if the build fails
+                ## so the next lookup retries instead of serving the old index.
+                self._dirty = False
+                try:
+                    self._build()
+                except Exception:
+                    self._dirty = True
+                    raise
+
+    def nodes(self, *nodeTypes):
+        self._ensure()
+        found = []
+        for each in nodeTypes:
+            found.extend(self._nodes.get(each, []))
+        return found
+
+    @staticmethod
+    def transform(node):
+        """
+        The long name of the node's parent transform.
+        """
+        return node.rsplit('|', 1)[0]
+
+    @staticmethod
+    def shortName(node):
+        return node.rsplit('|', 1)[-1]
+
+    def shotCameras(self):
+        self._ensure()
+        return [each for each in self._nodes.get('camera', []) if self.transform(each) in self._tagged]
+
+
+_INDEX = None
+
+def getSceneIndex():
+    """
+    Returns the process wide index, shared by the dialog, the turntable and gate setup and the render.
+    """
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = SceneIndex()
+    return _INDEX
+
+
+def setSceneIndex(index):
+    """
+    Swaps the process wide index, eg for one on a ManualEventSource.
+    """
+    global _INDEX
+    if _INDEX is not None and _INDEX is not index:
+        _INDEX.close()
+    _INDEX = index
@@ -0,0 +1,133 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Render to local scratch, publish in the background. The playblast writes to a fast local disk (ssd, tmpfs)
+instead of the filer, then the finished movie is copied out to the work / publish area by a small pool of
+transfer threads that share one bandwidth limit, so a room full of artists blasting before dailies doesn't
+flatten the filer. The upload reads the local copy, the movie never comes back over the network.
+
+    queue = getTransferQueue()
+    transfer = queue.submit('/scratch/shot_v001.mov', '/publish/shot_v001.mov', keepSource = True)
+    ...
+    transfer.wait()     -> PublishMover's MoveResult, or raises the MoveError
+"""
+import os, threading, Queue
+from .PublishMover import PublishMover
+from .TokenBucket import TokenBucket
+import logging
+logger = logging.getLogger(__name__)
+
+SCRATCH_DIR         = os.path.join(os.path.expanduser('~'), '.tk-jbd-playblast', 'scratch')
+## Transfers running at once, and the bandwidth they share in bytes a second (0 is unlimited).
+MAX_CONCURRENT      = 2
+BANDWIDTH           = 0
+
+
+def scratchPath(scratchRoot, path):
+    """
+    Where path renders to under scratchRoot. The parent folder name is kept so two entities' movies with the same file name don't collide.
+    """
+    parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return os.path.join(scratchRoot, parent, os.path.basename(path))
+
+
+class Transfer(object):
+    """
+    One queued copy. wait() blocks until it is done and returns the MoveResult, or raises what the copy raised.
+    """
+    def __init__(self, src, dst, keepSource = False):
+        self.src        = src
+        self.dst        = dst
+        self.keepSource = keepSource
+        self.result     = None
+        self.error      = None
+        self._done      = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout = None):
+        self._done.wait(timeout)
+        if not self._done.is_set():
+            raise RuntimeError('Transfer of %s to %s is still running' % (self.src, self.dst))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _finish(self, result = None, error = None):
+        self.result = result
+        self.error  = error
+        self._done.set()
+
+
+class TransferQueue(object):
+    """
+    Runs queued Transfers on up to concurrency daemon threads, all drawing on the same TokenBucket.
+    The threads are started on the first submit.
+    """
+    def __init__(self, concurrency = MAX_CONCURRENT, bytesPerSec = BANDWIDTH):
+        self.concurrency    = concurrency
+        self.bucket         = TokenBucket(bytesPerSec)
+        self._queue         = Queue.Queue()
+        self._lock          = threading.Lock()
+        self._workers       = []
+
+    def setLimits(self, concurrency = None, bytesPerSec = None):
+        """
+        Changes the limits. More workers are started straight away, fewer only takes effect on a new queue.
+        """
+        if bytesPerSec is not None:
+            self.bucket.setRate(bytesPerSec)
+        if concurrency is not None:
+            with self._lock:
+                self.concurrency = concurrency
+                if self._workers:
+                    self._startWorkers()
+
+    def submit(self, src, dst, keepSource = False):
+        transfer = Transfer(src, dst, keepSource)
+        self._queue.put(transfer)
+        with self._lock:
+            self._startWorkers()
+        logger.info('TransferQueue: queued %s to %s' % (src, dst))
+        return transfer
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _startWorkers(self):
+        while len(self._workers) < self.concurrency:
+            worker = threading.Thread(target = self._work, name = 'ScratchTransfer-%s' % len(self._workers))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            transfer = self._queue.get()
+            try:
+                mover = PublishMover(throttle = self.bucket.consume)
+                if transfer.keepSource:
+                    result = mover.copy(transfer.src, transfer.dst)
+                else:
+                    result = mover.move(transfer.src, transfer.dst)
+                logger.info('TransferQueue: %s' % result)
+                transfer._finish(result = result)
+            except Exception, e:
+                logger.warning('TransferQueue: could not transfer %s to %s: %s' % (transfer.src, transfer.dst, e))
+                transfer._finish(error = e)
+
+
+_QUEUE = None
+
+def getTransferQueue():
+    """
+    Returns the process wide TransferQueue, so every dialog and submission shares the same limits.
+    """
+    global _QUEUE
+    if _QUEUE is None:
+        _QUEUE = TransferQueue()
+    return _QUEUE
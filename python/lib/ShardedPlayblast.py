@@ -0,0 +1,166 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Splits a playblast frame range into chunks, renders each chunk as an image sequence in its own
+headless mayapy process and stitches the frames into the final movie with the encoder.
+The workers look through camera with the dialog's modelEditor state and render globals so the shards match an interactive playblast.
+"""
+import os, sys, json, shutil, subprocess, threading, Queue, time
+from . import encoder
+import logging
+logger = logging.getLogger(__name__)
+
+SHARD_WORKERS       = 4
+SHARD_CHUNK_SIZE    = 50
+MAYAPY_PATH         = 'mayapy'
+IMAGE_FORMAT        = 'png'
+WORKER_SCRIPT       = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'playblastWorker.py')
+
+
+class ShardError(Exception):
+    pass
+
+
+def defaultMayapy():
+    """
+    Returns the mayapy that lives next to the running maya, falls back to mayapy on the PATH.
+    """
+    name = 'mayapy.exe' if sys.platform == 'win32' else 'mayapy'
+    path = os.path.join(os.path.dirname(sys.executable), name)
+    if os.path.exists(path):
+        return path
+    return MAYAPY_PATH
+
+
+def splitFrameRange(firstFrame, lastFrame, chunkSize):
+    """
+    Splits the inclusive frame range into (start, end) chunks of at most chunkSize frames.
+    """
+    firstFrame  = int(firstFrame)
+    lastFrame   = int(lastFrame)
+    chunkSize   = max(int(chunkSize), 1)
+    chunks = []
+    start = firstFrame
+    while start <= lastFrame:
+        end = min(start + chunkSize - 1, lastFrame)
+        chunks.append((start, end))
+        start = end + 1
+    return chunks
+
+
+class ShardedPlayblast(object):
+    """
+    Renders the frame range of a saved scene across several worker processes and encodes the result.
+    rendererCommand is the command the chunk args are appended to, by default mayapy running playblastWorker.py.
+    Swap it for anything that takes the same args and writes frames, eg a fake renderer for testing.
+    """
+    def __init__(self, scenePath, firstFrame, lastFrame, output, camera = '', editorState = None, renderGlobals = None,
+                 width = 1280, height = 720, percent = 100, quality = 75, workers = SHARD_WORKERS, chunkSize = SHARD_CHUNK_SIZE, rendererCommand = None, imageFormat = IMAGE_FORMAT,
+                 framePadding = 4, fps = 24, sound = None, encoderPath = encoder.ENCODER_PATH, encoderArgs = encoder.ENCODER_ARGS):
+        self.scenePath          = scenePath
+        self.firstFrame         = int(firstFrame)
+        self.lastFrame          = int(lastFrame)
+        self.output             = output
+        self.camera             = camera
+        self.editorState        = editorState or {}
+        self.renderGlobals      = renderGlobals or []
+        self.width              = width
+        self.height             = height
+        self.percent            = percent
+        self.quality            = quality
+        self.workers            = max(int(workers), 1)
+        self.chunkSize          = chunkSize
+        self.rendererCommand    = rendererCommand or [defaultMayapy(), WORKER_SCRIPT]
+        self.imageFormat        = imageFormat
+        self.framePadding       = framePadding
+        self.fps                = fps
+        self.sound              = sound
+        self.encoderPath        = encoderPath
+        self.encoderArgs        = encoderArgs
+        self.frameDir           = '%s_shards' % os.path.splitext(output)[0]
+        self.framePrefix        = os.path.join(self.frameDir, os.path.splitext(os.path.basename(output))[0])
+
+    def chunkCommand(self, start, end):
+        return list(self.rendererCommand) + [
+                                            '--scene',          self.scenePath,
+                                            '--start',          str(start),
+                                            '--end',            str(end),
+                                            '--output',         self.framePrefix,
+                                            '--camera',         self.camera,
+                                            '--width',          str(self.width),
+                                            '--height',         str(self.height),
+                                            '--percent',        str(self.percent),
+                                            '--quality',        str(self.quality),
+                                            '--image-format',   self.imageFormat,
+                                            '--editor-state',   json.dumps(self.editorState),
+                                            '--render-globals', json.dumps(self.renderGlobals),
+                                            ]
+
+    def renderChunks(self, progressCallback = None):
+        """
+        Runs the chunks over at most self.workers processes at a time.
+        progressCallback(chunksDone, chunkCount) is called from the worker threads as chunks finish.
+        """
+        chunks  = splitFrameRange(self.firstFrame, self.lastFrame, self.chunkSize)
+        pending = Queue.Queue()
+        for each in chunks:
+            pending.put(each)
+        lock    = threading.Lock()
+        done    = []
+        failed  = []
+
+        def worker():
+            while not failed:
+                try:
+                    start, end = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                command = self.chunkCommand(start, end)
+                logger.info('ShardedPlayblast: rendering %s-%s' % (start, end))
+                process = subprocess.Popen(command, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+                out = process.communicate()[0]
+                with lock:
+                    if process.returncode != 0:
+                        failed.append('frames %s-%s exited with %s:\n%s' % (start, end, process.returncode, out[-2000:]))
+                        continue
+                    done.append((start, end))
+                    doneCount = len(done)
+                if progressCallback:
+                    progressCallback(doneCount, len(chunks))
+
+        threads = [threading.Thread(target = worker) for x in range(min(self.workers, len(chunks)))]
+        for each in threads:
+            each.setDaemon(True)
+            each.start()
+        for each in threads:
+            each.join()
+
+        if failed:
+            raise ShardError('Sharded playblast failed, %s' % failed[0])
+
+        missing = [frame for frame in range(self.firstFrame, self.lastFrame + 1) if not os.path.exists(self.framePath(frame))]
+        if missing:
+            raise ShardError('Sharded playblast is missing %s frame(s), first missing frame is %s' % (len(missing), missing[0]))
+
+    def framePath(self, frame):
+        return encoder.sequencePattern(self.framePrefix, self.imageFormat, self.framePadding) % frame
+
+    def run(self, progressCallback = None):
+        """
+        Renders all the chunks, encodes the movie to self.output and removes the frames. Returns the output path.
+        """
+        startTime = time.time()
+        if os.path.isdir(self.frameDir):
+            shutil.rmtree(self.frameDir)
+        os.makedirs(self.frameDir)
+        try:
+            self.renderChunks(progressCallback)
+            renderTime = time.time() - startTime
+            encoder.encodeSequence(encoder.sequencePattern(self.framePrefix, self.imageFormat, self.framePadding),
+                                   self.firstFrame, self.output, self.fps, self.sound, self.encoderPath, self.encoderArgs)
+        finally:
+            shutil.rmtree(self.frameDir, ignore_errors = True)
+        logger.info('ShardedPlayblast: %s frames rendered in %.1fs, encoded in %.1fs' % (self.lastFrame - self.firstFrame + 1, renderTime, time.time() - startTime - renderTime))
+        return self.output
@@ -0,0 +1,143 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Session wide read through cache for the shotgun reads every playblast repeats: the entity's frame range,
+the current HumanUser and the Version status values. It lives for the whole maya session, so opening the
+dialog again and playblasting the same shot again costs no round trips until the entries expire.
+While shotgun can't be reached an expired entry is served rather than nothing.
+"""
+import time, threading
+from . import CONST
+from .ShotgunGuard import ShotgunUnavailable, guardedCall
+import logging
+logger = logging.getLogger(__name__)
+
+## Seconds before a cached read is fetched again. Schema values are kept for SCHEMA_TTL as they hardly ever change.
+CACHE_TTL   = 300
+SCHEMA_TTL  = 3600
+## Cached fallbacks (eg the CONST status list when the schema read failed) are retried sooner.
+FALLBACK_TTL = 30
+
+
+class ShotgunReadCache(object):
+    """
+    Thread safe key -> (value, expires) cache. Loaders run outside the lock so a slow read never blocks other keys.
+    """
+    def __init__(self, ttl = CACHE_TTL, schemaTtl = SCHEMA_TTL):
+        self.ttl        = ttl
+        self.schemaTtl  = schemaTtl
+        self._lock      = threading.Lock()
+        self._entries   = {}
+        self._stats     = {'hits': 0, 'misses': 0, 'invalidated': 0, 'stale': 0}
+
+    def get(self, key, loader, ttl = None):
+        """
+        Returns the cached value for key, calling loader() to fill it if it's missing or expired.
+        If shotgun is unavailable an expired value is returned, there being nothing to return raises the ShotgunUnavailable.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+        try:
+            value = loader()
+        except ShotgunUnavailable, e:
+            if entry is None:
+                raise
+            logger.warning('ShotgunReadCache: %s, using the expired %s' % (e, key[0]))
+            with self._lock:
+                self._stats['stale'] += 1
+            return entry[0]
+        self.put(key, value, ttl)
+        return value
+
+    def put(self, key, value, ttl = None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + (self.ttl if ttl is None else ttl))
+
+    def invalidate(self, *keyPrefix):
+        """
+        Drops every key starting with keyPrefix, eg invalidate('frameRange') or invalidate('frameRange', 'Shot', 1234).
+        No prefix drops everything.
+        """
+        with self._lock:
+            for key in self._entries.keys():
+                if key[:len(keyPrefix)] == keyPrefix:
+                    del self._entries[key]
+                    self._stats['invalidated'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+    def frameRange(self, sg, entity, inField, outField):
+        """
+        Returns the entity's data with inField and outField, the same dict a find_one would.
+        """
+        def load():
+            return sg.find_one(entity['type'], filters = [['id', 'is', entity['id']]], fields = [inField, outField])
+        return self.get(('frameRange', entity['type'], entity['id'], inField, outField), load)
+
+    def currentUser(self, tk):
+        """
+        Returns the HumanUser for the current login, tank.util.get_current_user does a find on every call.
+        """
+        import tank.util
+        return self.get(('currentUser', id(tk)), lambda: guardedCall(tank.util.get_current_user, (tk,), name = 'get_current_user'))
+
+    def statusValues(self, sg, entityType = 'Version', fieldName = 'sg_status_list'):
+        """
+        Returns the valid status values for the field from the schema, falls back to CONST.STATUS_LIST if the schema can't be read.
+        """
+        key = ('statusValues', entityType, fieldName)
+        def load():
+            schema = sg.schema_field_read(entityType, fieldName)
+            return schema[fieldName]['properties']['valid_values']['value']
+        try:
+            return self.get(key, load, ttl = self.schemaTtl)
+        except Exception, e:
+            logger.warning('ShotgunReadCache: could not read the %s.%s schema, using CONST.STATUS_LIST: %s' % (entityType, fieldName, e))
+            self.put(key, list(CONST.STATUS_LIST), ttl = FALLBACK_TTL)
+            return list(CONST.STATUS_LIST)
+
+    def dueDate(self, sg, entity, fieldName = 'due_date'):
+        """
+        Returns the entity's due date (eg a Task's), None if it has none.
+        """
+        def load():
+            found = sg.find_one(entity['type'], filters = [['id', 'is', entity['id']]], fields = [fieldName])
+            return found and found.get(fieldName)
+        return self.get(('dueDate', entity['type'], entity['id'], fieldName), load)
+
+    def hasField(self, sg, entityType, fieldName):
+        """
+        True if the field exists in the schema, so optional fields (eg the movie hash) are only written on sites that have them.
+        """
+        key = ('hasField', entityType, fieldName)
+        def load():
+            return fieldName in sg.schema_field_read(entityType, fieldName)
+        try:
+            return self.get(key, load, ttl = self.schemaTtl)
+        except Exception, e:
+            logger.info('ShotgunReadCache: no %s.%s field on this site: %s' % (entityType, fieldName, e))
+            self.put(key, False, ttl = FALLBACK_TTL)
+            return False
+
+
+_CACHE = None
+
+def getShotgunCache():
+    """
+    Returns the process wide cache, shared by every dialog opened this maya session.
+    """
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ShotgunReadCache()
+    return _CACHE
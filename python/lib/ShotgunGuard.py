@@ -0,0 +1,342 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Timeouts, retries and a circuit breaker for every shotgun call the app makes. A slow or unreachable site used to
+freeze the dialog for as long as the socket felt like waiting, now:
+
+    sg = guardShotgun(self.app.shotgun)
+    sg.find_one('Shot', ...)        -> raises ShotgunTimeout after the read deadline, ShotgunOffline straight away
+                                       while the breaker is open
+
+Every call has a deadline (the whole call, retries included). Reads are idempotent so they are retried with
+jittered exponential backoff, writes and uploads get one go. Network failures count against a process wide
+breaker, after a run of them shotgun is treated as offline and calls fail fast until a trial call gets through
+again. The app uses that as its cue to playblast to disk only, see isShotgunOffline.
+Connections from the ShotgunPool come guarded already.
+"""
+import sys, time, random, socket, httplib, urllib2, threading
+import logging
+logger = logging.getLogger(__name__)
+
+## Seconds a call may take, retries included. None is no deadline, uploads are bounded by their own part timeouts.
+READ_TIMEOUT        = 20
+WRITE_TIMEOUT       = 60
+CONNECT_TIMEOUT     = 30
+UPLOAD_TIMEOUT      = None
+## Extra attempts for reads and connects, with delays drawn from 0 - RETRY_BACKOFF * 2 ** attempt capped at RETRY_BACKOFF_MAX.
+READ_RETRIES        = 3
+RETRY_BACKOFF       = 0.5
+RETRY_BACKOFF_MAX   = 8
+## Network failures in a row that open the breaker, and seconds before a trial call is let through.
+BREAKER_FAILURES    = 5
+BREAKER_RESET       = 60
+
+KIND_READ           = 'read'
+KIND_WRITE          = 'write'
+KIND_CONNECT        = 'connect'
+KIND_UPLOAD         = 'upload'
+
+READ_METHODS        = set(['info', 'find', 'find_one', 'summarize', 'text_search', 'schema_read', 'schema_entity_read', 'schema_field_read',
+                           'work_schedule_read', 'activity_stream_read', 'note_thread_read', 'following', 'followers'])
+## The private ones are the helpers ChunkedUploader's ShotgunStorageTarget calls, other private methods are left alone.
+UPLOAD_METHODS      = set(['upload', 'upload_thumbnail', 'upload_filmstrip_thumbnail', 'download_attachment', '_get_attachment_upload_info',
+                           '_get_upload_part_link', '_complete_multipart_upload', '_send_form'])
+
+## shotgun_api3's and httplib2's network errors, by name so neither has to be importable here
+TRANSPORT_ERRORS        = (socket.error, httplib.HTTPException, urllib2.URLError)
+TRANSPORT_ERROR_NAMES   = set(['ProtocolError', 'ServerNotFoundError', 'RedirectLimit', 'FailedToDecompressContent', 'SSLHandshakeError'])
+
+STATE_CLOSED        = 'closed'
+STATE_OPEN          = 'open'
+STATE_HALF_OPEN     = 'halfOpen'
+
+
+class ShotgunUnavailable(Exception):
+    pass
+
+
+class ShotgunTimeout(ShotgunUnavailable):
+    pass
+
+
+class ShotgunOffline(ShotgunUnavailable):
+    pass
+
+
+def isTransportError(error):
+    """
+    True if the error means shotgun couldn't be reached or didn't answer, rather than it answering with an error (a Fault).
+    """
+    if isinstance(error, ShotgunOffline):
+        return False
+    if isinstance(error, ShotgunTimeout) or isinstance(error, TRANSPORT_ERRORS):
+        return True
+    return any(each.__name__ in TRANSPORT_ERROR_NAMES for each in type(error).__mro__)
+
+
+def methodKind(name):
+    if name in READ_METHODS:
+        return KIND_READ
+    if name in UPLOAD_METHODS:
+        return KIND_UPLOAD
+    return KIND_WRITE
+
+
+class ShotgunCallPolicy(object):
+    def __init__(self, readTimeout = READ_TIMEOUT, writeTimeout = WRITE_TIMEOUT, connectTimeout = CONNECT_TIMEOUT, uploadTimeout = UPLOAD_TIMEOUT,
+                 readRetries = READ_RETRIES, backoff = RETRY_BACKOFF, backoffMax = RETRY_BACKOFF_MAX):
+        self.timeouts       = {KIND_READ: readTimeout, KIND_WRITE: writeTimeout, KIND_CONNECT: connectTimeout, KIND_UPLOAD: uploadTimeout}
+        self.readRetries    = max(int(readRetries), 0)
+        self.backoff        = backoff
+        self.backoffMax     = backoffMax
+
+    def timeout(self, kind):
+        return self.timeouts[kind]
+
+    def retries(self, kind):
+        ## Writes aren't idempotent, a create that timed out may well have gone through
+        return self.readRetries if kind in (KIND_READ, KIND_CONNECT) else 0
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.backoffMax, self.backoff * (2 ** (attempt - 1))))
+
+    def socketTimeout(self):
+        ## So a call left behind by its deadline does give up on the socket eventually
+        return max([each for each in self.timeouts.values() if each] or [None])
+
+
+class CircuitBreaker(object):
+    """
+    Closed until failures network failures in a row, then open: calls raise ShotgunOffline without touching the network
+    for resetAfter seconds. Then half open, one trial call goes through, closing it again if it gets an answer.
+    """
+    def __init__(self, failures = BREAKER_FAILURES, resetAfter = BREAKER_RESET):
+        self.failures   = max(int(failures), 1)
+        self.resetAfter = resetAfter
+        self._lock      = threading.Lock()
+        self._count     = 0
+        self._openedAt  = None
+        self._trial     = False
+        self._stats     = {'opened': 0, 'rejected': 0}
+
+    def configure(self, failures = None, resetAfter = None):
+        with self._lock:
+            if failures is not None:
+                self.failures = max(int(failures), 1)
+            if resetAfter is not None:
+                self.resetAfter = resetAfter
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._openedAt is None:
+                return STATE_CLOSED
+            if time.time() - self._openedAt < self.resetAfter:
+                return STATE_OPEN
+            return STATE_HALF_OPEN
+
+    def isOpen(self):
+        ## Half open counts, nothing has got through yet
+        return self.state != STATE_CLOSED
+
+    def before(self):
+        """
+        Raises ShotgunOffline if the call shouldn't be made. Every call let through must end in success() or failure().
+        """
+        with self._lock:
+            if self._openedAt is None:
+                return
+            wait = self.resetAfter - (time.time() - self._openedAt)
+            if wait > 0 or self._trial:
+                self._stats['rejected'] += 1
+                raise ShotgunOffline('Shotgun is offline after %s failed calls, trying it again in %ss' % (self.failures, max(int(wait), 0)))
+            self._trial = True
+
+    def success(self):
+        with self._lock:
+            if self._openedAt is not None:
+                logger.warning('ShotgunGuard: shotgun is answering again, back online.')
+            self._count     = 0
+            self._openedAt  = None
+            self._trial     = False
+
+    def failure(self, error):
+        with self._lock:
+            self._count += 1
+            if self._trial or (self._openedAt is None and self._count >= self.failures):
+                if self._openedAt is None:
+                    self._stats['opened'] += 1
+                    logger.warning('ShotgunGuard: %s failed calls in a row, treating shotgun as offline for %ss: %s' % (self._count, self.resetAfter, error))
+                self._openedAt = time.time()
+            self._trial = False
+
+    def reset(self):
+        self.success()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['failures'] = self._count
+        stats['state'] = self.state
+        return stats
+
+
+## id() of the connections that still have a call running that its caller gave up on
+_ABANDONED      = set()
+_ABANDONED_LOCK = threading.Lock()
+
+
+def _runWithDeadline(func, args, kwargs, timeout, name, connection = None, onLate = None):
+    """
+    Runs func on a daemon thread and waits at most timeout for it. A call that overruns is left to finish on its own,
+    onLate(result) is handed whatever it returns in the end so it can be cleaned up.
+    """
+    if timeout is None:
+        return func(*args, **kwargs)
+    outcome = {}
+    lock    = threading.Lock()
+    ## Released by whichever of the call and the timer finishes first. A timed wait polls on python 2 and
+    ## would add up to 50ms to every call, a plain acquire wakes straight away.
+    gate    = threading.Lock()
+    gate.acquire()
+    def finish(key):
+        with lock:
+            if 'finished' in outcome:
+                return outcome['finished']
+            outcome['finished'] = key
+            ## Marked before the caller wakes, so the pool sees it when the connection is handed back
+            if key == 'timeout' and connection is not None:
+                with _ABANDONED_LOCK:
+                    _ABANDONED.add(id(connection))
+        gate.release()
+        return key
+    def run():
+        try:
+            outcome['value'] = func(*args, **kwargs)
+        except Exception:
+            outcome['error'] = sys.exc_info()
+        if finish('done') == 'timeout':
+            if connection is not None:
+                with _ABANDONED_LOCK:
+                    _ABANDONED.discard(id(connection))
+            if onLate and 'value' in outcome:
+                onLate(outcome['value'])
+    timer = threading.Timer(max(timeout, 0), finish, ('timeout',))
+    timer.daemon = True
+    timer.start()
+    thread = threading.Thread(target = run, name = 'ShotgunCall-%s' % name)
+    thread.daemon = True
+    thread.start()
+    gate.acquire()
+    timer.cancel()
+    if outcome['finished'] == 'timeout':
+        raise ShotgunTimeout('Shotgun %s took longer than %.1fs' % (name, timeout))
+    if 'error' in outcome:
+        raise outcome['error'][0], outcome['error'][1], outcome['error'][2]
+    return outcome['value']
+
+
+def guardedCall(func, args = (), kwargs = None, kind = KIND_READ, name = 'call', policy = None, breaker = None, connection = None, onLate = None):
+    """
+    Calls func(*args, **kwargs) under the policy's deadline for kind, retrying reads and connects, and tells the breaker how it went.
+    connection is the shotgun instance func uses, so nothing else is sent down it while a timed out call is still using it.
+    """
+    policy  = policy or getShotgunPolicy()
+    breaker = breaker or getShotgunBreaker()
+    if connection is not None and id(connection) in _ABANDONED:
+        raise ShotgunTimeout('Shotgun connection is still busy with a call that timed out')
+    timeout     = policy.timeout(kind)
+    deadline    = time.time() + timeout if timeout is not None else None
+    attempt     = 0
+    ## The breaker sees the logical call, not its attempts: let through once and told once how it ended
+    breaker.before()
+    while True:
+        attempt += 1
+        try:
+            remaining = deadline - time.time() if deadline is not None else None
+            result = _runWithDeadline(func, args, kwargs or {}, remaining, name, connection, onLate)
+        except Exception, e:
+            if not isTransportError(e):
+                ## Shotgun answered, just not with what we wanted
+                breaker.success()
+                raise
+            delay = policy.delay(attempt)
+            if attempt > policy.retries(kind) or isinstance(e, ShotgunTimeout) or (deadline is not None and time.time() + delay >= deadline):
+                breaker.failure(e)
+                if isinstance(e, ShotgunUnavailable):
+                    raise
+                raise ShotgunUnavailable('Shotgun %s failed: %s' % (name, e)), None, sys.exc_info()[2]
+            logger.info('ShotgunGuard: %s failed, retrying in %.2fs: %s' % (name, delay, e))
+            time.sleep(delay)
+            continue
+        breaker.success()
+        return result
+
+
+class GuardedShotgun(object):
+    """
+    Stands in for a shotgun_api3.Shotgun, every public method call goes through guardedCall. Attributes pass straight through.
+    """
+    def __init__(self, sg, policy = None, breaker = None):
+        self._sg        = sg
+        self._policy    = policy
+        self._breaker   = breaker
+        config = getattr(sg, 'config', None)
+        if config is not None and getattr(config, 'timeout_secs', 0) is None:
+            config.timeout_secs = (policy or getShotgunPolicy()).socketTimeout()
+
+    @property
+    def connection(self):
+        return self._sg
+
+    @property
+    def abandoned(self):
+        """
+        True while a call on the connection that timed out is still running, the connection shouldn't be reused.
+        """
+        return id(self._sg) in _ABANDONED
+
+    def __getattr__(self, name):
+        attr = getattr(self._sg, name)
+        if not callable(attr) or (name.startswith('_') and name not in UPLOAD_METHODS):
+            return attr
+        def call(*args, **kwargs):
+            return guardedCall(attr, args, kwargs, methodKind(name), name, self._policy, self._breaker, self._sg)
+        return call
+
+
+def guardShotgun(sg):
+    """
+    Wraps a shotgun connection (eg the app's self.app.shotgun) in the process wide policy and breaker.
+    """
+    if isinstance(sg, GuardedShotgun):
+        return sg
+    return GuardedShotgun(sg)
+
+
+_POLICY     = ShotgunCallPolicy()
+_BREAKER    = CircuitBreaker()
+
+def setShotgunPolicy(policy):
+    global _POLICY
+    _POLICY = policy or ShotgunCallPolicy()
+
+
+def getShotgunPolicy():
+    return _POLICY
+
+
+def getShotgunBreaker():
+    """
+    Returns the process wide breaker, every connection to the site shares it.
+    """
+    return _BREAKER
+
+
+def isShotgunOffline():
+    """
+    True while the breaker is open, the app playblasts to disk only until shotgun answers again.
+    """
+    return _BREAKER.isOpen()
@@ -0,0 +1,219 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Process wide pool of shotgun_api3 connections so the UI and the upload threads stop paying
+for a fresh TLS handshake and auth round trip every time they need to talk to shotgun.
+Connections are handed out wrapped in a ShotgunGuard.GuardedShotgun, so every call on them has a deadline and
+goes through the breaker.
+"""
+import time, threading
+from contextlib import contextmanager
+import logging
+logger = logging.getLogger(__name__)
+try:
+    from shotgun_api3 import Shotgun
+except ImportError:
+    Shotgun = None
+    logger.warning('You are missing the api3 dependency! Please install it now or make sure it is on the sys.path or python path!')
+###################################
+### tk-jbd-baseconfig imports    ##
+try:
+    import configCONST as configCONST
+except ImportError:
+    configCONST = None
+    logger.warning('No configCONST avail... using python/lib CONST instead, please make sure your application CONST is set correctly for the config name.')
+from . import CONST
+from .ShotgunGuard import guardedCall, GuardedShotgun, KIND_CONNECT
+
+## Connections idle for longer than this are closed and dropped from the pool.
+IDLE_TIMEOUT        = 300
+## Connections idle for longer than this get a cheap info() call before being handed out again.
+HEALTH_CHECK_AFTER  = 60
+## Max number of idle connections kept around per credential key.
+MAX_IDLE_PER_KEY    = 4
+
+
+def getShotgunCredentials():
+    """
+    Returns the (base_url, script_name, api_key) to use for direct api3 connections.
+    Tries the default config CONST first and falls back to the lib CONST.
+    """
+    try:
+        return (configCONST.SHOTGUN_URL, configCONST.SHOTGUN_TOOLKIT_NAME, configCONST.SHOTGUN_TOOLKIT_API_KEY)
+    except AttributeError:
+        return (CONST.SHOTGUN_URL, CONST.SHOTGUN_TOOLKIT_NAME, CONST.SHOTGUN_TOOLKIT_API_KEY)
+
+
+class ShotgunPool(object):
+    """
+    Thread safe pool of shotgun connections keyed by (base_url, script_name, api_key).
+    A connection is only ever checked out to one caller at a time as shotgun_api3 instances are not thread safe.
+    """
+    def __init__(self, idleTimeout = IDLE_TIMEOUT, healthCheckAfter = HEALTH_CHECK_AFTER, maxIdlePerKey = MAX_IDLE_PER_KEY, factory = None):
+        self.idleTimeout        = idleTimeout
+        self.healthCheckAfter   = healthCheckAfter
+        self.maxIdlePerKey      = maxIdlePerKey
+        self._factory           = factory or self._createConnection
+        self._lock              = threading.Lock()
+        ## key -> list of [connection, lastUsedTime], most recently used last
+        self._idle              = {}
+        ## id(connection) -> key for everything currently checked out
+        self._checkedOut        = {}
+        self._stats             = {'created': 0, 'reused': 0, 'evicted': 0, 'failedHealthChecks': 0, 'discarded': 0}
+
+    def _createConnection(self, base_url, script_name, api_key):
+        if Shotgun is None:
+            raise ImportError('shotgun_api3 is not available, cannot create a shotgun connection!')
+        return Shotgun(base_url = base_url, script_name = script_name, api_key = api_key, ensure_ascii = True, connect = True)
+
+    def _close(self, connection):
+        ## close() only exists on newer versions of the api
+        close = getattr(connection, 'close', None)
+        if close:
+            try:
+                close()
+            except Exception, e:
+                logger.debug('ShotgunPool: failed to close connection cleanly: %s' % e)
+
+    def _evictIdle(self, now):
+        """
+        Drops idle connections that have been sitting around longer than the idleTimeout.
+        Must be called with the lock held. Returns the connections to close outside the lock.
+        """
+        expired = []
+        for key, idle in self._idle.items():
+            keep = []
+            for entry in idle:
+                if now - entry[1] > self.idleTimeout:
+                    expired.append(entry[0])
+                else:
+                    keep.append(entry)
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        self._stats['evicted'] += len(expired)
+        return expired
+
+    def _isHealthy(self, connection):
+        try:
+            connection.info()
+            return True
+        except Exception, e:
+            logger.info('ShotgunPool: pooled connection failed its health check, dropping it: %s' % e)
+            return False
+
+    def checkout(self, base_url, script_name, api_key):
+        """
+        Returns a connection for the credentials, reusing an idle one if there is a healthy one available.
+        The connection MUST be handed back with checkin() when done.
+        """
+        key = (base_url, script_name, api_key)
+        while True:
+            now = time.time()
+            with self._lock:
+                expired = self._evictIdle(now)
+                idle = self._idle.get(key)
+                entry = idle.pop() if idle else None
+            for each in expired:
+                self._close(each)
+
+            if entry is None:
+                break
+            connection, lastUsed = entry
+            if now - lastUsed > self.healthCheckAfter and not self._isHealthy(connection):
+                with self._lock:
+                    self._stats['failedHealthChecks'] += 1
+                self._close(connection)
+                continue
+            with self._lock:
+                self._stats['reused'] += 1
+                self._checkedOut[id(connection)] = key
+            return connection
+
+        ## Nothing usable in the pool, make a new one outside of the lock as this hits the network.
+        connection = self._factory(base_url, script_name, api_key)
+        with self._lock:
+            self._stats['created'] += 1
+            self._checkedOut[id(connection)] = key
+        return connection
+
+    def checkin(self, connection, discard = False):
+        """
+        Hands a connection back to the pool. Use discard = True if the connection errored and should not be reused.
+        """
+        with self._lock:
+            key = self._checkedOut.pop(id(connection), None)
+            if key is None:
+                logger.warning('ShotgunPool: checkin of a connection this pool does not own, ignoring it.')
+                return
+            idle = self._idle.setdefault(key, [])
+            if discard or len(idle) >= self.maxIdlePerKey:
+                self._stats['discarded'] += 1
+                if not idle:
+                    del self._idle[key]
+                toClose = connection
+            else:
+                idle.append([connection, time.time()])
+                toClose = None
+        if toClose is not None:
+            self._close(toClose)
+
+    @contextmanager
+    def connection(self, base_url = None, script_name = None, api_key = None):
+        """
+        with pool.connection() as sg: ...
+        Uses getShotgunCredentials() when no credentials are passed in. Raises ShotgunOffline straight away while
+        the breaker is open, and ShotgunTimeout if connecting takes longer than the connect deadline.
+        """
+        if base_url is None:
+            base_url, script_name, api_key = getShotgunCredentials()
+        ## A connect that comes back after we gave up on it is never used, hand it back to be closed
+        connection = guardedCall(self.checkout, (base_url, script_name, api_key), kind = KIND_CONNECT, name = 'connect',
+                                 onLate = lambda late: self.checkin(late, discard = True))
+        guarded = GuardedShotgun(connection)
+        failed = False
+        try:
+            yield guarded
+        except Exception:
+            failed = True
+            raise
+        finally:
+            ## One of its calls timed out and is still running on it
+            self.checkin(connection, discard = failed or guarded.abandoned)
+
+    def stats(self):
+        """
+        Returns a copy of the pool counters, plus how many connections are idle and checked out right now.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = sum([len(idle) for idle in self._idle.values()])
+            stats['checkedOut'] = len(self._checkedOut)
+        return stats
+
+    def clear(self):
+        """
+        Closes every idle connection. Checked out connections are closed when they are handed back.
+        """
+        with self._lock:
+            toClose = [entry[0] for idle in self._idle.values() for entry in idle]
+            self._idle = {}
+        for each in toClose:
+            self._close(each)
+
+
+_POOL       = None
+_POOL_LOCK  = threading.Lock()
+
+def getShotgunPool():
+    """
+    Returns the process wide ShotgunPool shared by the app UI and the uploader threads.
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ShotgunPool()
+        return _POOL
@@ -0,0 +1,143 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Small dependency graph runner for the post render work. Each stage names the stages it needs, and every stage
+whose requirements are done runs straight away on its own thread, up to a worker limit. So the publish copy
+and the version create / upload, which only read the same movie, run side by side instead of one after the other.
+
+    graph = StageGraph([
+                        Stage('move',       move),
+                        Stage('version',    createVersion),
+                        Stage('upload',     upload,     requires = ['version']),
+                        Stage('cleanup',    cleanup,    requires = ['move', 'upload'], always = True),
+                       ])
+    results = graph.run(job)    -> {'move': StageResult, ...}
+
+Pass run() the dict to fill in (eg job.stageResults) when a stage needs to see how the ones before it went.
+
+A stage that fails skips everything that needs it, the stages that don't carry on.
+"""
+import threading
+import logging
+logger = logging.getLogger(__name__)
+
+## Stages running at once for one job
+STAGE_WORKERS   = 4
+
+STATE_DONE      = 'done'
+STATE_FAILED    = 'failed'
+STATE_SKIPPED   = 'skipped'
+
+
+class StageGraphError(Exception):
+    pass
+
+
+class Stage(object):
+    """
+    func(job) does the work. A stage with always set runs once its requirements have finished, failed or not
+    (eg cleanup). The failure of an optional stage is only logged, the stages that need it still run.
+    """
+    def __init__(self, name, func, requires = (), always = False, optional = False):
+        self.name       = name
+        self.func       = func
+        self.requires   = list(requires)
+        self.always     = always
+        self.optional   = optional
+
+    def __repr__(self):
+        return 'Stage(%s, requires = %s)' % (self.name, self.requires)
+
+
+class StageResult(object):
+    def __init__(self, state, error = None):
+        self.state  = state
+        self.error  = error
+
+    @property
+    def ok(self):
+        return self.state == STATE_DONE
+
+    def __repr__(self):
+        return 'StageResult(%s%s)' % (self.state, ', %s' % self.error if self.error else '')
+
+
+class StageGraph(object):
+    def __init__(self, stages, workers = STAGE_WORKERS):
+        ## Requirements have to be declared first, which also rules out cycles
+        seen = set()
+        for stage in stages:
+            if stage.name in seen:
+                raise StageGraphError('Stage %s is declared twice' % stage.name)
+            for each in stage.requires:
+                if each not in seen:
+                    raise StageGraphError('Stage %s requires %s, which has to be declared before it' % (stage.name, each))
+            seen.add(stage.name)
+        self.stages     = list(stages)
+        self.workers    = max(1, workers)
+
+    def _blocked(self, stage, results):
+        ## True if a requirement didn't make it, a failed optional stage doesn't count
+        stages = dict([(each.name, each) for each in self.stages])
+        for each in stage.requires:
+            result = results[each]
+            if result.state == STATE_SKIPPED or (result.state == STATE_FAILED and not stages[each].optional):
+                return True
+        return False
+
+    def run(self, job, started = None, wrap = None, results = None):
+        """
+        Runs every stage and returns {name: StageResult} once they have all finished.
+        started(name) is called as each stage starts, wrap(name) may return a context manager the stage runs in (eg a trace span).
+        results, if given, is the dict filled in as each stage finishes, so a stage sees the results of its requirements.
+        """
+        if results is None:
+            results = {}
+        results.clear()
+        launched    = set()
+        running     = [0]
+        condition   = threading.Condition()
+
+        def work(stage):
+            try:
+                if wrap:
+                    with wrap(stage.name):
+                        stage.func(job)
+                else:
+                    stage.func(job)
+                result = StageResult(STATE_DONE)
+            except Exception, e:
+                if stage.optional:
+                    logger.warning('StageGraph: optional stage %s failed: %s' % (stage.name, e))
+                result = StageResult(STATE_FAILED, e)
+            with condition:
+                results[stage.name] = result
+                running[0] -= 1
+                condition.notify()
+
+        with condition:
+            while len(results) < len(self.stages):
+                changed = True
+                while changed:
+                    changed = False
+                    for stage in self.stages:
+                        if stage.name in launched or running[0] >= self.workers:
+                            continue
+                        if [each for each in stage.requires if each not in results]:
+                            continue
+                        launched.add(stage.name)
+                        changed = True
+                        if not stage.always and self._blocked(stage, results):
+                            results[stage.name] = StageResult(STATE_SKIPPED)
+                            continue
+                        running[0] += 1
+                        if started:
+                            started(stage.name)
+                        thread = threading.Thread(target = work, args = (stage,), name = 'Stage-%s' % stage.name)
+                        thread.daemon = True
+                        thread.start()
+                if len(results) < len(self.stages):
+                    condition.wait()
+        return results
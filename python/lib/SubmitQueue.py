@@ -0,0 +1,387 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Background submission pipeline. Everything after the playblast (publish move, version create,
+upload, thumbnail and cleanup) runs off the main thread so the artist gets maya back as soon as the render is done.
+Several submissions can queue up, progress is reported through Qt signals.
+
+Each job's stages run as a StageGraph, the publish copy runs alongside the version create and upload as they
+only read the same movie:
+
+    move ------------------------------.
+    version --+-- upload --------------+-- cleanup
+              '-- thumbnail (optional) -'
+"""
+import os, time, threading, Queue
+from tank.platform.qt import QtCore
+from .ShotgunPool import getShotgunPool
+from .ProgressThrottle import ProgressThrottle
+from .UploadSpool import UploadSpool, SPOOL_DIR, LIVE_HOLD_SECS, shotgunUpload
+from .runTrace import NULL_TRACE
+from .PublishMover import PublishMover
+from .ScratchTransfer import getTransferQueue
+from .StageGraph import StageGraph, Stage
+from .encoder import extractThumbnail, ENCODER_PATH
+from .versionSubmit import createUniqueVersion, versionCodes, fillReservation, releaseReservation, VersionCollisionError
+from .ShotgunCache import getShotgunCache
+from .MovieDedupe import DedupeIndex, DEDUPE_INDEX, hashMovie, findUploadedMovie, linkUploadedMovie
+from .UploadScheduler import getUploadScheduler, uploadPriority
+import logging
+logger = logging.getLogger(__name__)
+
+STAGE_MOVE      = 'move'
+STAGE_VERSION   = 'version'
+STAGE_UPLOAD    = 'upload'
+STAGE_THUMBNAIL = 'thumbnail'
+STAGE_CLEANUP   = 'cleanup'
+STAGES          = [STAGE_MOVE, STAGE_VERSION, STAGE_UPLOAD, STAGE_THUMBNAIL, STAGE_CLEANUP]
+
+
+def runInMainThread(func, *args, **kwargs):
+    """
+    Runs func on maya's main thread and returns the result. Only use this for the cmds calls that really need it.
+    Falls back to a direct call when maya.utils isn't around (batch / standalone).
+    """
+    try:
+        import maya.utils
+    except ImportError:
+        return func(*args, **kwargs)
+    if isinstance(threading.current_thread(), threading._MainThread):
+        return func(*args, **kwargs)
+    return maya.utils.executeInMainThreadWithResult(func, *args, **kwargs)
+
+
+class SubmitJob(object):
+    """
+    Everything the pipeline needs for one submission. Captured on the main thread when the job is queued
+    so the stages never have to touch the UI or the scene.
+    """
+    def __init__(self, name, workPath, publishPath, versionData, storeOnDisk, partSize, workers, deleteTurntable = False, spoolDir = SPOOL_DIR, trace = NULL_TRACE, reservedVersion = None, hashField = None, dedupeIndex = DEDUPE_INDEX, scratchPath = None, thumbnail = False, encoderPath = ENCODER_PATH, maxMemory = None, useMmap = False):
+        self.name               = name
+        self.workPath           = workPath
+        self.publishPath        = publishPath
+        self.versionData        = versionData
+        self.storeOnDisk        = storeOnDisk
+        self.partSize           = partSize
+        self.workers            = workers
+        ## Upper bound on the upload's read buffers and whether to read through mmap, see ChunkedUploader
+        self.maxMemory          = maxMemory
+        self.useMmap            = useMmap
+        self.deleteTurntable    = deleteTurntable
+        self.spoolDir           = spoolDir
+        ## The RunTrace the stage spans go in, finished once the job is done.
+        self.trace              = trace
+        ## Placeholder Version reserved before the render, filled in by the version stage
+        self.reservedVersion    = reservedVersion
+        self.version            = None
+        ## VersionCreated or VersionCollision once the version stage has run
+        self.versionResult      = None
+        ## PublishMover's MoveResult once the move stage has run
+        self.moveResult         = None
+        ## Version field the movie's content hash goes in, None turns the upload dedupe off. See MovieDedupe.
+        self.hashField          = hashField
+        self.dedupeIndex        = dedupeIndex
+        self.checksum           = None
+        ## Id of the earlier Version whose upload was reused instead of sending the movie again
+        self.reusedFrom         = None
+        ## Local copy the movie was rendered to, see ScratchTransfer.
+        self.scratchPath        = scratchPath
+        ## The copy the version, upload and thumbnail stages read while the move stage copies it to the publish path.
+        ## Removed in cleanup once nothing needs it any more, see SubmitQueue._chooseSource.
+        self.sourcePath         = scratchPath or workPath
+        ## Grab a frame with the encoder and set it as the Version thumbnail
+        self.thumbnail          = thumbnail
+        self.encoderPath        = encoderPath
+        self.stageResults       = {}
+        ## Where the upload started off in the upload scheduler's queue, 0 if it never waited
+        self.uploadQueuePosition = 0
+        self.errors             = []
+
+
+class SubmitQueue(QtCore.QThread):
+    """
+    Single worker thread working through the queued SubmitJobs one after the other.
+    The thread only runs while there is work queued and is started again by the next submit().
+    """
+    jobQueued       = QtCore.Signal(str, int)
+    stageStarted    = QtCore.Signal(str, str)
+    ## object rather than int so movies over 2GB don't overflow the signal args.
+    progress        = QtCore.Signal(str, object, object)
+    ## Place in the upload scheduler's queue, 0 once the upload is under way. See UploadScheduler.
+    uploadQueued    = QtCore.Signal(str, int)
+    jobFinished     = QtCore.Signal(str, object)
+
+    def __init__(self):
+        QtCore.QThread.__init__(self)
+        self._jobs      = Queue.Queue()
+        self._lock      = threading.Lock()
+        self._running   = False
+
+    def submit(self, job):
+        """
+        Queues the job and makes sure the worker is running. Safe to call from the main thread at any time.
+        """
+        with self._lock:
+            self._jobs.put(job)
+            pending = self._jobs.qsize()
+            if not self._running:
+                self._running = True
+                ## A previous run may be in the middle of returning, let it finish before restarting.
+                self.wait()
+                self.start()
+        self.jobQueued.emit(job.name, pending)
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    def run(self):
+        while True:
+            with self._lock:
+                try:
+                    job = self._jobs.get_nowait()
+                except Queue.Empty:
+                    self._running = False
+                    return
+            self._process(job)
+
+    def _stageGraph(self):
+        return StageGraph([
+                            Stage(STAGE_MOVE,       self._move),
+                            Stage(STAGE_VERSION,    self._createVersion),
+                            Stage(STAGE_UPLOAD,     self._upload,       requires = [STAGE_VERSION]),
+                            Stage(STAGE_THUMBNAIL,  self._thumbnail,    requires = [STAGE_VERSION], optional = True),
+                            Stage(STAGE_CLEANUP,    self._cleanup,      requires = [STAGE_MOVE, STAGE_UPLOAD, STAGE_THUMBNAIL], always = True),
+                          ])
+
+    def _process(self, job):
+        try:
+            self._chooseSource(job)
+        except Exception, e:
+            job.errors.append('%s failed: %s' % (STAGE_MOVE, e))
+        if not job.errors:
+            ## Filled in as the stages finish, cleanup goes by it
+            self._stageGraph().run(job, started = lambda stage: self.stageStarted.emit(job.name, stage), wrap = job.trace.span, results = job.stageResults)
+            for stage in STAGES:
+                result = job.stageResults.get(stage)
+                if result is None or result.error is None:
+                    continue
+                if stage == STAGE_THUMBNAIL:
+                    job.trace.set(thumbnailError = '%s' % result.error)
+                    continue
+                logger.warning('SubmitQueue: %s failed during %s: %s' % (job.name, stage, result.error))
+                job.errors.append('%s failed: %s' % (stage, result.error))
+        if job.errors and job.reservedVersion and job.version is None:
+            ## Failed before the placeholder was filled in, give the name back.
+            self._releaseReservation(job)
+        if job.errors:
+            job.trace.finish(status = 'error', error = job.errors[-1])
+        else:
+            job.trace.finish()
+        self.jobFinished.emit(job.name, job.errors)
+
+    def _chooseSource(self, job):
+        """
+        Picks the copy of the movie the stages read. A rename, hardlink or reflink to the publish path only touches
+        metadata so it is done up front and everything reads the published file, only a real copy (another filesystem,
+        or a movie rendered to scratch) is left for the move stage to run alongside the upload.
+        A movie that isn't kept on disk never goes to the publish path at all.
+        """
+        if job.scratchPath or job.workPath == job.publishPath or not job.storeOnDisk:
+            return
+        job.moveResult = PublishMover().move(job.workPath, job.publishPath, allowCopy = False)
+        if job.moveResult:
+            logger.info('MOVED: %s' % job.moveResult)
+            job.sourcePath = job.publishPath
+            job.trace.set(publishMove = job.moveResult.method, publishMoveBytesPerSec = job.moveResult.bytesPerSec)
+
+    def _move(self, job):
+        """
+        Copies the source to the publish path through the shared transfer queue, so it is held to the transfer
+        concurrency and bandwidth limits. See PublishMover for how.
+        """
+        if not job.storeOnDisk or job.sourcePath == job.publishPath:
+            return
+        logger.info('COPYING: %s to %s' % (job.sourcePath, job.publishPath))
+        job.moveResult = getTransferQueue().submit(job.sourcePath, job.publishPath, keepSource = True).wait()
+        logger.info('COPIED: %s' % job.moveResult)
+        job.trace.set(publishMove = job.moveResult.method, publishMoveBytesPerSec = job.moveResult.bytesPerSec, publishChecksum = job.moveResult.checksum)
+
+    def _createVersion(self, job):
+        """
+        Fills in the version reserved before the render, or creates it backing it out again if somebody else has the name.
+        See versionSubmit.
+        """
+        if job.hashField:
+            self._hashMovie(job)
+        with getShotgunPool().connection() as sg:
+            if job.checksum and getShotgunCache().hasField(sg, 'Version', job.hashField):
+                job.versionData[job.hashField] = job.checksum
+            elif job.checksum:
+                logger.info('SubmitQueue: Version has no %s field, not deduping the upload of %s' % (job.hashField, job.name))
+                job.checksum = None
+            if job.reservedVersion:
+                job.version = fillReservation(sg, job.reservedVersion, job.versionData)
+                logger.info('Version Submitted to shotgun successfully')
+                return
+            job.versionResult = createUniqueVersion(sg, job.versionData, versionCodes(job.publishPath))
+        if job.versionResult.collision:
+            raise VersionCollisionError(job.versionResult)
+        job.version = job.versionResult.version
+        logger.info('Version Submitted to shotgun successfully')
+
+    def _hashMovie(self, job):
+        ## Always read the source, the move stage's copy runs alongside the version stage so its checksum isn't there yet.
+        start = time.time()
+        job.checksum = hashMovie(job.sourcePath)
+        job.trace.set(movieHashSeconds = round(time.time() - start, 6))
+
+    def _releaseReservation(self, job):
+        try:
+            with getShotgunPool().connection() as sg:
+                releaseReservation(sg, job.reservedVersion)
+        except Exception, e:
+            logger.warning('SubmitQueue: could not release the reserved version for %s: %s' % (job.name, e))
+
+    def _upload(self, job):
+        """
+        Journals the upload in the spool before starting it, so if it fails or maya goes down
+        the spool drainer picks it up again later. A movie shotgun already has for this entity isn't sent again.
+        """
+        if job.checksum and self._reuseUpload(job):
+            return
+        spool = UploadSpool(job.spoolDir)
+        ## A source the move stage is still copying from is left for cleanup to remove
+        ## Held back from the drainers, this submission uploads it itself
+        spool.add(job.version["id"], job.sourcePath, deleteAfterUpload = not job.storeOnDisk, partSize = job.partSize, workers = job.workers, priority = self._uploadPriority(job),
+                  maxMemory = job.maxMemory, useMmap = job.useMmap, holdFor = LIVE_HOLD_SECS)
+        progress = ProgressThrottle(lambda sent, total: self.progress.emit(job.name, sent, total))
+        def upload(entry, progressCallback):
+            shotgunUpload(entry, progressCallback, positionCallback = lambda position: self._uploadQueued(job, position))
+        size = os.path.getsize(job.sourcePath)
+        start = time.time()
+        try:
+            if not spool.process(job.version["id"], upload, progressCallback = progress):
+                ## Already spooled from an earlier go and a drainer has it, its outcome is this upload's outcome
+                logger.info('SubmitQueue: upload of %s is already being handled by the spool drainer, waiting for it' % job.name)
+                entry = spool.waitForRelease(job.version["id"])
+                if entry is not None:
+                    raise ValueError('The spool drainer could not upload it: %s' % (entry.get('lastError') or 'it was left pending'))
+                return
+        except Exception, e:
+            raise ValueError('%s. It stays in the upload spool and will be retried.' % e)
+        job.trace.set(fileSize = size, uploadBytesPerSec = int(size / max(time.time() - start, 0.001)))
+        if job.checksum:
+            self._recordUpload(job)
+
+    def _uploadPriority(self, job):
+        ## Status first, then the task's due date. Only worth a read when uploads are being scheduled.
+        if getUploadScheduler() is None:
+            return None
+        dueDate = None
+        task = job.versionData.get('sg_task')
+        if task:
+            try:
+                with getShotgunPool().connection() as sg:
+                    dueDate = getShotgunCache().dueDate(sg, task)
+            except Exception, e:
+                logger.warning('SubmitQueue: could not read the due date of %s: %s' % (task, e))
+        return uploadPriority(job.versionData.get('sg_status_list'), dueDate and '%s' % dueDate)
+
+    def _uploadQueued(self, job, position):
+        ## The first position is how far back in the queue it started, the wait itself is in the upload span
+        if position and not job.uploadQueuePosition:
+            job.uploadQueuePosition = position
+            job.trace.set(uploadQueuePosition = position)
+        self.uploadQueued.emit(job.name, position)
+
+    def _reuseUpload(self, job):
+        """
+        Links the Version to an earlier upload with the same content hash. Returns True if the upload can be skipped.
+        """
+        entity = job.versionData.get('entity')
+        if not entity:
+            return False
+        with getShotgunPool().connection() as sg:
+            match = findUploadedMovie(sg, job.checksum, entity, job.hashField, DedupeIndex(job.dedupeIndex), exclude = job.version['id'])
+            if match is None or not linkUploadedMovie(sg, job.version['id'], match):
+                return False
+        job.reusedFrom = match['versionId']
+        logger.info('SubmitQueue: %s is the same movie as Version %s, reused its upload' % (job.name, match['versionId']))
+        job.trace.set(fileSize = os.path.getsize(job.sourcePath), uploadReusedFrom = match['versionId'])
+        return True
+
+    def _recordUpload(self, job):
+        ## Only a hint for the next submission, never worth failing this one over.
+        entity = job.versionData.get('entity')
+        if not entity:
+            return
+        try:
+            with getShotgunPool().connection() as sg:
+                version = sg.find_one('Version', filters = [['id', 'is', job.version['id']]], fields = ['sg_uploaded_movie'])
+            movie = version and version.get('sg_uploaded_movie')
+            if isinstance(movie, dict) and movie.get('id'):
+                DedupeIndex(job.dedupeIndex).put(job.checksum, entity, job.version['id'], {'type': 'Attachment', 'id': movie['id'], 'name': movie.get('name')}, job.publishPath)
+        except Exception, e:
+            logger.warning('SubmitQueue: could not record the upload of %s in the dedupe index: %s' % (job.name, e))
+
+    def _thumbnail(self, job):
+        """
+        Sets a frame of the movie as the Version thumbnail, rather than waiting for shotgun's transcode.
+        """
+        if not job.thumbnail:
+            return
+        thumbPath = extractThumbnail(job.sourcePath, '%s_thumb.jpg' % os.path.splitext(job.sourcePath)[0], encoderPath = job.encoderPath)
+        try:
+            with getShotgunPool().connection() as sg:
+                sg.upload_thumbnail('Version', job.version['id'], thumbPath)
+        finally:
+            os.remove(thumbPath)
+
+    def _cleanup(self, job):
+        """
+        Runs whatever happened to the other stages. Removes the source once nothing needs it any more,
+        the turntable only goes once the submission made it.
+        """
+        self._releaseSource(job)
+
+        ## Remove turntable if option is selected, this touches the scene so it has to happen on the main thread.
+        failed = [name for name in (STAGE_MOVE, STAGE_VERSION, STAGE_UPLOAD) if name not in job.stageResults or not job.stageResults[name].ok]
+        if job.deleteTurntable and not failed:
+            import maya.cmds as cmds
+            runInMainThread(cmds.delete, 'turnTable_hrc')
+
+    def _releaseSource(self, job):
+        """
+        A spooled upload that didn't make it is pointed at the published copy, or left where it is if there isn't one.
+        """
+        source = job.sourcePath
+        if (source == job.publishPath and job.storeOnDisk) or not os.path.exists(source):
+            return
+        published = job.storeOnDisk and job.moveResult is not None
+        spool = UploadSpool(job.spoolDir)
+        entry = spool.read(job.version['id']) if job.version else None
+        if entry is not None and entry['moviePath'] == source:
+            if not (published and spool.retarget(job.version['id'], job.publishPath)):
+                spool.retarget(job.version['id'], source, deleteAfterUpload = published or not job.storeOnDisk)
+                logger.info('SubmitQueue: the upload of %s will be retried from %s' % (job.name, source))
+                return
+        elif not published and (job.storeOnDisk or job.version is None):
+            ## The only copy there is, leave it for someone to publish by hand
+            logger.warning('SubmitQueue: %s never made it to %s, the movie is still at %s' % (job.name, job.publishPath, source))
+            return
+        os.unlink(source)
+
+
+_QUEUE = None
+
+def getSubmitQueue():
+    """
+    Returns the process wide SubmitQueue so submissions keep going after the dialog is closed.
+    Must be called from the main thread the first time so the queue object lives there.
+    """
+    global _QUEUE
+    if _QUEUE is None:
+        _QUEUE = SubmitQueue()
+    return _QUEUE
@@ -0,0 +1,42 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Rate limiter shared by the scratch transfers and the upload scheduler daemon. Only the standard library,
+the daemon runs it as a plain script.
+"""
+import time, threading
+
+
+class TokenBucket(object):
+    """
+    Thread safe rate limiter. consume(n) blocks until n bytes worth of tokens are available.
+    rate is in bytes a second, burst is how far ahead of the rate a caller may get. A rate of 0 never blocks.
+    """
+    def __init__(self, rate = 0, burst = None):
+        self._lock = threading.Lock()
+        self.setRate(rate, burst)
+
+    def setRate(self, rate, burst = None):
+        with self._lock:
+            self.rate   = rate
+            ## A second's worth by default, anything less than a copy block would stall every block.
+            self.burst  = burst or rate
+            self._tokens = self.burst
+            self._last  = time.time()
+
+    def consume(self, amount):
+        while True:
+            with self._lock:
+                if not self.rate:
+                    return
+                now = time.time()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                ## Blocks bigger than the burst go through once the bucket is full and leave it in debt
+                if self._tokens >= min(amount, self.burst):
+                    self._tokens -= amount
+                    return
+                wait = (min(amount, self.burst) - self._tokens) / float(self.rate)
+            time.sleep(wait)
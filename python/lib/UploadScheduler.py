@@ -0,0 +1,197 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Client side of the upload scheduler daemon (uploadSchedulerDaemon.py). Uploads ask the daemon for a slot, wait
+their turn being told their place in the queue, then draw their bytes from the daemon's shared token bucket:
+
+    client = UploadSchedulerClient('localhost:8761')
+    with client.slot('shot010_v003', uploadPriority('rev', '2013-05-02'), size, positionCallback) as slot:
+        uploadMovie(versionId, path, partSize, workers, throttle = slot.consume)
+
+Nothing here is allowed to fail an upload. A daemon that can't be reached, or goes away mid upload, just means the
+upload runs unscheduled like it did before.
+"""
+import os, sys, json, time, socket, threading, subprocess
+from . import CONST
+import logging
+logger = logging.getLogger(__name__)
+
+DAEMON_SCRIPT   = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploadSchedulerDaemon.py')
+CONNECT_TIMEOUT = 5
+## Bytes asked for at a time, so the uploader's 64KB sends don't each cost a round trip to the daemon
+GRANT_BYTES     = 1024 * 1024
+## Sorts after any real due date
+NO_DUE_DATE     = '9999-12-31'
+
+
+class SchedulerUnavailable(Exception):
+    pass
+
+
+def uploadPriority(status = None, dueDate = None):
+    """
+    Sort key for the queue, lower goes first: the Version status in CONST.UPLOAD_STATUS_PRIORITY order
+    (statuses not in it go last), then the task due date.
+    """
+    order = list(CONST.UPLOAD_STATUS_PRIORITY)
+    rank = order.index(status) if status in order else len(order)
+    return [rank, dueDate or NO_DUE_DATE]
+
+
+def parseAddress(address):
+    host, _, port = address.rpartition(':')
+    return (host or 'localhost', int(port))
+
+
+class SchedulerSlot(object):
+    """
+    A granted slot, the connection stays open until close() so the daemon knows the upload is still going.
+    consume(bytes) is safe to call from several upload threads at once.
+    """
+    def __init__(self, sock, reader):
+        self._sock      = sock
+        self._reader    = reader
+        self._lock      = threading.Lock()
+        self._allowance = 0
+        self._lost      = False
+
+    def consume(self, amount):
+        with self._lock:
+            if self._lost:
+                return
+            if self._allowance < amount:
+                try:
+                    request = max(amount - self._allowance, GRANT_BYTES)
+                    self._sock.sendall(json.dumps({'op': 'consume', 'bytes': request}) + '\n')
+                    reply = self._reader.readline()
+                    if not reply:
+                        raise socket.error('connection closed')
+                    self._allowance += json.loads(reply)['bytes']
+                except (socket.error, ValueError, KeyError), e:
+                    logger.warning('UploadScheduler: lost the scheduler mid upload, carrying on unthrottled: %s' % e)
+                    self._lost = True
+                    return
+            self._allowance -= amount
+
+    def close(self):
+        try:
+            if not self._lost:
+                self._sock.sendall(json.dumps({'op': 'done'}) + '\n')
+        except socket.error:
+            pass
+        finally:
+            self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class UploadSchedulerClient(object):
+    def __init__(self, address, timeout = CONNECT_TIMEOUT):
+        self.address    = parseAddress(address)
+        self.timeout    = timeout
+
+    def _connect(self):
+        try:
+            sock = socket.create_connection(self.address, self.timeout)
+        except socket.error, e:
+            raise SchedulerUnavailable('No upload scheduler at %s:%s: %s' % (self.address[0], self.address[1], e))
+        return sock
+
+    def _send(self, sock, message):
+        sock.sendall(json.dumps(message) + '\n')
+
+    def slot(self, name, priority = None, size = 0, positionCallback = None):
+        """
+        Blocks until the daemon grants an upload slot and returns the SchedulerSlot.
+        positionCallback(position) is called each time the place in the queue changes while waiting.
+        """
+        sock = self._connect()
+        try:
+            self._send(sock, {'op': 'enqueue', 'name': name, 'host': socket.gethostname(), 'priority': priority, 'size': size})
+            ## Waiting in the queue can take as long as other peoples' uploads
+            sock.settimeout(None)
+            reader = sock.makefile('rb')
+            while True:
+                line = reader.readline()
+                if not line:
+                    raise SchedulerUnavailable('The upload scheduler closed the connection')
+                message = json.loads(line)
+                if message['event'] == 'queued':
+                    logger.info('UploadScheduler: %s is number %s in the upload queue' % (name, message['position']))
+                    if positionCallback:
+                        positionCallback(message['position'])
+                elif message['event'] == 'granted':
+                    if positionCallback:
+                        positionCallback(0)
+                    return SchedulerSlot(sock, reader)
+                else:
+                    raise SchedulerUnavailable('The upload scheduler said %s' % message)
+        except (socket.error, ValueError, KeyError), e:
+            sock.close()
+            raise SchedulerUnavailable('Lost the upload scheduler: %s' % e)
+        except:
+            sock.close()
+            raise
+
+    def status(self):
+        """
+        The daemon's running and waiting uploads.
+        """
+        sock = self._connect()
+        try:
+            self._send(sock, {'op': 'status'})
+            return json.loads(sock.makefile('rb').readline())
+        finally:
+            sock.close()
+
+
+def startUploadSchedulerDaemon(address, maxConcurrent, bandwidthMb, python = sys.executable):
+    """
+    Starts the daemon in the background if nothing is listening at address yet. Only for local addresses,
+    a site wide scheduler is run by whoever looks after the box it lives on.
+    """
+    host, port = parseAddress(address)
+    try:
+        socket.create_connection((host, port), CONNECT_TIMEOUT).close()
+        return False
+    except socket.error:
+        pass
+    command = [python, DAEMON_SCRIPT, '--host', host, '--port', str(port), '--max-concurrent', str(maxConcurrent), '--bandwidth-mb', str(bandwidthMb)]
+    logger.info('UploadScheduler: starting %s' % ' '.join(command))
+    kwargs = {}
+    if sys.platform == 'win32':
+        ## DETACHED_PROCESS, so closing maya doesn't take the daemon and everyone's queued uploads with it
+        kwargs['creationflags'] = 0x00000008
+    else:
+        kwargs['preexec_fn'] = os.setsid
+    with open(os.devnull, 'wb') as devnull:
+        subprocess.Popen(command, stdout = devnull, stderr = devnull, close_fds = sys.platform != 'win32', **kwargs)
+    ## Give it a moment to start listening before the first upload asks
+    for attempt in range(20):
+        try:
+            socket.create_connection((host, port), CONNECT_TIMEOUT).close()
+            return True
+        except socket.error:
+            time.sleep(0.1)
+    logger.warning('UploadScheduler: started the daemon but it is not listening on %s:%s' % (host, port))
+    return True
+
+
+_CLIENT = None
+
+def setUploadScheduler(address):
+    """
+    Sends every upload in this process through the scheduler at address, None turns scheduling off.
+    """
+    global _CLIENT
+    _CLIENT = UploadSchedulerClient(address) if address else None
+
+
+def getUploadScheduler():
+    return _CLIENT
@@ -0,0 +1,435 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Durable upload spool. Every pending movie upload is journalled as a small json entry in the spool
+directory before the upload starts, so an upload interrupted by maya crashing or closing is picked
+up again by a drainer, either inside maya or standalone:
+
+    python UploadSpool.py --spool ~/.tk-jbd-playblast/spool
+
+Entries are keyed by the Version id and claimed with an exclusive lock file, so several drainers
+(two mayas, maya plus the standalone) never upload the same file at the same time, and a Version
+that already has its movie in shotgun is never uploaded again.
+"""
+import os, sys, time, json, random, socket, threading, uuid
+import logging
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR           = os.path.join(os.path.expanduser('~'), '.tk-jbd-playblast', 'spool')
+## An entry is marked failed, and left in the spool for someone to look at, after this many attempts.
+MAX_ATTEMPTS        = 10
+## Retry delays double from BACKOFF_BASE up to BACKOFF_MAX seconds, with some jitter.
+BACKOFF_BASE        = 30
+BACKOFF_MAX         = 3600
+## A lock that hasn't had a heartbeat for this long belongs to a drainer that died.
+LOCK_STALE_SECS     = 300
+## How often the holder of a lock touches it, see LockHeartbeat
+HEARTBEAT_SECS      = 30
+## An entry spooled by a live submission is left to it for this long, the drainers only pick it up if maya died first.
+LIVE_HOLD_SECS      = LOCK_STALE_SECS
+## How often waitForRelease looks at the lock
+WAIT_INTERVAL       = 1
+## How many uploads a drainer runs at once, and how often it looks for work.
+DRAIN_CONCURRENCY   = 2
+DRAIN_INTERVAL      = 60
+
+STATE_PENDING       = 'pending'
+STATE_FAILED        = 'failed'
+
+
+class LockHeartbeat(object):
+    """
+    Touches an entry's lock every interval seconds on a background thread for as long as the with block holds it,
+    so a long scheduler wait or an upload that reports no progress never lets the lock go stale under us.
+
+        with LockHeartbeat(spool, versionId):
+            upload()
+    """
+    def __init__(self, spool, versionId, interval = None):
+        self.spool      = spool
+        self.versionId  = versionId
+        self.interval   = interval or HEARTBEAT_SECS
+        self._stop      = threading.Event()
+        self._thread    = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.spool.heartbeat(self.versionId)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target = self._run, name = 'UploadSpoolHeartbeat-%s' % self.versionId)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+class UploadSpool(object):
+    """
+    One json entry (<versionId>.json) and, while it is being worked on, one lock file (<versionId>.lock) per upload.
+    """
+    def __init__(self, spoolDir = SPOOL_DIR):
+        self.spoolDir = spoolDir
+        if not os.path.isdir(self.spoolDir):
+            try:
+                os.makedirs(self.spoolDir)
+            except OSError:
+                ## Someone else made it in the meantime
+                if not os.path.isdir(self.spoolDir):
+                    raise
+
+    def _entryPath(self, versionId):
+        return os.path.join(self.spoolDir, '%s.json' % versionId)
+
+    def _lockPath(self, versionId):
+        return os.path.join(self.spoolDir, '%s.lock' % versionId)
+
+    def _write(self, entry):
+        ## Write to a temp name first so a crash mid write never leaves a half written entry behind.
+        path    = self._entryPath(entry['versionId'])
+        tmpPath = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+        with open(tmpPath, 'w') as f:
+            json.dump(entry, f)
+            f.flush()
+            os.fsync(f.fileno())
+        if sys.platform == 'win32' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+
+    def read(self, versionId):
+        try:
+            with open(self._entryPath(versionId), 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def add(self, versionId, moviePath, deleteAfterUpload = False, partSize = None, workers = None, priority = None, maxMemory = None, useMmap = False, holdFor = 0):
+        """
+        Journals a pending upload. Adding a Version that is already spooled keeps the existing entry.
+        priority is the upload scheduler's sort key, see UploadScheduler.uploadPriority.
+        maxMemory and useMmap bound how the movie is read, see ChunkedUploader.
+        holdFor keeps the entry out of due() for that many seconds, so a drainer doesn't grab the upload from
+        the submission that is about to process it.
+        """
+        entry = self.read(versionId)
+        if entry is not None:
+            return entry
+        entry = {
+                'versionId':            versionId,
+                'moviePath':            moviePath,
+                'deleteAfterUpload':    deleteAfterUpload,
+                'partSize':             partSize,
+                'workers':              workers,
+                'priority':             priority,
+                'maxMemory':            maxMemory,
+                'useMmap':              useMmap,
+                'state':                STATE_PENDING,
+                'attempts':             0,
+                'nextAttempt':          time.time() + holdFor if holdFor else 0,
+                'lastError':            '',
+                'created':              time.time(),
+                }
+        self._write(entry)
+        return entry
+
+    def retarget(self, versionId, moviePath, deleteAfterUpload = False):
+        """
+        Points a pending entry at another copy of the movie, eg the published one once the local scratch copy goes.
+        Returns False if there's no entry or a drainer is uploading it right now.
+        """
+        if not self.claim(versionId):
+            return False
+        try:
+            entry = self.read(versionId)
+            if entry is None:
+                return False
+            entry['moviePath']          = moviePath
+            entry['deleteAfterUpload']  = deleteAfterUpload
+            self._write(entry)
+            return True
+        finally:
+            self.release(versionId)
+
+    def entries(self):
+        found = []
+        for each in sorted(os.listdir(self.spoolDir)):
+            if each.endswith('.json'):
+                entry = self.read(os.path.splitext(each)[0])
+                if entry is not None:
+                    found.append(entry)
+        return found
+
+    def due(self, now = None):
+        """
+        Pending entries whose backoff has run out, oldest first.
+        """
+        now = time.time() if now is None else now
+        due = [each for each in self.entries() if each['state'] == STATE_PENDING and each['nextAttempt'] <= now]
+        return sorted(due, key = lambda each: each['created'])
+
+    def claim(self, versionId):
+        """
+        Takes the exclusive lock on the entry. Returns False if another drainer has it.
+        """
+        lockPath = self._lockPath(versionId)
+        token = '%s:%s:%s' % (socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+        for attempt in range(2):
+            try:
+                fd = os.open(lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                if attempt or not self._breakStaleLock(lockPath):
+                    return False
+                continue
+            os.write(fd, token)
+            os.close(fd)
+            return True
+        return False
+
+    def _breakStaleLock(self, lockPath):
+        try:
+            if time.time() - os.path.getmtime(lockPath) < LOCK_STALE_SECS:
+                return False
+            with open(lockPath, 'r') as f:
+                staleToken = f.read()
+            ## Rename rather than remove so only one of several drainers can break the same lock.
+            brokenPath = '%s.%s.stale' % (lockPath, uuid.uuid4().hex)
+            os.rename(lockPath, brokenPath)
+        except (IOError, OSError):
+            return False
+        with open(brokenPath, 'r') as f:
+            brokenToken = f.read()
+        os.remove(brokenPath)
+        if brokenToken != staleToken:
+            ## Lost a race and grabbed a fresh lock, nothing we can safely do but back off.
+            return False
+        logger.info('UploadSpool: broke stale lock %s (%s)' % (lockPath, staleToken))
+        return True
+
+    def waitForRelease(self, versionId, interval = WAIT_INTERVAL):
+        """
+        Blocks while someone else has the entry claimed and returns the entry once they let it go, None if they uploaded it.
+        A lock that goes stale counts as let go.
+        """
+        lockPath = self._lockPath(versionId)
+        while True:
+            try:
+                if time.time() - os.path.getmtime(lockPath) >= LOCK_STALE_SECS:
+                    break
+            except OSError:
+                break
+            time.sleep(interval)
+        return self.read(versionId)
+
+    def heartbeat(self, versionId):
+        try:
+            os.utime(self._lockPath(versionId), None)
+        except OSError:
+            pass
+
+    def release(self, versionId):
+        try:
+            os.remove(self._lockPath(versionId))
+        except OSError:
+            pass
+
+    def markDone(self, versionId):
+        entry = self.read(versionId)
+        try:
+            os.remove(self._entryPath(versionId))
+        except OSError:
+            pass
+        if entry and entry.get('deleteAfterUpload') and os.path.exists(entry['moviePath']):
+            os.unlink(entry['moviePath'])
+
+    def markFailed(self, versionId, error):
+        entry = self.read(versionId)
+        if entry is None:
+            return
+        entry['attempts']   += 1
+        entry['lastError']  = '%s' % error
+        if entry['attempts'] >= MAX_ATTEMPTS:
+            entry['state'] = STATE_FAILED
+        else:
+            delay = min(BACKOFF_BASE * (2 ** (entry['attempts'] - 1)), BACKOFF_MAX)
+            entry['nextAttempt'] = time.time() + delay * random.uniform(0.8, 1.2)
+        self._write(entry)
+        return entry
+
+    def process(self, versionId, uploadFunc, alreadyUploaded = None, progressCallback = None):
+        """
+        Claims the entry and uploads it with uploadFunc(entry, progressCallback).
+        Returns False if another drainer has the entry. Failures are journalled for a retry and re raised.
+        The lock is kept fresh on a timer the whole time it is held, whatever uploadFunc is waiting on.
+        """
+        if not self.claim(versionId):
+            return False
+        try:
+            with LockHeartbeat(self, versionId):
+                entry = self.read(versionId)
+                if entry is None:
+                    ## Someone finished it between us listing and claiming it
+                    return True
+                if alreadyUploaded is not None and alreadyUploaded(versionId):
+                    logger.info('UploadSpool: Version %s already has its movie, skipping the upload.' % versionId)
+                    self.markDone(versionId)
+                    return True
+                try:
+                    uploadFunc(entry, progressCallback)
+                except Exception, e:
+                    self.markFailed(versionId, e)
+                    raise
+                self.markDone(versionId)
+                return True
+        finally:
+            self.release(versionId)
+
+
+def shotgunUpload(entry, progressCallback = None, positionCallback = None):
+    """
+    Default uploadFunc for the drainers. Waits for a slot from the upload scheduler first if there is one,
+    positionCallback(position) is told the place in its queue.
+    """
+    from .ChunkedUploader import uploadMovie, PART_SIZE, UPLOAD_WORKERS, MAX_MEMORY
+    from .UploadScheduler import getUploadScheduler, SchedulerUnavailable
+    def upload(throttle = None):
+        ## Entries spooled before these were added don't have them
+        uploadMovie(entry['versionId'], entry['moviePath'], entry['partSize'] or PART_SIZE, entry['workers'] or UPLOAD_WORKERS, progressCallback, throttle,
+                    maxMemory = entry.get('maxMemory') or MAX_MEMORY, useMmap = entry.get('useMmap', False))
+    scheduler = getUploadScheduler()
+    if scheduler is None:
+        return upload()
+    try:
+        slot = scheduler.slot('Version %s' % entry['versionId'], entry.get('priority'), os.path.getsize(entry['moviePath']), positionCallback)
+    except SchedulerUnavailable, e:
+        logger.warning('UploadSpool: uploading Version %s unscheduled: %s' % (entry['versionId'], e))
+        return upload()
+    with slot:
+        upload(slot.consume)
+
+
+def shotgunHasMovie(versionId):
+    """
+    Default alreadyUploaded for the drainers, True if the Version already has an uploaded movie.
+    """
+    from .ShotgunPool import getShotgunPool
+    with getShotgunPool().connection() as sg:
+        version = sg.find_one('Version', filters = [['id', 'is', versionId]], fields = ['sg_uploaded_movie'])
+    return bool(version and version.get('sg_uploaded_movie'))
+
+
+def shotgunOffline():
+    """
+    Default isOffline for the drainers, see ShotgunGuard.isShotgunOffline.
+    """
+    from .ShotgunGuard import isShotgunOffline
+    return isShotgunOffline()
+
+
+class SpoolDrainer(threading.Thread):
+    """
+    Background thread working through the due spool entries with bounded concurrency.
+    """
+    def __init__(self, spool, uploadFunc = shotgunUpload, alreadyUploaded = shotgunHasMovie, concurrency = DRAIN_CONCURRENCY, interval = DRAIN_INTERVAL, isOffline = shotgunOffline):
+        threading.Thread.__init__(self, name = 'UploadSpoolDrainer')
+        self.setDaemon(True)
+        self.spool              = spool
+        self.uploadFunc         = uploadFunc
+        self.alreadyUploaded    = alreadyUploaded
+        self.isOffline          = isOffline
+        self.concurrency        = max(int(concurrency), 1)
+        self.interval           = interval
+        self._stop              = threading.Event()
+
+    def drainOnce(self):
+        """
+        Works through everything that is due right now. Returns the number of entries uploaded.
+        Nothing is tried while shotgun is offline, so the entries don't use up their attempts on it.
+        """
+        if self.isOffline and self.isOffline():
+            logger.info('UploadSpool: shotgun is offline, leaving the spool until it is back.')
+            return 0
+        due     = self.spool.due()
+        lock    = threading.Lock()
+        done    = []
+
+        def worker():
+            while not self._stop.isSet():
+                with lock:
+                    if not due:
+                        return
+                    entry = due.pop(0)
+                try:
+                    if self.spool.process(entry['versionId'], self.uploadFunc, self.alreadyUploaded):
+                        with lock:
+                            done.append(entry['versionId'])
+                except Exception, e:
+                    logger.warning('UploadSpool: upload of Version %s failed, will retry: %s' % (entry['versionId'], e))
+
+        threads = [threading.Thread(target = worker) for x in range(min(self.concurrency, len(due)))]
+        for each in threads:
+            each.setDaemon(True)
+            each.start()
+        for each in threads:
+            each.join()
+        return len(done)
+
+    def run(self):
+        while not self._stop.isSet():
+            try:
+                self.drainOnce()
+            except Exception, e:
+                logger.warning('UploadSpool: drain failed: %s' % e)
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+_DRAINER = None
+
+def startSpoolDrainer(spoolDir = SPOOL_DIR, concurrency = DRAIN_CONCURRENCY, interval = DRAIN_INTERVAL):
+    """
+    Starts the process wide drainer thread if it isn't running yet and returns it.
+    """
+    global _DRAINER
+    if _DRAINER is None or not _DRAINER.isAlive():
+        _DRAINER = SpoolDrainer(UploadSpool(spoolDir), concurrency = concurrency, interval = interval)
+        _DRAINER.start()
+    return _DRAINER
+
+
+def main(argv = None):
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Drain the playblast upload spool.')
+    parser.add_argument('--spool', default = SPOOL_DIR)
+    parser.add_argument('--concurrency', type = int, default = DRAIN_CONCURRENCY)
+    parser.add_argument('--interval', type = int, default = DRAIN_INTERVAL)
+    parser.add_argument('--once', action = 'store_true', help = 'Drain what is due now and exit.')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level = logging.INFO)
+
+    drainer = SpoolDrainer(UploadSpool(args.spool), concurrency = args.concurrency, interval = args.interval)
+    if args.once:
+        logger.info('UploadSpool: %s upload(s) done.' % drainer.drainOnce())
+        return 0
+    try:
+        drainer.run()
+    except KeyboardInterrupt:
+        drainer.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    ## Standalone: load the lib modules we need without the package __init__, which pulls in the tank Qt bindings.
+    import imp
+    package = imp.new_module('playblastlib')
+    package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+    sys.modules['playblastlib'] = package
+    __import__('playblastlib.UploadSpool')
+    sys.exit(sys.modules['playblastlib.UploadSpool'].main())
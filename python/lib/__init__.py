@@ -1,7 +1,119 @@
 from .InputPrompt import InputPrompt
-from .UploaderThread import UploaderThread
+from .ProgressThrottle import ProgressThrottle
 from .CONST import *
 from .cam_lib import _setCameraDefaults
 from .cam_lib import _findShotCamera
 from .renderGlobals import setRenderGlobals
-from .ProgressBarUI import ProgressBarUI
\ No newline at end of file
+from .ProgressBarUI import ProgressBarUI
+from .ShotgunPool import ShotgunPool
+from .ShotgunPool import getShotgunPool
+from .ShotgunPool import getShotgunCredentials
+from .ChunkedUploader import ChunkedUploader
+from .ChunkedUploader import HttpPartTarget
+from .ChunkedUploader import ShotgunStorageTarget
+from .ChunkedUploader import UploadError
+from .SubmitQueue import SubmitQueue
+from .SubmitQueue import SubmitJob
+from .SubmitQueue import getSubmitQueue
+from .SubmitQueue import runInMainThread
+from .ChunkedUploader import uploadMovie
+from .modelEditorState import buildEditorState
+from .modelEditorState import diffEditorState
+from .modelEditorState import defaultEditorState
+from .modelEditorState import applyEditorState
+from .sceneSetup import renderGlobalValues
+from .sceneSetup import applyRenderGlobals
+from .sceneSetup import SceneSetupError
+from .ShardedPlayblast import ShardedPlayblast
+from .ShardedPlayblast import splitFrameRange
+from .ShardedPlayblast import defaultMayapy
+from .ShardedPlayblast import WORKER_SCRIPT as PLAYBLAST_WORKER_SCRIPT
+from .encoder import encodeSequence
+from .encoder import getSceneFps
+from .encoder import StreamEncoder
+from .encoder import sequencePattern
+from .UploadSpool import UploadSpool
+from .UploadSpool import SpoolDrainer
+from .UploadSpool import startSpoolDrainer
+from .UploadSpool import SPOOL_DIR as UPLOAD_SPOOL_DIR
+from .BatchPlayblast import BatchPlayblast
+from .BatchPlayblast import BatchJob
+from .runTrace import startTrace
+from .runTrace import setTraceSink
+from .runTrace import getTraceSink
+from .runTrace import JsonLinesSink
+from .runTrace import NULL_TRACE
+from .runTrace import TRACE_DIR
+from .ShotgunCache import ShotgunReadCache
+from .ShotgunCache import getShotgunCache
+from .versionSubmit import versionCode
+from .versionSubmit import versionCodes
+from .versionSubmit import findVersion
+from .versionSubmit import createUniqueVersion
+from .versionSubmit import VersionCreated
+from .versionSubmit import VersionCollision
+from .versionSubmit import VersionCollisionError
+from .versionSubmit import reserveVersion
+from .versionSubmit import fillReservation
+from .versionSubmit import releaseReservation
+from .versionSubmit import renewReservation
+from .versionSubmit import ReservationKeeper
+from .versionSubmit import VersionReserved
+from .PublishMover import PublishMover
+from .PublishMover import MoveResult
+from .PublishMover import MoveError
+from .MovieDedupe import DedupeIndex
+from .MovieDedupe import hashMovie
+from .MovieDedupe import findUploadedMovie
+from .MovieDedupe import linkUploadedMovie
+from .FrameCache import FrameCache
+from .FrameCache import frameKeys
+from .FrameCache import settingsKey
+from .FrameCache import sceneContentKey
+from .FrameCache import readAnimCurves
+from .FrameCache import timeDependentNodes
+from .FrameCache import parseFrameRanges
+from .FrameCache import framesToRanges
+from .FrameCache import FRAME_CACHE_DIR
+from .FrameCache import IMAGE_FORMAT as FRAME_CACHE_FORMAT
+from .OutputCache import OutputCache
+from .OutputCache import outputFingerprint
+from .OutputCache import dependencyKey
+from .OutputCache import sceneDependencies
+from .OutputCache import pbSettings
+from .OutputCache import OUTPUT_CACHE_DIR
+from .SceneIndex import SceneIndex
+from .SceneIndex import getSceneIndex
+from .SceneIndex import setSceneIndex
+from .SceneIndex import ManualEventSource
+from .SceneIndex import MayaEventSource
+from .ScratchTransfer import TransferQueue
+from .ScratchTransfer import Transfer
+from .TokenBucket import TokenBucket
+from .ScratchTransfer import getTransferQueue
+from .ScratchTransfer import scratchPath
+from .StageGraph import StageGraph
+from .StageGraph import Stage
+from .StageGraph import StageResult
+from .encoder import extractThumbnail
+from .UploadScheduler import UploadSchedulerClient
+from .UploadScheduler import SchedulerUnavailable
+from .UploadScheduler import uploadPriority
+from .UploadScheduler import setUploadScheduler
+from .UploadScheduler import getUploadScheduler
+from .UploadScheduler import startUploadSchedulerDaemon
+from .UploadScheduler import DAEMON_SCRIPT as UPLOAD_SCHEDULER_SCRIPT
+from .ChunkedUploader import readBlocks
+from .ChunkedUploader import putStream
+from .ShotgunGuard import ShotgunUnavailable
+from .ShotgunGuard import ShotgunTimeout
+from .ShotgunGuard import ShotgunOffline
+from .ShotgunGuard import ShotgunCallPolicy
+from .ShotgunGuard import CircuitBreaker
+from .ShotgunGuard import GuardedShotgun
+from .ShotgunGuard import guardShotgun
+from .ShotgunGuard import guardedCall
+from .ShotgunGuard import setShotgunPolicy
+from .ShotgunGuard import getShotgunPolicy
+from .ShotgunGuard import getShotgunBreaker
+from .ShotgunGuard import isShotgunOffline
\ No newline at end of file
@@ -1,17 +1,15 @@
 import maya.cmds as cmds
 from tank.platform.qt import QtCore, QtGui
+from .SceneIndex import getSceneIndex
+from .sceneSetup import setCameraDefaults
 
 def _findShotCamera():
     """
     Shot camera setup. You can replace this entire func with your own code to return the correct cameraShape for the app to use.
     """
-    camera = []
-    for each in cmds.ls(type = 'camera'):
-        getCamTransform = cmds.listRelatives(each, parent = True)[0]
-        ## We don't care about any suffix used, we're looking for an attr called type on the camera here to find the shot cam.
-        ## You can change this to find your shot camera as you need
-        if cmds.objExists('%s.type' % getCamTransform):
-            camera.append(each)
+    ## We don't care about any suffix used, we're looking for an attr called type on the camera here to find the shot cam.
+    ## You can change this to find your shot camera as you need, see sceneSetup.SHOT_CAMERA_ATTR
+    camera = getSceneIndex().shotCameras()
 
     if not camera:
         QtGui.QMessageBox.information(None, "Aborted...", 'No shotCam found!!')
@@ -36,17 +34,7 @@ def _setCameraDefaults(camera = ''):
         camera = None
 
     if camera:
-        camName = camera
-        camShape = cmds.listRelatives(camera, shapes = True)[0]
-        cmds.camera(camName, e = True,  displayFilmGate  = 0,  displayResolution = 1,  overscan = 1.19)
-        cmds.setAttr("%s.displayGateMask" % camShape, 1)
-        cmds.setAttr('%s.displayGateMaskOpacity' % camShape, 1)
-        cmds.setAttr('%s.displayGateMaskColor' % camShape, 0, 0, 0, type = 'double3' )
-        cmds.setAttr("%s.displayResolution" % camShape, 1)
-        cmds.setAttr("%s.displaySafeAction" % camShape, 1)
-        cmds.setAttr("%s.journalCommand" % camShape, 0)
-        cmds.setAttr("%s.nearClipPlane" % camShape, 0.05)
-        cmds.setAttr("%s.overscan" % camShape, 1)
+        setCameraDefaults(camera)
     else:
         cmds.warning('No shotcam found!')
 
@@ -55,7 +43,7 @@ def _createCamGate(camera = '', pathToImage = ''):
         camera = getShotCamera()
 
     if camera:
-        if not cmds.objExists('camGate'):
+        if 'camGate' not in [getSceneIndex().shortName(getSceneIndex().transform(each)) for each in getSceneIndex().nodes('imagePlane')]:
             cmds.imagePlane(n = 'camGate')
             cmds.rename('camGate1', 'camGate')
             cmds.pointConstraint('%s' % camera, 'camGate', mo = False, n ='tmpPoint')
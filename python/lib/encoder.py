@@ -0,0 +1,219 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Helpers for turning a rendered image sequence into the review movie with an external encoder (ffmpeg by default).
+"""
+import os, subprocess, shlex, threading, tempfile
+import logging
+logger = logging.getLogger(__name__)
+
+ENCODER_PATH    = 'ffmpeg'
+ENCODER_ARGS    = '-c:v libx264 -pix_fmt yuv420p -crf 18'
+## maya time units to frames per second
+TIME_UNIT_FPS   = {'game': 15, 'film': 24, 'pal': 25, 'ntsc': 30, 'show': 48, 'palf': 50, 'ntscf': 60}
+
+
+class EncodeError(Exception):
+    pass
+
+
+def getSceneFps():
+    """
+    Returns the frames per second of the current maya scene.
+    """
+    import maya.cmds as cmds
+    unit = cmds.currentUnit(query = True, time = True)
+    if unit in TIME_UNIT_FPS:
+        return TIME_UNIT_FPS[unit]
+    ## Newer maya versions use names like 23.976fps or 48fps
+    try:
+        return float(unit.replace('fps', ''))
+    except ValueError:
+        logger.warning('Unknown time unit %s, encoding at 24fps' % unit)
+        return 24
+
+
+def sequencePattern(prefix, imageFormat, padding):
+    """
+    Returns the printf style pattern for the frames maya writes for a playblast to prefix, eg prefix.%04d.png
+    """
+    return '%s.%%0%dd.%s' % (prefix, padding, imageFormat)
+
+
+def buildEncodeCommand(inputArgs, output, fps, sound = None, encoderPath = ENCODER_PATH, encoderArgs = ENCODER_ARGS):
+    """
+    Returns the encoder command line as a list.
+    @param inputArgs: The encoder args describing the frame input eg ['-start_number', '1', '-i', 'shot.%04d.png']
+    """
+    command = [encoderPath, '-y', '-framerate', str(fps)] + list(inputArgs)
+    if sound:
+        command += ['-i', sound, '-shortest']
+    command += shlex.split(encoderArgs)
+    command.append(output)
+    return command
+
+
+def encodeSequence(pattern, firstFrame, output, fps, sound = None, encoderPath = ENCODER_PATH, encoderArgs = ENCODER_ARGS):
+    """
+    Encodes an image sequence on disk into the output movie. Blocks until the encoder is done.
+    """
+    command = buildEncodeCommand(['-start_number', str(int(firstFrame)), '-i', pattern], output, fps, sound, encoderPath, encoderArgs)
+    logger.info('Encoding: %s' % ' '.join(command))
+    process = subprocess.Popen(command, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+    out = process.communicate()[0]
+    if process.returncode != 0 or not os.path.exists(output):
+        raise EncodeError('Encoder failed with exit code %s:\n%s' % (process.returncode, out[-2000:]))
+    return output
+
+
+def extractThumbnail(movie, output, encoderPath = ENCODER_PATH):
+    """
+    Writes a representative frame of the movie to output (eg a jpg) with the encoder's thumbnail filter.
+    """
+    command = [encoderPath, '-y', '-i', movie, '-vf', 'thumbnail', '-frames:v', '1', output]
+    logger.info('Extracting thumbnail: %s' % ' '.join(command))
+    process = subprocess.Popen(command, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+    out = process.communicate()[0]
+    if process.returncode != 0 or not os.path.exists(output):
+        raise EncodeError('Encoder failed with exit code %s:\n%s' % (process.returncode, out[-2000:]))
+    return output
+
+
+class StreamEncoder(object):
+    """
+    Feeds frames into a running encoder process as they land on disk, so encoding overlaps with rendering.
+    Each frame is deleted as soon as the encoder has it, and the renderer is expected to call waitForCapacity()
+    between batches so a fast render can never have more than maxPending frames sitting on scratch disk.
+
+        stream = StreamEncoder(pattern, 1, 100, 'shot.mov', 24)
+        stream.start()
+        for start, end in batches:
+            stream.waitForCapacity(end - start + 1)
+            cmds.playblast(... startTime = start, endTime = end ...)
+            stream.markRendered(end)
+        stream.finish()
+    """
+    ## Seconds between checks for the next frame on disk.
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, pattern, firstFrame, lastFrame, output, fps, sound = None, encoderPath = ENCODER_PATH, encoderArgs = ENCODER_ARGS, maxPending = 48, imageCodec = 'png'):
+        self.pattern        = pattern
+        self.firstFrame     = int(firstFrame)
+        self.lastFrame      = int(lastFrame)
+        self.output         = output
+        self.maxPending     = max(int(maxPending), 1)
+        self.command        = buildEncodeCommand(['-f', 'image2pipe', '-c:v', imageCodec, '-i', '-'], output, fps, sound, encoderPath, encoderArgs)
+        self._condition     = threading.Condition()
+        ## Next frame the feeder hands to the encoder
+        self._nextFrame     = self.firstFrame
+        ## Last frame the renderer says is completely written
+        self._renderedTo    = self.firstFrame - 1
+        self._renderDone    = False
+        self._error         = None
+        self._process       = None
+        self._feeder        = None
+        self._log           = None
+
+    def start(self):
+        logger.info('Stream encoding: %s' % ' '.join(self.command))
+        ## The encoder output goes to a temp file, a pipe nobody reads until the end would fill up and stall the encoder.
+        self._log       = tempfile.TemporaryFile()
+        self._process   = subprocess.Popen(self.command, stdin = subprocess.PIPE, stdout = self._log, stderr = subprocess.STDOUT)
+        self._feeder    = threading.Thread(target = self._feed)
+        self._feeder.setDaemon(True)
+        self._feeder.start()
+
+    def pendingFrames(self):
+        """
+        Number of frames rendered to disk that the encoder hasn't consumed yet.
+        """
+        count = 0
+        frame = self._nextFrame
+        while frame <= self.lastFrame and os.path.exists(self.pattern % frame):
+            count += 1
+            frame += 1
+        return count
+
+    def waitForCapacity(self, batchSize = 0):
+        """
+        Blocks the renderer until there is room for another batchSize frames on disk.
+        """
+        with self._condition:
+            while self._error is None and self.pendingFrames() + batchSize > self.maxPending:
+                self._condition.wait(self.POLL_INTERVAL)
+        if self._error:
+            raise EncodeError(self._error)
+
+    def markRendered(self, frame):
+        """
+        Tells the feeder every frame up to and including frame is completely written.
+        """
+        with self._condition:
+            self._renderedTo = max(self._renderedTo, int(frame))
+            self._condition.notify_all()
+
+    def _frameReady(self, frame):
+        ## The renderer has said so, or has moved on to the next frame, so this one is completely written.
+        if not os.path.exists(self.pattern % frame):
+            return False
+        return self._renderDone or frame <= self._renderedTo or os.path.exists(self.pattern % (frame + 1))
+
+    def _feed(self):
+        try:
+            while self._nextFrame <= self.lastFrame:
+                frame = self._nextFrame
+                with self._condition:
+                    while not self._frameReady(frame):
+                        if self._renderDone and not os.path.exists(self.pattern % frame):
+                            raise EncodeError('Frame %s was never rendered: %s' % (frame, self.pattern % frame))
+                        self._condition.wait(self.POLL_INTERVAL)
+                path = self.pattern % frame
+                with open(path, 'rb') as f:
+                    self._process.stdin.write(f.read())
+                os.remove(path)
+                with self._condition:
+                    self._nextFrame = frame + 1
+                    self._condition.notify_all()
+        except Exception, e:
+            with self._condition:
+                self._error = 'Stream encoder stopped at frame %s: %s' % (self._nextFrame, e)
+                self._condition.notify_all()
+        finally:
+            try:
+                self._process.stdin.close()
+            except IOError:
+                pass
+
+    def finish(self):
+        """
+        Call once the renderer is done. Waits for the encoder to consume the rest and finish the movie.
+        """
+        with self._condition:
+            self._renderDone = True
+            self._condition.notify_all()
+        self._feeder.join()
+        self._process.wait()
+        self._log.seek(0)
+        out = self._log.read()
+        self._log.close()
+        if self._error:
+            raise EncodeError(self._error)
+        if self._process.returncode != 0 or not os.path.exists(self.output):
+            raise EncodeError('Encoder failed with exit code %s:\n%s' % (self._process.returncode, out[-2000:]))
+        return self.output
+
+    def abort(self):
+        """
+        Stops the encoder, eg when the render failed.
+        """
+        with self._condition:
+            self._error = self._error or 'aborted'
+            self._renderDone = True
+            self._condition.notify_all()
+        if self._process and self._process.returncode is None:
+            try:
+                self._process.kill()
+            except OSError:
+                pass
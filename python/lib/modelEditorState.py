@@ -0,0 +1,75 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+The modelEditor display state for the playblast options. Works out the flags the artist's checked options
+map to and diffs them against what was last applied, applyEditorState in sceneSetup sends only the changed flags in one modelEditor edit.
+"""
+from . import CONST
+from .sceneSetup import PLUGIN_FILTER_PREFIX
+from .sceneSetup import applyEditorState
+import logging
+logger = logging.getLogger(__name__)
+
+
+def buildEditorState(optionLabels, checkedLabels):
+    """
+    Works out the full modelEditor state for the options the artist has checked.
+    @param optionLabels: Every option label shown to the artist, camera, viewport and renderer options.
+    @type optionLabels: List
+    @param checkedLabels: The labels that are currently checked.
+    @type checkedLabels: Set
+    @return: Dict of modelEditor flag: value
+    """
+    state = {}
+    for label in optionLabels:
+        isChecked = label in checkedLabels
+        if label in CONST.MODEL_EDITOR_FLAGS:
+            state[CONST.MODEL_EDITOR_FLAGS[label]] = isChecked
+        elif label in CONST.MODEL_EDITOR_PLUGIN_FILTERS:
+            state['%s%s' % (PLUGIN_FILTER_PREFIX, CONST.MODEL_EDITOR_PLUGIN_FILTERS[label])] = isChecked
+        elif label in CONST.MODEL_EDITOR_RENDERERS and isChecked:
+            state['rendererName'] = CONST.MODEL_EDITOR_RENDERERS[label]
+
+    ## Shading mode. Hardware texturing and wireframe on shaded both force smooth shading.
+    if 'WireFrame' in checkedLabels:
+        state['displayAppearance'] = 'wireframe'
+    if 'Bounding Box' in checkedLabels:
+        state['displayAppearance'] = 'boundingBox'
+    if 'SmoothShade All' in checkedLabels:
+        state['displayAppearance'] = 'smoothShaded'
+
+    if 'Hardware Texturing' in optionLabels:
+        state['displayTextures'] = 'Hardware Texturing' in checkedLabels
+        if state['displayTextures']:
+            state['displayAppearance'] = 'smoothShaded'
+            state['displayLights'] = 'default'
+
+    if 'Wireframe on Shaded' in optionLabels:
+        state['wireframeOnShaded'] = 'Wireframe on Shaded' in checkedLabels
+        if state['wireframeOnShaded']:
+            state['displayAppearance'] = 'smoothShaded'
+            state['activeOnly'] = False
+
+    return state
+
+
+def defaultEditorState():
+    """
+    The modelEditor state for the CONST default options, what the app starts with before the artist changes anything.
+    """
+    labels = CONST.CAM_SETTINGS_OPTIONS + CONST.VIEWPORT_SETTINGS_OPTIONS + CONST.RENDERER_SETTINGS_OPTIONS
+    return buildEditorState(labels, set(CONST.CAM_SETTINGS_DEFAULT_ON + CONST.VIEWPORT_SETTINGS_DEFAULT_ON + CONST.RENDERER_SETTINGS_DEFAULT_ON))
+
+
+def diffEditorState(applied, wanted):
+    """
+    Returns only the flags in wanted that differ from what was last applied.
+    """
+    changes = {}
+    for flag, value in wanted.items():
+        if flag not in applied or applied[flag] != value:
+            changes[flag] = value
+    return changes
+
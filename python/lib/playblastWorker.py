@@ -0,0 +1,130 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Headless playblast worker, run with mayapy. Opens the saved scene and playblasts a frame range to an image sequence.
+
+    mayapy playblastWorker.py --scene shot.ma --start 1 --end 50 --output /tmp/shot --camera shotCamShape
+
+Leave out --start and --end to playblast the scene's own animation range. --end-handle plays that many frames
+past the end, like the app's PB_END_HANDLE. --report writes the frame range that was rendered to a json file for the caller.
+
+mayapy has no panels, so the worker makes its own modelPanel looking through --camera, or through the scene's
+tagged shot camera when --camera is left out, and sets it up the way the app does: the camera defaults, the
+--render-globals [[attr, value], ...] and the --editor-state {modelEditor flag: value} as json.
+A camera that doesn't exist fails the worker rather than rendering whatever view there is.
+
+NOTE: headless playblasting needs a maya version that supports offscreen playblasts from mayapy.
+"""
+import os, sys, argparse, json
+
+## Run as a script so pick up the lib CONST directly rather than through the package.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import CONST
+import encoder
+import sceneSetup
+
+
+class WorkerError(Exception):
+    pass
+
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description = 'Playblast a frame range of a saved scene to an image sequence.')
+    parser.add_argument('--scene', required = True)
+    parser.add_argument('--start', type = float)
+    parser.add_argument('--end', type = float)
+    parser.add_argument('--output', required = True, help = 'Image sequence prefix, maya adds .####.ext')
+    parser.add_argument('--camera', default = '')
+    parser.add_argument('--width', type = int, default = 1280)
+    parser.add_argument('--height', type = int, default = 720)
+    parser.add_argument('--percent', type = int, default = 100)
+    parser.add_argument('--quality', type = int, default = 75)
+    parser.add_argument('--image-format', default = 'png')
+    parser.add_argument('--editor-state', type = json.loads, default = {})
+    parser.add_argument('--render-globals', type = json.loads, default = [])
+    parser.add_argument('--end-handle', type = int, default = 0)
+    parser.add_argument('--report', default = '')
+    return parser.parse_args(argv)
+
+
+def playblastRange(args):
+    import maya.cmds as cmds
+    import renderGlobals
+    cmds.file(args.scene, open = True, force = True, prompt = False)
+    if args.start is None:
+        args.start  = cmds.playbackOptions(query = True, animationStartTime = True)
+    if args.end is None:
+        args.end    = cmds.playbackOptions(query = True, animationEndTime = True)
+    args.end += args.end_handle
+
+    camera = findCamera(args.camera)
+    sceneSetup.setCameraDefaults(camera)
+    sceneSetup.applyRenderGlobals(args.render_globals)
+    renderGlobals.setRenderGlobals()
+
+    window, panel = sceneSetup.openEditor(camera, args.width, args.height)
+    try:
+        sceneSetup.applyEditorState(panel, args.editor_state)
+        playblast(args, panel)
+    finally:
+        sceneSetup.closeEditor(window)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'scene': args.scene, 'start': args.start, 'end': args.end, 'output': args.output, 'camera': camera, 'fps': encoder.getSceneFps()}, f)
+
+
+def findCamera(camera):
+    """
+    The camera transform to look through, camera if given else the one tagged shot camera. Raises WorkerError if there isn't one.
+    """
+    if not camera:
+        cameras = sceneSetup.shotCameras()
+        if len(cameras) != 1:
+            raise WorkerError('Expected one shot camera tagged with .%s, found %s' % (sceneSetup.SHOT_CAMERA_ATTR, len(cameras)))
+        camera = cameras[0]
+    try:
+        return sceneSetup.cameraTransform(camera)
+    except sceneSetup.SceneSetupError as e:
+        raise WorkerError(str(e))
+
+
+def playblast(args, panel):
+    import maya.cmds as cmds
+    cmds.playblast(
+                    editorPanelName = panel,
+                    filename        = args.output,
+                    format          = 'image',
+                    compression     = args.image_format,
+                    startTime       = args.start,
+                    endTime         = args.end,
+                    forceOverwrite  = True,
+                    framePadding    = CONST.PB_FRAMEPADDING,
+                    offScreen       = True,
+                    options         = False,
+                    percent         = args.percent,
+                    quality         = args.quality,
+                    showOrnaments   = CONST.PB_SHOWORNAMENTS,
+                    viewer          = False,
+                    widthHeight     = [args.width, args.height],
+                    )
+
+
+def main(argv = None):
+    args = parseArgs(sys.argv[1:] if argv is None else argv)
+    import maya.standalone
+    maya.standalone.initialize(name = 'python')
+    try:
+        playblastRange(args)
+    except WorkerError as e:
+        sys.stderr.write('playblastWorker: %s\n' % e)
+        return 2
+    finally:
+        maya.standalone.uninitialize()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
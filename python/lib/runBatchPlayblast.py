@@ -0,0 +1,29 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Command line entry point for the headless batch playblasts (BatchPlayblast.py), see there for the arguments:
+
+    python runBatchPlayblast.py --work-template maya_shot_work --movie-template maya_shot_playblast
+                                --movie-workpath-template maya_shot_playblast_work --workers 4
+                                --report dailies.json /jobs/abc/shot010_anim_v012.ma Shot:1234
+
+BatchPlayblast and the modules it uses import each other relatively, so they can't be run as plain scripts.
+This loads them as a package without running the lib __init__, which pulls in the tank Qt bindings.
+"""
+import os, sys, imp
+
+PACKAGE = 'playblastlib'
+
+
+def loadPackage():
+    package = imp.new_module(PACKAGE)
+    package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+    sys.modules[PACKAGE] = package
+    __import__('%s.BatchPlayblast' % PACKAGE)
+    return sys.modules['%s.BatchPlayblast' % PACKAGE]
+
+
+if __name__ == '__main__':
+    sys.exit(loadPackage().main())
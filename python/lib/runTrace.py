@@ -0,0 +1,190 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Lightweight per run tracing. Each playblast run records a span (start, end, duration) per stage plus a few
+run metrics, and when the run is finished the whole thing is scrubbed of secrets and handed to the sink
+as one json record.
+
+    trace = startTrace('playblast', entity = 'shot010')
+    with trace.span('versionCheck'):
+        ...
+    trace.set(framesRendered = 100)
+    trace.finish()
+
+With tracing off startTrace returns a trace whose span() and set() do nothing, so there is no cost to leaving
+the calls in place.
+"""
+import os, time, json, socket, getpass, threading, uuid
+from contextlib import contextmanager
+import logging
+logger = logging.getLogger(__name__)
+
+TRACE_DIR       = os.path.join(os.path.expanduser('~'), '.tk-jbd-playblast', 'traces')
+TRACE_FILE      = 'playblast_traces.jsonl'
+## Any key containing one of these has its value replaced before the record leaves the process.
+SECRET_KEYS     = ('api_key', 'apikey', 'password', 'secret', 'token', 'script_key', 'session')
+SCRUBBED        = '***'
+
+
+def scrub(value, secrets = ()):
+    """
+    Returns a copy of value with secret keys blanked out and any of the secret strings removed from the text.
+    """
+    if isinstance(value, dict):
+        clean = {}
+        for key, each in value.items():
+            if any(secret in str(key).lower() for secret in SECRET_KEYS):
+                clean[key] = SCRUBBED
+            else:
+                clean[key] = scrub(each, secrets)
+        return clean
+    if isinstance(value, (list, tuple)):
+        return [scrub(each, secrets) for each in value]
+    if isinstance(value, basestring):
+        for secret in secrets:
+            if secret and secret in value:
+                value = value.replace(secret, SCRUBBED)
+        return value
+    return value
+
+
+class JsonLinesSink(object):
+    """
+    Appends each run record as one line of json to traceDir/playblast_traces.jsonl.
+    """
+    def __init__(self, traceDir = TRACE_DIR):
+        self.traceDir   = traceDir
+        self._lock      = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, sort_keys = True, default = str)
+        with self._lock:
+            if not os.path.isdir(self.traceDir):
+                os.makedirs(self.traceDir)
+            with open(os.path.join(self.traceDir, TRACE_FILE), 'a') as f:
+                f.write(line + '\n')
+
+
+class RunTrace(object):
+    """
+    The spans and metrics for one run. Spans can be recorded from any thread.
+    """
+    def __init__(self, name, sink, secrets = (), **attrs):
+        self.name       = name
+        self.sink       = sink
+        self.secrets    = secrets
+        self.runId      = uuid.uuid4().hex
+        self.start      = time.time()
+        self.attrs      = attrs
+        self.metrics    = {}
+        self.spans      = []
+        self._lock      = threading.Lock()
+        self._finished  = False
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.time()
+        error = None
+        try:
+            yield attrs
+        except Exception, e:
+            error = '%s' % e
+            raise
+        finally:
+            end = time.time()
+            span = {'name': name, 'start': start, 'end': end, 'duration': round(end - start, 6), 'thread': threading.current_thread().name}
+            if attrs:
+                span['attrs'] = attrs
+            if error:
+                span['error'] = error
+            with self._lock:
+                self.spans.append(span)
+
+    def set(self, **metrics):
+        with self._lock:
+            self.metrics.update(metrics)
+
+    def duration(self, name):
+        """
+        Total seconds spent in the spans called name.
+        """
+        with self._lock:
+            return sum([each['duration'] for each in self.spans if each['name'] == name])
+
+    def finish(self, status = 'ok', error = None):
+        """
+        Sends the record to the sink. Only the first call does anything, so every exit path can safely call it.
+        """
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            end = time.time()
+            record = {
+                        'run':      self.name,
+                        'runId':    self.runId,
+                        'host':     socket.gethostname(),
+                        'user':     getpass.getuser(),
+                        'start':    self.start,
+                        'end':      end,
+                        'duration': round(end - self.start, 6),
+                        'status':   status,
+                        'attrs':    self.attrs,
+                        'metrics':  self.metrics,
+                        'spans':    sorted(self.spans, key = lambda each: each['start']),
+                     }
+            if error:
+                record['error'] = '%s' % error
+        try:
+            self.sink.write(scrub(record, self.secrets))
+        except Exception, e:
+            ## Telemetry must never break a playblast
+            logger.warning('RunTrace: could not write the trace for %s: %s' % (self.name, e))
+
+
+class NullTrace(object):
+    """
+    Stand in when tracing is off. Every call is a no op.
+    """
+    name = runId = None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        yield attrs
+
+    def set(self, **metrics):
+        pass
+
+    def duration(self, name):
+        return 0.0
+
+    def finish(self, status = 'ok', error = None):
+        pass
+
+
+NULL_TRACE  = NullTrace()
+_SINK       = None
+
+
+def setTraceSink(sink):
+    """
+    Swaps the process wide sink, anything with a write(record) method. None turns tracing off.
+    """
+    global _SINK
+    _SINK = sink
+
+
+def getTraceSink():
+    return _SINK
+
+
+def startTrace(name, secrets = (), **attrs):
+    """
+    Returns a RunTrace writing to the current sink, or the no op trace if tracing is off.
+    secrets are strings, eg the api key, that are scrubbed out of every value in the record.
+    """
+    if _SINK is None:
+        return NULL_TRACE
+    return RunTrace(name, _SINK, secrets, **attrs)
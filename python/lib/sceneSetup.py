@@ -0,0 +1,135 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+The scene setup a playblast needs, shared by the app and the headless mayapy workers (playblastWorker.py) so a
+sharded or batch movie looks like the one the artist gets in maya: the shot camera and its display defaults,
+the resolution and viewport 2.0 globals, and the modelEditor flags. Nothing here imports from the lib package,
+the workers load it as a plain module.
+"""
+import logging
+logger = logging.getLogger(__name__)
+
+## Attr on the camera transform that marks the shot camera, see cam_lib._findShotCamera
+SHOT_CAMERA_ATTR        = 'type'
+## Prefix used in the state dict for modelEditor pluginObjects display filters.
+PLUGIN_FILTER_PREFIX    = 'pluginObjects:'
+## CONST name -> hardwareRenderingGlobals attr
+HW_GLOBALS              = [
+                            ('HW_MULTI_SAMPLE_ENABLE',  'multiSampleEnable'),
+                            ('HW_SSAC_ENABLE',          'ssaoEnable'),
+                            ('HW_SSAC_AMOUNT',          'ssaoAmount'),
+                            ('HW_SSAC_RADIUS',          'ssaoRadius'),
+                            ('HW_FILTER_RADIUS',        'ssaoFilterRadius'),
+                            ('HW_SSAO_SAMPLES',         'ssaoSamples'),
+                            ('HW_CONSOLODATEWORLD',     'consolidateWorld'),
+                          ]
+
+
+class SceneSetupError(Exception):
+    pass
+
+
+def renderGlobalValues(const, width, height):
+    """
+    [[attr, value], ...] for the resolution and viewport 2.0 globals, const is the lib CONST module or anything else with the HW_ names.
+    Plain lists so it goes through json to the workers.
+    """
+    values = [
+                ['defaultResolution.width',             width],
+                ['defaultResolution.height',            height],
+                ['defaultResolution.pixelAspect',       1],
+                ['defaultResolution.deviceAspectRatio', 1.7778],
+             ]
+    return values + [['hardwareRenderingGlobals.%s' % attr, getattr(const, name)] for name, attr in HW_GLOBALS]
+
+
+def applyRenderGlobals(values):
+    import maya.cmds as cmds
+    for attr, value in values:
+        cmds.setAttr(attr, value)
+
+
+def shotCameras():
+    """
+    Camera shapes whose transform has the shot cam tag, looked up straight from the scene. The app goes through the SceneIndex.
+    """
+    import maya.cmds as cmds
+    cameras = cmds.ls(type = 'camera', long = True) or []
+    transforms = [each.rsplit('|', 1)[0] for each in cameras]
+    if not transforms:
+        return []
+    ## ls of attribute paths returns just the ones that exist
+    tagged = set([each.rsplit('.', 1)[0] for each in cmds.ls(['%s.%s' % (each, SHOT_CAMERA_ATTR) for each in transforms], long = True) or []])
+    return [shape for shape, transform in zip(cameras, transforms) if transform in tagged]
+
+
+def cameraTransform(camera):
+    """
+    The transform for a camera shape or transform, raises SceneSetupError if there is no such camera.
+    """
+    import maya.cmds as cmds
+    if not camera or not cmds.objExists(camera):
+        raise SceneSetupError('Camera %s does not exist' % camera)
+    if cmds.nodeType(camera) == 'camera':
+        return cmds.listRelatives(camera, parent = True, fullPath = True)[0]
+    if not cmds.listRelatives(camera, shapes = True, type = 'camera'):
+        raise SceneSetupError('%s is not a camera' % camera)
+    return camera
+
+
+def setCameraDefaults(camera):
+    """
+    The display defaults for the camera transform: resolution gate, black gate mask, no film gate.
+    """
+    import maya.cmds as cmds
+    camShape = cmds.listRelatives(camera, shapes = True)[0]
+    cmds.camera(camera, e = True,  displayFilmGate  = 0,  displayResolution = 1,  overscan = 1.19)
+    cmds.setAttr("%s.displayGateMask" % camShape, 1)
+    cmds.setAttr('%s.displayGateMaskOpacity' % camShape, 1)
+    cmds.setAttr('%s.displayGateMaskColor' % camShape, 0, 0, 0, type = 'double3' )
+    cmds.setAttr("%s.displayResolution" % camShape, 1)
+    cmds.setAttr("%s.displaySafeAction" % camShape, 1)
+    cmds.setAttr("%s.journalCommand" % camShape, 0)
+    cmds.setAttr("%s.nearClipPlane" % camShape, 0.05)
+    cmds.setAttr("%s.overscan" % camShape, 1)
+
+
+def applyEditorState(editor, changes):
+    """
+    Sends the changed flags to the modelEditor in a single edit.
+    Plugin display filters go through their own call as the plugin may not be loaded.
+    """
+    import maya.cmds as cmds
+    flags = {}
+    for flag, value in changes.items():
+        if flag.startswith(PLUGIN_FILTER_PREFIX):
+            try:## Extension only
+                cmds.modelEditor(editor, edit = True, pluginObjects = [flag[len(PLUGIN_FILTER_PREFIX):], value])
+            except (RuntimeError, TypeError):
+                pass
+        else:
+            flags[flag] = value
+    if flags:
+        cmds.modelEditor(editor, edit = True, **flags)
+    logger.info('Applied %s modelEditor setting(s) to %s' % (len(changes), editor))
+
+
+def openEditor(camera, width, height):
+    """
+    mayapy has no panels, so a headless playblast makes its own: a window holding a modelPanel looking through camera.
+    Returns (window, panel), playblast with editorPanelName = panel and closeEditor(window) afterwards.
+    """
+    import maya.cmds as cmds
+    window = cmds.window(widthHeight = (width, height))
+    cmds.paneLayout()
+    panel = cmds.modelPanel(camera = camera, menuBarVisible = False)
+    cmds.showWindow(window)
+    return window, panel
+
+
+def closeEditor(window):
+    import maya.cmds as cmds
+    if window and cmds.window(window, exists = True):
+        cmds.deleteUI(window)
@@ -0,0 +1,217 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Upload scheduler daemon. Every maya on the workstation (or the site, run it on a box they can all reach) asks it
+for an upload slot before sending a movie to shotgun, so a room full of artists submitting for dailies shares the
+uplink instead of all uploading at once and crawling:
+
+    mayapy uploadSchedulerDaemon.py --port 8761 --max-concurrent 4 --bandwidth-mb 40
+
+Uploads wait in priority order (status, then due date, then first come), at most --max-concurrent run at once
+and all of them draw their bytes from one token bucket. Clients are told their place in the queue while they wait.
+The protocol is one json message per line over a tcp connection held open for the whole upload, see
+UploadScheduler.UploadSchedulerClient. A client that goes away, maya crashing included, gives its slot back.
+"""
+import os, sys, json, time, socket, select, threading, argparse, SocketServer
+import logging
+logger = logging.getLogger(__name__)
+
+## Run as a script so pick up the TokenBucket directly rather than through the package.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from TokenBucket import TokenBucket
+
+PORT            = 8761
+MAX_CONCURRENT  = 4
+BANDWIDTH       = 0
+## How often a waiting client is checked on and told its position
+POLL_SECS       = 1.0
+
+
+class Ticket(object):
+    def __init__(self, ticketId, message):
+        self.id         = ticketId
+        self.name       = message.get('name', '')
+        self.host       = message.get('host', '')
+        self.size       = message.get('size', 0)
+        self.priority   = list(message.get('priority') or [])
+        self.enqueued   = time.time()
+        self.started    = None
+        self.sent       = 0
+
+    def sortKey(self):
+        return (self.priority, self.enqueued, self.id)
+
+    def asDict(self):
+        return {'id': self.id, 'name': self.name, 'host': self.host, 'size': self.size, 'priority': self.priority,
+                'enqueued': self.enqueued, 'started': self.started, 'sent': self.sent}
+
+
+class SchedulerState(object):
+    """
+    The queue and the running uploads, shared by every connection's handler thread.
+    """
+    def __init__(self, maxConcurrent = MAX_CONCURRENT, bytesPerSec = BANDWIDTH):
+        self.maxConcurrent  = max(int(maxConcurrent), 1)
+        self.bucket         = TokenBucket(bytesPerSec)
+        self.condition      = threading.Condition()
+        self.waiting        = []
+        self.running        = {}
+        self._nextId        = 0
+
+    def enqueue(self, message):
+        with self.condition:
+            self._nextId += 1
+            ticket = Ticket(self._nextId, message)
+            self.waiting.append(ticket)
+            self.waiting.sort(key = lambda each: each.sortKey())
+            self.condition.notify_all()
+        return ticket
+
+    def tryGrant(self, ticket):
+        """
+        Call with the condition held. Returns 0 once the ticket has a slot, else its 1 based place in the queue.
+        """
+        if len(self.running) < self.maxConcurrent and self.waiting and self.waiting[0] is ticket:
+            self.waiting.pop(0)
+            ticket.started = time.time()
+            self.running[ticket.id] = ticket
+            ## The next one in line may fit as well
+            self.condition.notify_all()
+            return 0
+        return self.waiting.index(ticket) + 1
+
+    def release(self, ticket):
+        with self.condition:
+            if ticket in self.waiting:
+                self.waiting.remove(ticket)
+            self.running.pop(ticket.id, None)
+            self.condition.notify_all()
+
+    def status(self):
+        with self.condition:
+            return {
+                    'maxConcurrent':    self.maxConcurrent,
+                    'bytesPerSec':      self.bucket.rate,
+                    'running':          [each.asDict() for each in sorted(self.running.values(), key = lambda each: each.started)],
+                    'waiting':          [each.asDict() for each in self.waiting],
+                    }
+
+
+class ClientGone(Exception):
+    pass
+
+
+class SchedulerHandler(SocketServer.StreamRequestHandler):
+    def _send(self, message):
+        self.wfile.write(json.dumps(message) + '\n')
+        self.wfile.flush()
+
+    def _checkClient(self):
+        ## A waiting client doesn't send anything, readable here means it hung up
+        readable = select.select([self.connection], [], [], 0)[0]
+        if readable and not self.connection.recv(1, socket.MSG_PEEK):
+            raise ClientGone()
+
+    def handle(self):
+        state = self.server.state
+        line = self.rfile.readline()
+        if not line:
+            return
+        message = json.loads(line)
+        if message.get('op') == 'status':
+            self._send(dict(state.status(), event = 'status'))
+            return
+        if message.get('op') != 'enqueue':
+            self._send({'event': 'error', 'error': 'Unknown op %s' % message.get('op')})
+            return
+
+        ticket = state.enqueue(message)
+        try:
+            self._waitForSlot(ticket)
+            self._serveSlot(ticket)
+        except (ClientGone, socket.error), e:
+            logger.info('UploadScheduler: %s (%s) went away' % (ticket.name, ticket.host))
+        finally:
+            state.release(ticket)
+
+    def _waitForSlot(self, ticket):
+        state = self.server.state
+        lastPosition = None
+        while True:
+            with state.condition:
+                position = state.tryGrant(ticket)
+                if position and position == lastPosition:
+                    state.condition.wait(POLL_SECS)
+            if not position:
+                self._send({'event': 'granted', 'waited': round(ticket.started - ticket.enqueued, 3)})
+                logger.info('UploadScheduler: started %s (%s)' % (ticket.name, ticket.host))
+                return
+            if position != lastPosition:
+                self._send({'event': 'queued', 'position': position})
+                lastPosition = position
+            self._checkClient()
+
+    def _serveSlot(self, ticket):
+        state = self.server.state
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            if message.get('op') == 'done':
+                logger.info('UploadScheduler: finished %s (%s)' % (ticket.name, ticket.host))
+                return
+            if message.get('op') == 'consume':
+                state.bucket.consume(message['bytes'])
+                ticket.sent += message['bytes']
+                self._send({'event': 'ok', 'bytes': message['bytes']})
+
+
+class SchedulerServer(SocketServer.ThreadingTCPServer):
+    daemon_threads      = True
+    allow_reuse_address = True
+
+    def __init__(self, address, maxConcurrent = MAX_CONCURRENT, bytesPerSec = BANDWIDTH):
+        SocketServer.ThreadingTCPServer.__init__(self, address, SchedulerHandler)
+        self.state = SchedulerState(maxConcurrent, bytesPerSec)
+
+
+def serveInThread(host = '127.0.0.1', port = 0, maxConcurrent = MAX_CONCURRENT, bytesPerSec = BANDWIDTH):
+    """
+    Runs a scheduler on a daemon thread of this process and returns the server, port 0 picks a free port.
+    server.server_address is where it ended up, server.shutdown() stops it.
+    """
+    server = SchedulerServer((host, port), maxConcurrent, bytesPerSec)
+    thread = threading.Thread(target = server.serve_forever, name = 'UploadScheduler')
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Share the upload bandwidth between the mayas submitting playblasts.')
+    parser.add_argument('--host', default = '127.0.0.1', help = 'Interface to listen on, 0.0.0.0 to take uploads from other workstations.')
+    parser.add_argument('--port', type = int, default = PORT)
+    parser.add_argument('--max-concurrent', type = int, default = MAX_CONCURRENT)
+    parser.add_argument('--bandwidth-mb', type = float, default = BANDWIDTH, help = 'MB a second shared by all uploads, 0 for no limit.')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level = logging.INFO)
+
+    try:
+        server = SchedulerServer((args.host, args.port), args.max_concurrent, int(args.bandwidth_mb * 1024 * 1024))
+    except socket.error, e:
+        ## Most likely another maya started one first
+        logger.info('UploadScheduler: could not listen on %s:%s, %s' % (args.host, args.port, e))
+        return 1
+    logger.info('UploadScheduler: listening on %s:%s' % server.server_address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Creating the Version for a playblast without a check-then-create race.
+Shotgun has no unique constraint on a Version's code, so instead of asking whether the code is free and then
+creating (two round trips with a gap another artist can slip into) we create first and then look at every
+Version with that code. The oldest one wins; if that isn't ours, ours is deleted again and the caller gets a
+VersionCollision back. Two round trips in the normal case, and every racer agrees on the same winner.
+
+The app reserves the code before rendering with a placeholder Version (reserveVersion), fills it in with
+the real data once the movie is done (fillReservation) and deletes it if the playblast is cancelled or fails
+(releaseReservation). The placeholder's description says when its lease runs out and ReservationKeeper pushes
+that out while the render runs, so a long render keeps its code. A placeholder whose lease ran out, eg because
+maya crashed mid render, is stale and gets reclaimed by the next artist wanting the code.
+"""
+import os, re, time, calendar, socket, getpass, threading
+import logging
+logger = logging.getLogger(__name__)
+
+## Placeholder Versions carry this at the start of their description
+RESERVATION_MARKER  = '[playblast reservation]'
+## Seconds a placeholder is honoured for before someone else may reclaim the code
+RESERVATION_LEASE   = 2 * 60 * 60
+RESERVATION_STATUS  = 'na'
+## The lease expiry (epoch seconds) at the end of a placeholder's description
+_LEASE_EXPIRY       = re.compile(r'held until (\d+)$')
+_FIELDS             = ['code', 'created_by', 'sg_status_list', 'description', 'updated_at']
+
+
+class VersionCreated(object):
+    """
+    The Version was created and the code is ours.
+    """
+    collision = False
+
+    def __init__(self, version):
+        self.version = version
+
+    def __repr__(self):
+        return 'VersionCreated(%s)' % self.version.get('id')
+
+
+class VersionReserved(VersionCreated):
+    """
+    A placeholder Version holds the code until fillReservation or releaseReservation.
+    """
+    def __repr__(self):
+        return 'VersionReserved(%s)' % self.version.get('id')
+
+
+class VersionCollision(object):
+    """
+    Another Version already has the code. existing is that Version (type, id, code, created_by).
+    """
+    collision = True
+
+    def __init__(self, code, existing):
+        self.code       = code
+        self.existing   = existing
+
+    def __repr__(self):
+        return 'VersionCollision(%r, %s)' % (self.code, self.existing.get('id'))
+
+    def message(self):
+        createdBy = (self.existing.get('created_by') or {}).get('name', 'someone')
+        return 'A version called %s already exists in shotgun (id %s, created by %s)' % (self.code, self.existing.get('id'), createdBy)
+
+
+class VersionCollisionError(Exception):
+    """
+    Raised by the submit stages so the collision ends the job, the typed result is on .result.
+    """
+    def __init__(self, result):
+        Exception.__init__(self, result.message())
+        self.result = result
+
+
+def versionCode(moviePath):
+    """
+    The Version code for a movie: the file name without extension, underscores to spaces, capitalized.
+    """
+    name = os.path.splitext(os.path.basename(moviePath))[0]
+    return name.replace('_', ' ').capitalize()
+
+
+def versionCodes(moviePath):
+    """
+    Every code a Version for this movie could have, the current style plus the raw file name older submissions used.
+    """
+    name = os.path.splitext(os.path.basename(moviePath))[0]
+    codes = [versionCode(moviePath)]
+    if name not in codes:
+        codes.append(name)
+    return codes
+
+
+def _codeFilters(codes, project):
+    filters = [['code', 'in', list(codes)]]
+    if project:
+        filters.append(['project', 'is', project])
+    return filters
+
+
+def _findVersions(sg, codes, project):
+    return sg.find('Version', _codeFilters(codes, project), _FIELDS, order = [{'field_name': 'id', 'direction': 'asc'}])
+
+
+def _timestamp(value):
+    if value is None:
+        return 0
+    if value.tzinfo is None:
+        return time.mktime(value.timetuple())
+    return calendar.timegm(value.utctimetuple())
+
+
+def leaseExpiry(version):
+    """
+    Epoch seconds the placeholder holds its code until, None if the description doesn't say (older placeholders).
+    """
+    found = _LEASE_EXPIRY.search(version.get('description') or '')
+    return int(found.group(1)) if found else None
+
+
+def isStaleReservation(version, lease = RESERVATION_LEASE, now = None):
+    """
+    True for a placeholder Version whose lease ran out. Placeholders without an expiry get the lease from their updated_at.
+    """
+    if not (version.get('description') or '').startswith(RESERVATION_MARKER):
+        return False
+    now = time.time() if now is None else now
+    expiry = leaseExpiry(version)
+    if expiry is None:
+        expiry = _timestamp(version.get('updated_at')) + lease
+    return now > expiry
+
+
+def findVersion(sg, codes, project = None, lease = RESERVATION_LEASE):
+    """
+    Returns the oldest live Version with any of the codes, or None. Stale reservations don't count. One round trip.
+    """
+    for each in _findVersions(sg, codes, project):
+        if not isStaleReservation(each, lease):
+            return each
+    return None
+
+
+def _delete(sg, versionId, why):
+    try:
+        sg.delete('Version', versionId)
+    except Exception, e:
+        logger.warning('Could not delete %s Version %s: %s' % (why, versionId, e))
+
+
+def _settle(sg, created, codes, project, lease):
+    """
+    Works out whether the Version we just created owns the code. Anything older wins unless it's a stale
+    reservation, which gets reclaimed. Returns the live Version that owns the code.
+    """
+    for each in _findVersions(sg, codes, project):
+        if each['id'] >= created['id']:
+            break
+        if isStaleReservation(each, lease):
+            logger.info('Reclaiming stale Version reservation %s (%s)' % (each['id'], each.get('description')))
+            _delete(sg, each['id'], 'stale reservation')
+            continue
+        ## Someone else had (or beat us to) the code. Back ours out so the site is left as it was.
+        logger.warning('Version code %s is taken by Version %s, deleting the duplicate %s' % (created.get('code'), each['id'], created['id']))
+        _delete(sg, created['id'], 'duplicate')
+        return each
+    return created
+
+
+def _createAndSettle(sg, data, codes, project, lease):
+    """
+    Creates the Version and settles who owns its code. If the settle can't be done the new Version is deleted
+    again before the error goes up, so a failed call never leaves an orphan holding the code.
+    """
+    created = sg.create('Version', data)
+    try:
+        return created, _settle(sg, created, codes, project, lease)
+    except Exception, e:
+        logger.warning('Could not check Version %s owns code %s, deleting it: %s' % (created['id'], created.get('code'), e))
+        _delete(sg, created['id'], 'unsettled')
+        raise
+
+
+def createUniqueVersion(sg, data, codes = None, lease = RESERVATION_LEASE):
+    """
+    Creates the Version for data and makes sure its code is unique. Returns VersionCreated or VersionCollision.
+    @param codes: The codes that count as the same Version, defaults to data['code']
+    """
+    created, owner = _createAndSettle(sg, data, codes or [data['code']], data.get('project'), lease)
+    if owner is created:
+        return VersionCreated(created)
+    return VersionCollision(data['code'], owner)
+
+
+def reserveVersion(sg, data, codes = None, status = RESERVATION_STATUS, lease = RESERVATION_LEASE):
+    """
+    Claims the code for data with a placeholder Version before rendering. Returns VersionReserved or VersionCollision.
+    The placeholder only gets the code and links, the rest of data goes in with fillReservation.
+    """
+    placeholder = {}
+    for key in ('code', 'entity', 'sg_task', 'project', 'user', 'created_by'):
+        if key in data:
+            placeholder[key] = data[key]
+    placeholder['sg_status_list']   = status
+    placeholder['description']      = '%s %s@%s, rendering since %s, held until %d' % (RESERVATION_MARKER, getpass.getuser(), socket.gethostname(),
+                                                                                       time.strftime('%Y-%m-%d %H:%M:%S'), time.time() + lease)
+    created, owner = _createAndSettle(sg, placeholder, codes or [data['code']], data.get('project'), lease)
+    if owner is created:
+        return VersionReserved(created)
+    return VersionCollision(data['code'], owner)
+
+
+def renewReservation(sg, version, lease = RESERVATION_LEASE):
+    """
+    Pushes the placeholder's lease out to lease seconds from now. Returns the new expiry.
+    """
+    expiry = int(time.time() + lease)
+    description = _LEASE_EXPIRY.sub('', version.get('description') or RESERVATION_MARKER).rstrip(', ')
+    description = '%s, held until %d' % (description, expiry)
+    sg.update('Version', version['id'], {'description': description})
+    version['description'] = description
+    return expiry
+
+
+class ReservationKeeper(object):
+    """
+    Renews a placeholder's lease every interval seconds on a background thread until stop(), eg for as long as the render runs.
+    connection is a callable returning a shotgun connection context, eg getShotgunPool().connection.
+
+        keeper = ReservationKeeper(reserved, getShotgunPool().connection, lease).start()
+        try:
+            render()
+        finally:
+            keeper.stop()
+    """
+    def __init__(self, version, connection, lease = RESERVATION_LEASE, interval = None):
+        self.version    = version
+        self.connection = connection
+        self.lease      = lease
+        ## A quarter of the lease, so a couple of failed renewals in a row still don't lose the code
+        self.interval   = interval or max(lease / 4.0, 1)
+        self._stop      = threading.Event()
+        self._thread    = None
+
+    def start(self):
+        self._thread = threading.Thread(target = self._run, name = 'ReservationKeeper-%s' % self.version['id'])
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.connection() as sg:
+                    renewReservation(sg, self.version, self.lease)
+            except Exception, e:
+                logger.warning('Could not renew the Version reservation %s: %s' % (self.version['id'], e))
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval)
+
+
+def fillReservation(sg, version, data):
+    """
+    Turns the placeholder into the real Version. Returns the updated Version.
+    """
+    updated = sg.update('Version', version['id'], data)
+    updated.setdefault('type', 'Version')
+    updated['id'] = version['id']
+    return updated
+
+
+def releaseReservation(sg, version):
+    """
+    Gives the code back, eg when the playblast was cancelled or failed before the Version was filled in.
+    """
+    logger.info('Releasing Version reservation %s' % version['id'])
+    _delete(sg, version['id'], 'reserved')
@@ -0,0 +1,65 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+Shared setup for the tests. They run outside maya against the fake maya.cmds, tank and shotgun_api3 in
+benchmarks/fakes, like the benchmarks, with the fake latencies turned off:
+
+    python -m unittest discover -s tests
+"""
+import os, sys, shutil, socket, tempfile, unittest, logging
+
+HERE        = os.path.dirname(os.path.abspath(__file__))
+ROOT        = os.path.dirname(HERE)
+LIB_DIR     = os.path.join(ROOT, 'python', 'lib')
+FAKES_DIR   = os.path.join(ROOT, 'benchmarks', 'fakes')
+sys.path[0:0] = [FAKES_DIR, os.path.join(ROOT, 'python'), ROOT]
+logging.basicConfig(level = logging.CRITICAL)
+
+import fakeConfig
+fakeConfig.SG_CONNECT_LATENCY   = 0
+fakeConfig.SG_CALL_LATENCY      = 0
+fakeConfig.CMDS_LATENCY         = 0
+import lib
+
+
+def libModule(name):
+    """
+    The lib module itself, lib.<name> is often the class of the same name the package re-exports.
+    """
+    __import__('lib.%s' % name)
+    return sys.modules['lib.%s' % name]
+
+
+def freePort():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TempDirTestCase(unittest.TestCase):
+    """
+    self.tempDir is a fresh directory for each test, removed again afterwards.
+    """
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp(prefix = 'playblastTest')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir, ignore_errors = True)
+
+    def writeFile(self, name, data):
+        path = os.path.join(self.tempDir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def patch(self, owner, name, value):
+        """
+        Sets owner.name for the length of the test.
+        """
+        old = getattr(owner, name)
+        setattr(owner, name, value)
+        self.addCleanup(setattr, owner, name, old)
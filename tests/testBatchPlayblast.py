@@ -0,0 +1,60 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+BatchPlayblast's render step, rendered by benchmarks/fakes/fakeRenderer.py and encoded by benchmarks/fakes/fakeEncoder.py.
+"""
+import os, sys, json, unittest
+import support
+
+batchModule     = support.libModule('BatchPlayblast')
+FAKE_RENDERER   = os.path.join(support.FAKES_DIR, 'fakeRenderer.py')
+FAKE_ENCODER    = os.path.join(support.FAKES_DIR, 'fakeEncoder.py')
+
+
+class RenderTest(support.TempDirTestCase):
+    def setUp(self):
+        support.TempDirTestCase.setUp(self)
+        self.chunkLog   = os.path.join(self.tempDir, 'chunks.log')
+        encoderPath     = self.writeFile('fakeEncoder', '#!/bin/sh\nexec "%s" "%s" "$@"\n' % (sys.executable, FAKE_ENCODER))
+        os.chmod(encoderPath, 0755)
+        self.batch      = batchModule.BatchPlayblast('work', 'movie', 'movieWork', rendererCommand = [sys.executable, FAKE_RENDERER, '--log', self.chunkLog],
+                                                     encoderPath = encoderPath, encoderArgs = '')
+        self.job        = batchModule.BatchJob('shot010.ma')
+        self.job.scene      = os.path.join(self.tempDir, 'shot010.ma')
+        self.job.name       = 'shot010'
+        self.job.workPath   = os.path.join(self.tempDir, 'work', 'shot010.mov')
+
+    def movie(self):
+        with open(self.job.workPath) as f:
+            return json.load(f)
+
+    def testCutRangePlaysTheEndHandle(self):
+        self.job.firstFrame = 101
+        self.job.lastFrame  = 105
+        self.batch.render(self.job)
+        frames = self.movie()['frames']
+        self.assertEqual([each['frame'] for each in frames], range(101, 106 + support.lib.PB_END_HANDLE))
+        ## The job keeps the cut range, the handle is only played
+        self.assertEqual((self.job.firstFrame, self.job.lastFrame), (101, 105))
+
+    def testSceneRangePlaysTheEndHandle(self):
+        self.batch.render(self.job)
+        frames = self.movie()['frames']
+        fakeRenderer = __import__('fakeRenderer')
+        self.assertEqual(frames[-1]['frame'], fakeRenderer.SCENE_END + support.lib.PB_END_HANDLE)
+        self.assertEqual((self.job.firstFrame, self.job.lastFrame), (fakeRenderer.SCENE_START, fakeRenderer.SCENE_END))
+
+    def testWorkerLooksForTheShotCameraWithTheAppDefaults(self):
+        self.job.firstFrame = self.job.lastFrame = 1
+        self.batch.render(self.job)
+        frame = self.movie()['frames'][0]
+        ## No camera means each scene's own shot camera
+        self.assertEqual(frame['camera'], '')
+        self.assertEqual(frame['editorState'], support.lib.defaultEditorState())
+        self.assertIn(['hardwareRenderingGlobals.ssaoSamples', support.lib.HW_SSAO_SAMPLES], frame['renderGlobals'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+ChunkedUploader against MemoryPartTarget, a part target that keeps the parts it is sent in memory.
+"""
+import os, uuid, hashlib, threading, unittest, BaseHTTPServer, SocketServer
+import support
+
+uploaderModule = support.libModule('ChunkedUploader')
+
+
+class MemoryPartHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_PUT(self):
+        uploadId, partNumber = self.path.strip('/').split('/')
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        status, etag = self.server.target.receive(uploadId, int(partNumber), data)
+        self.send_response(status)
+        self.send_header('ETag', '"%s"' % etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class MemoryPartServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class MemoryPartTarget(object):
+    """
+    The parts are PUT to a local http server, which is all putStream speaks, and kept here by upload id and part number.
+    failures[partNumber] is how many PUTs of that part answer 500, mangled[partNumber] how many answer with the md5
+    of something else, and opaqueEtags hands back random ETags like an SSE-KMS bucket.
+    """
+    def __init__(self, etagIsChecksum = True, opaqueEtags = False):
+        self.key            = 'memory'
+        self.etagIsChecksum = etagIsChecksum
+        self.opaqueEtags    = opaqueEtags
+        self.failures       = {}
+        self.mangled        = {}
+        self.parts          = {}
+        self.puts           = []
+        self.started        = []
+        self.completed      = {}
+        self._lock          = threading.Lock()
+        self._server        = MemoryPartServer(('127.0.0.1', 0), MemoryPartHandler)
+        self._server.target = self
+        thread = threading.Thread(target = self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def receive(self, uploadId, partNumber, data):
+        with self._lock:
+            self.puts.append(partNumber)
+            if self.failures.get(partNumber):
+                self.failures[partNumber] -= 1
+                return 500, ''
+            etag = hashlib.md5(data).hexdigest()
+            if self.mangled.get(partNumber):
+                self.mangled[partNumber] -= 1
+                etag = hashlib.md5(data + 'x').hexdigest()
+            elif self.opaqueEtags:
+                etag = uuid.uuid4().hex
+            self.parts[(uploadId, partNumber)] = data
+            return 200, etag
+
+    def start(self, path):
+        uploadId = uuid.uuid4().hex
+        self.started.append(uploadId)
+        return {'upload_id': uploadId}
+
+    def partUrl(self, uploadInfo, path, partNumber):
+        return 'http://127.0.0.1:%s/%s/%s' % (self._server.server_address[1], uploadInfo['upload_id'], partNumber)
+
+    def complete(self, uploadInfo, path, etags):
+        uploadId = uploadInfo['upload_id']
+        self.completed[uploadId] = ''.join([self.parts[(uploadId, partNumber)] for partNumber in range(1, len(etags) + 1)])
+
+
+def multipartChecksum(data, partSize):
+    parts = [data[offset:offset + partSize] for offset in range(0, len(data), partSize)]
+    return '%s-%s' % (hashlib.md5(''.join([hashlib.md5(each).digest() for each in parts])).hexdigest(), len(parts))
+
+
+class ChunkedUploaderTest(support.TempDirTestCase):
+    PART_SIZE = 1000
+
+    def setUp(self):
+        support.TempDirTestCase.setUp(self)
+        ## Three full parts and a short one
+        self.data = os.urandom(self.PART_SIZE * 3 + 500)
+        self.path = self.writeFile('shot010.mov', self.data)
+
+    def target(self, **kwargs):
+        target = MemoryPartTarget(**kwargs)
+        self.addCleanup(target.close)
+        return target
+
+    def uploader(self, target, **kwargs):
+        return uploaderModule.ChunkedUploader(target, partSize = self.PART_SIZE, workers = 2, backoff = 0, **kwargs)
+
+    def testOpaqueEtagsDontFailTheParts(self):
+        target = self.target(etagIsChecksum = False, opaqueEtags = True)
+        self.assertEqual(self.uploader(target).upload(self.path), multipartChecksum(self.data, self.PART_SIZE))
+        self.assertEqual(sorted(target.puts), [1, 2, 3, 4])
+        self.assertEqual(target.completed.values(), [self.data])
+
+    def testMangledPartIsSentAgain(self):
+        target = self.target()
+        target.mangled[2] = 1
+        self.assertEqual(self.uploader(target).upload(self.path), multipartChecksum(self.data, self.PART_SIZE))
+        self.assertEqual(sorted(target.puts), [1, 2, 2, 3, 4])
+        self.assertEqual(target.completed.values(), [self.data])
+
+
+    def testResumeAfterPartialFailure(self):
+        target = self.target()
+        ## Part 3 fails every attempt of the first run
+        target.failures[3] = uploaderModule.PART_ATTEMPTS
+        uploader = self.uploader(target)
+        with self.assertRaises(uploaderModule.UploadError) as caught:
+            uploader.upload(self.path)
+        self.assertEqual(caught.exception.failedParts, [3])
+        self.assertTrue(os.path.exists(uploader.manifestPath(self.path)))
+        self.assertEqual(target.completed, {})
+
+        del target.puts[:]
+        self.assertEqual(self.uploader(target).upload(self.path), multipartChecksum(self.data, self.PART_SIZE))
+        ## Same upload, only the missing part sent again
+        self.assertEqual(len(target.started), 1)
+        self.assertEqual(target.puts, [3])
+        self.assertEqual(target.completed.values(), [self.data])
+        self.assertFalse(os.path.exists(uploader.manifestPath(self.path)))
+
+    def testChangedFileStartsAFreshUpload(self):
+        target = self.target()
+        target.failures[3] = uploaderModule.PART_ATTEMPTS
+        self.assertRaises(uploaderModule.UploadError, self.uploader(target).upload, self.path)
+
+        ## A new render of the same size, the manifest's parts belong to the old one
+        newData = os.urandom(len(self.data))
+        self.writeFile('shot010.mov', newData)
+        os.utime(self.path, (os.path.getatime(self.path), os.path.getmtime(self.path) + 10))
+        del target.puts[:]
+        self.assertEqual(self.uploader(target).upload(self.path), multipartChecksum(newData, self.PART_SIZE))
+        self.assertEqual(len(target.started), 2)
+        self.assertEqual(sorted(target.puts), [1, 2, 3, 4])
+        self.assertEqual(target.completed[target.started[1]], newData)
+
+    def testRetriedPart(self):
+        target = self.target()
+        target.failures[2] = 1
+        progress = []
+        self.assertEqual(self.uploader(target, progressCallback = lambda sent, total: progress.append(sent)).upload(self.path),
+                         multipartChecksum(self.data, self.PART_SIZE))
+        self.assertEqual(sorted(target.puts), [1, 2, 2, 3, 4])
+        self.assertEqual(target.completed.values(), [self.data])
+        ## The failed attempt's bytes are taken back off, so the progress never runs past the size
+        self.assertEqual(max(progress), len(self.data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+The app's own scene setup mustn't count as unsaved changes, the sharded, frame cache and output cache paths
+all check the modified flag before working off the saved file.
+"""
+import os, sys, unittest
+import support
+sys.path.insert(0, os.path.join(support.ROOT, 'benchmarks'))
+import fakeConfig
+import benchSubmit
+import maya.cmds as cmds
+
+
+class AppSceneEditsTest(unittest.TestCase):
+    def setUp(self):
+        self.ui = benchSubmit.buildUI({'isAsset': True})
+        self.ui._scenePrepared  = False
+        self.ui.renderWidth     = 1280
+        self.ui.renderHeight    = 720
+        fakeConfig.SCENE_MODIFIED = False
+
+    def testPrepareSceneKeepsASavedSceneSaved(self):
+        with self.ui._appSceneEdits():
+            self.ui._prepareScene()
+        self.assertTrue(self.ui._scenePrepared)
+        self.assertFalse(cmds.file(query = True, modified = True))
+
+    def testArtistChangesStillCount(self):
+        cmds.setAttr('persp.translateX', 10)
+        with self.ui._appSceneEdits():
+            self.ui._prepareScene()
+        self.assertTrue(cmds.file(query = True, modified = True))
+
+    def testChangesAfterTheSetupCount(self):
+        with self.ui._appSceneEdits():
+            self.ui._prepareScene()
+        cmds.setAttr('persp.translateX', 10)
+        self.assertTrue(cmds.file(query = True, modified = True))
+
+    def testSetupFailingStillRestoresTheFlag(self):
+        def fail():
+            cmds.setAttr('defaultResolution.width', 1280)
+            raise RuntimeError('boom')
+        with self.assertRaises(RuntimeError):
+            with self.ui._appSceneEdits():
+                fail()
+        self.assertFalse(cmds.file(query = True, modified = True))
+
+
+
+class OutputCacheGateTest(support.TempDirTestCase):
+    def setUp(self):
+        support.TempDirTestCase.setUp(self)
+        self.ui = benchSubmit.buildUI({'isAsset': True, 'output_cache': True})
+        self.ui._scenePrepared  = False
+        self.ui.renderWidth     = 1280
+        self.ui.renderHeight    = 720
+        self.ui.sizePercent     = self.ui.qualityPercent = benchSubmit.FakeButton('75')
+        self.ui.sizePercent.value = lambda: 75
+        self.ui.rerenderFrames  = benchSubmit.FakeButton('')
+        fakeConfig.SCENE_MODIFIED   = False
+        fakeConfig.SCENE_PATH       = self.writeFile('shot010_anim_v001.ma', 'requires maya "2014";\ncreateNode transform -n "persp";\n')
+        self.addCleanup(setattr, fakeConfig, 'SCENE_PATH', '')
+
+    def fingerprint(self):
+        return self.ui._outputFingerprint(1001, 1100, os.path.join(self.tempDir, 'shot010.mov'), 1280, 720)
+
+    def testFingerprintAfterTheAppsSetup(self):
+        with self.ui._appSceneEdits():
+            self.ui._prepareScene()
+        first = self.fingerprint()
+        self.assertTrue(first)
+        ## A second press gets the same key, so the movie from the first is reused
+        self.assertEqual(self.fingerprint(), first)
+
+    def testNoFingerprintWithTheArtistsChanges(self):
+        cmds.setAttr('persp.translateX', 10)
+        with self.ui._appSceneEdits():
+            self.ui._prepareScene()
+        self.assertEqual(self.fingerprint(), None)
+
+    def testViewportSettingsChangeTheFingerprint(self):
+        first = self.fingerprint()
+        self.patch(support.lib.CONST, 'HW_SSAO_SAMPLES', 8)
+        self.assertNotEqual(self.fingerprint(), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
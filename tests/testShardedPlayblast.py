@@ -0,0 +1,105 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+ShardedPlayblast chunking, failures and the encode step, rendered by benchmarks/fakes/fakeRenderer.py and
+encoded by benchmarks/fakes/fakeEncoder.py instead of mayapy and ffmpeg.
+"""
+import os, sys, json, unittest
+import support
+
+shardModule     = support.libModule('ShardedPlayblast')
+encoderModule   = support.libModule('encoder')
+FAKE_RENDERER   = os.path.join(support.FAKES_DIR, 'fakeRenderer.py')
+FAKE_ENCODER    = os.path.join(support.FAKES_DIR, 'fakeEncoder.py')
+
+
+class SplitFrameRangeTest(unittest.TestCase):
+    def testChunksCoverTheRange(self):
+        self.assertEqual(shardModule.splitFrameRange(1, 10, 4), [(1, 4), (5, 8), (9, 10)])
+
+    def testSingleFrame(self):
+        self.assertEqual(shardModule.splitFrameRange(101, 101, 50), [(101, 101)])
+
+    def testChunkSizeIsAtLeastOne(self):
+        self.assertEqual(shardModule.splitFrameRange(1, 3, 0), [(1, 1), (2, 2), (3, 3)])
+
+
+class ShardedPlayblastTest(support.TempDirTestCase):
+    def setUp(self):
+        support.TempDirTestCase.setUp(self)
+        self.output     = os.path.join(self.tempDir, 'shot010.mov')
+        self.chunkLog   = os.path.join(self.tempDir, 'chunks.log')
+        ## The encoder is run as encoderPath + args, so wrap the fake encoder script in something executable
+        self.encoder    = self.writeFile('fakeEncoder', '#!/bin/sh\nexec "%s" "%s" "$@"\n' % (sys.executable, FAKE_ENCODER))
+        os.chmod(self.encoder, 0755)
+
+    def shards(self, rendererArgs = (), encoderArgs = '', **kwargs):
+        settings = dict(
+                        scenePath       = os.path.join(self.tempDir, 'shot010.ma'),
+                        firstFrame      = 1,
+                        lastFrame       = 10,
+                        output          = self.output,
+                        camera          = 'shotCam',
+                        editorState     = {'nurbsCurves': False},
+                        renderGlobals   = [['hardwareRenderingGlobals.ssaoEnable', 1]],
+                        workers         = 3,
+                        chunkSize       = 4,
+                        rendererCommand = [sys.executable, FAKE_RENDERER, '--log', self.chunkLog] + list(rendererArgs),
+                        encoderPath     = self.encoder,
+                        encoderArgs     = encoderArgs,
+                        )
+        settings.update(kwargs)
+        return shardModule.ShardedPlayblast(**settings)
+
+    def renderedChunks(self):
+        with open(self.chunkLog) as f:
+            return sorted(tuple(int(each) for each in line.split()) for line in f)
+
+    def testChunksAreRenderedAndEncoded(self):
+        progress = []
+        shards = self.shards()
+        self.assertEqual(shards.run(progressCallback = lambda done, count: progress.append((done, count))), self.output)
+        self.assertEqual(self.renderedChunks(), [(1, 4), (5, 8), (9, 10)])
+        self.assertEqual(sorted(progress), [(1, 3), (2, 3), (3, 3)])
+        with open(self.output) as f:
+            movie = json.load(f)
+        self.assertEqual([each['frame'] for each in movie['frames']], range(1, 11))
+        self.assertEqual(movie['fps'], '24')
+        ## Every worker got the camera, editor state and render globals
+        self.assertEqual(movie['frames'][-1]['camera'], 'shotCam')
+        self.assertEqual(movie['frames'][-1]['editorState'], {'nurbsCurves': False})
+        self.assertEqual(movie['frames'][-1]['renderGlobals'], [['hardwareRenderingGlobals.ssaoEnable', 1]])
+        self.assertFalse(os.path.exists(shards.frameDir))
+
+    def testWorkerFailure(self):
+        shards = self.shards(rendererArgs = ['--fail-at', '6'], workers = 1)
+        with self.assertRaises(shardModule.ShardError) as caught:
+            shards.run()
+        self.assertIn('frames 5-8 exited with 1', str(caught.exception))
+        self.assertIn('fakeRenderer: failing frames 5-8', str(caught.exception))
+        ## One worker stops at the failure instead of rendering the rest
+        self.assertEqual(self.renderedChunks(), [(1, 4)])
+        self.assertFalse(os.path.exists(self.output))
+        self.assertFalse(os.path.exists(shards.frameDir))
+
+    def testMissingFrames(self):
+        shards = self.shards(rendererArgs = ['--skip', '7', '--skip', '9'])
+        with self.assertRaises(shardModule.ShardError) as caught:
+            shards.run()
+        self.assertIn('missing 2 frame(s), first missing frame is 7', str(caught.exception))
+        self.assertFalse(os.path.exists(self.output))
+        self.assertFalse(os.path.exists(shards.frameDir))
+
+    def testEncoderFailure(self):
+        shards = self.shards(encoderArgs = '--fail')
+        with self.assertRaises(encoderModule.EncodeError) as caught:
+            shards.run()
+        self.assertIn('fakeEncoder: failing', str(caught.exception))
+        self.assertEqual(self.renderedChunks(), [(1, 4), (5, 8), (9, 10)])
+        self.assertFalse(os.path.exists(shards.frameDir))
+
+
+if __name__ == '__main__':
+    unittest.main()
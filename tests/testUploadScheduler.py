@@ -0,0 +1,164 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+UploadSchedulerClient against uploadSchedulerDaemon.py run as its own process on a free localhost port.
+"""
+import sys, time, socket, threading, subprocess, unittest
+import support
+from lib import uploadSchedulerDaemon
+
+schedulerModule = support.libModule('UploadScheduler')
+spoolModule     = support.libModule('UploadSpool')
+uploaderModule  = support.libModule('ChunkedUploader')
+
+
+def waitFor(check, timeout = 10):
+    end = time.time() + timeout
+    while time.time() < end:
+        if check():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class DaemonTestCase(unittest.TestCase):
+    MAX_CONCURRENT = 1
+
+    def setUp(self):
+        self.address = '127.0.0.1:%s' % support.freePort()
+        self.daemon = subprocess.Popen([sys.executable, schedulerModule.DAEMON_SCRIPT, '--port', self.address.split(':')[1],
+                                        '--max-concurrent', str(self.MAX_CONCURRENT)], stderr = subprocess.PIPE)
+        self.addCleanup(self.stopDaemon)
+        self.assertTrue(waitFor(self.listening), 'The daemon never started listening')
+        self.client = schedulerModule.UploadSchedulerClient(self.address)
+
+    def stopDaemon(self):
+        if self.daemon.poll() is None:
+            self.daemon.terminate()
+        self.daemon.wait()
+
+    def listening(self):
+        try:
+            socket.create_connection(schedulerModule.parseAddress(self.address), 1).close()
+            return True
+        except socket.error:
+            return False
+
+    def upload(self, name, priority, granted, hold = 0.0, positions = None):
+        """
+        Runs one upload on a thread: waits for the slot, appends name to granted and holds the slot for hold seconds.
+        """
+        def run():
+            with self.client.slot(name, priority, 100, positionCallback = positions.append if positions is not None else None):
+                granted.append(name)
+                time.sleep(hold)
+        thread = threading.Thread(target = run, name = name)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def waiting(self):
+        return [each['name'] for each in self.client.status()['waiting']]
+
+
+class PriorityTest(DaemonTestCase):
+    def testQueueRunsInPriorityOrder(self):
+        granted = []
+        holder = self.client.slot('holder')
+        uploads = [
+                    ('no status',       schedulerModule.uploadPriority(None, '2013-05-01')),
+                    ('rev later',       schedulerModule.uploadPriority('rev', '2013-05-09')),
+                    ('vwd',             schedulerModule.uploadPriority('vwd', '2013-05-01')),
+                    ('rev sooner',      schedulerModule.uploadPriority('rev', '2013-05-02')),
+                    ('rev no due date', schedulerModule.uploadPriority('rev')),
+                  ]
+        positions = []
+        threads = []
+        for name, priority in uploads:
+            threads.append(self.upload(name, priority, granted, positions = positions if name == 'no status' else None))
+            ## Each one has to be in the queue before the next, so first come first served can't decide the order
+            self.assertTrue(waitFor(lambda: name in self.waiting()))
+        expected = ['rev sooner', 'rev later', 'rev no due date', 'vwd', 'no status']
+        self.assertEqual(self.waiting(), expected)
+        ## The daemon tells a waiting client its new place within a poll, give it that long
+        self.assertTrue(waitFor(lambda: positions[-1:] == [5]))
+        holder.close()
+        for each in threads:
+            each.join(10)
+        self.assertEqual(granted, expected)
+        ## The lowest priority upload heard its place go back as the others arrived, then its grant
+        self.assertEqual(positions[0], 1)
+        self.assertEqual(positions[-1], 0)
+
+
+class MaxConcurrentTest(DaemonTestCase):
+    MAX_CONCURRENT = 2
+
+    def testNoMoreThanMaxConcurrentRunAtOnce(self):
+        granted = []
+        threads = [self.upload('upload %s' % each, None, granted, hold = 1.0) for each in range(5)]
+        self.assertTrue(waitFor(lambda: len(granted) == 2))
+        status = self.client.status()
+        self.assertEqual(len(status['running']), 2)
+        self.assertEqual(len(status['waiting']), 3)
+        ## Nobody else gets in while the first two hold their slots
+        time.sleep(0.5)
+        self.assertEqual(len(granted), 2)
+        for each in threads:
+            each.join(10)
+        self.assertEqual(len(granted), 5)
+        self.assertTrue(waitFor(lambda: not self.client.status()['running']))
+
+    def testSlotOfAClientThatWentAwayIsGivenBack(self):
+        first   = self.client.slot('first')
+        second  = self.client.slot('second')
+        granted = []
+        waiter  = self.upload('third', None, granted)
+        self.assertTrue(waitFor(lambda: self.waiting() == ['third']))
+        ## Hang up without saying done, like maya crashing mid upload
+        first._reader.close()
+        first._sock.close()
+        waiter.join(10)
+        self.assertEqual(granted, ['third'])
+        second.close()
+
+
+class UnavailableTest(support.TempDirTestCase):
+    def setUp(self):
+        support.TempDirTestCase.setUp(self)
+        ## Nothing listens here
+        self.address = '127.0.0.1:%s' % support.freePort()
+        self.addCleanup(schedulerModule.setUploadScheduler, None)
+
+    def testNoDaemonRaisesSchedulerUnavailable(self):
+        self.assertRaises(schedulerModule.SchedulerUnavailable, schedulerModule.UploadSchedulerClient(self.address).slot, 'shot010')
+
+    def testUploadRunsUnscheduledWithoutADaemon(self):
+        uploads = []
+        self.patch(uploaderModule, 'uploadMovie', lambda versionId, path, partSize, workers, progressCallback, throttle, **kwargs: uploads.append((versionId, throttle)))
+        schedulerModule.setUploadScheduler(self.address)
+        entry = {'versionId': 101, 'moviePath': self.writeFile('shot010.mov', 'movie'), 'partSize': None, 'workers': None, 'priority': None}
+        spoolModule.shotgunUpload(entry)
+        self.assertEqual(uploads, [(101, None)])
+
+    def testDaemonGoingAwayMidUploadLeavesItUnthrottled(self):
+        daemon = uploadSchedulerDaemon.serveInThread(bytesPerSec = 1024)
+        slot = schedulerModule.UploadSchedulerClient('%s:%s' % daemon.server_address).slot('shot010')
+        slot.consume(10)
+        daemon.shutdown()
+        daemon.server_close()
+        ## The handler thread still has the connection, drop it like a killed daemon would
+        slot._sock.shutdown(socket.SHUT_RD)
+        ## Throttled at 1KB a second these would take hours, on a thread so a regression fails rather than hangs
+        sender = threading.Thread(target = lambda: [slot.consume(10 * 1024 * 1024) for each in range(2)])
+        sender.daemon = True
+        sender.start()
+        sender.join(2)
+        self.assertFalse(sender.is_alive())
+        slot.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
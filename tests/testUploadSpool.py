@@ -0,0 +1,65 @@
+"""
+Copyright (c) 2013 James Dunlop
+----------------------------------------------------
+
+Code for a maya playblast creator app that runs in maya
+UploadSpool locking, with the stale lock timings scaled down to seconds.
+"""
+import time, threading, unittest
+import support
+from lib import uploadSchedulerDaemon
+
+spoolModule = support.libModule('UploadSpool')
+
+
+class SlotWaitTest(support.TempDirTestCase):
+    def setUp(self):
+        support.TempDirTestCase.setUp(self)
+        self.patch(spoolModule, 'LOCK_STALE_SECS', 1)
+        self.patch(spoolModule, 'HEARTBEAT_SECS', 0.2)
+        self.scheduler  = uploadSchedulerDaemon.serveInThread(maxConcurrent = 1)
+        self.addCleanup(self.scheduler.shutdown)
+        self.client     = support.lib.UploadSchedulerClient('%s:%s' % self.scheduler.server_address)
+        self.spool      = spoolModule.UploadSpool(self.tempDir)
+        self.uploads    = []
+
+    def upload(self, entry, progressCallback):
+        ## Same as shotgunUpload: wait for a slot, then send
+        with self.client.slot('Version %s' % entry['versionId']):
+            self.uploads.append(threading.current_thread().name)
+
+    def testDrainerLeavesAnEntryWaitingForASlot(self):
+        self.spool.add(101, self.writeFile('shot010.mov', 'movie'))
+        ## Someone else's upload has the only slot, so the live submission waits in the queue holding the spool lock
+        blocker = self.client.slot('someone else')
+        live = threading.Thread(target = self.spool.process, args = (101, self.upload), name = 'live')
+        live.start()
+        ## Wait past the stale time, the lock must still be fresh and the drainer must leave the entry alone
+        time.sleep(2)
+        drainer = spoolModule.SpoolDrainer(self.spool, uploadFunc = self.upload, alreadyUploaded = None, isOffline = None)
+        drained = []
+        ## A drainer that wrongly took the entry would queue behind the blocker too, so don't wait on it for ever
+        draining = threading.Thread(target = lambda: drained.append(drainer.drainOnce()), name = 'drainer')
+        draining.daemon = True
+        draining.start()
+        draining.join(2)
+        blocker.close()
+        draining.join(10)
+        self.assertEqual(drained, [0])
+        live.join(10)
+        self.assertFalse(live.isAlive())
+        self.assertEqual(self.uploads, ['live'])
+        self.assertEqual(self.spool.entries(), [])
+
+    def testStaleLockIsTakenOver(self):
+        self.spool.add(102, self.writeFile('shot020.mov', 'movie'))
+        ## A drainer that died holding the lock, nothing touches it any more
+        self.assertTrue(self.spool.claim(102))
+        time.sleep(1.2)
+        drainer = spoolModule.SpoolDrainer(self.spool, uploadFunc = self.upload, alreadyUploaded = None, isOffline = None)
+        self.assertEqual(drainer.drainOnce(), 1)
+        self.assertEqual(len(self.uploads), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()